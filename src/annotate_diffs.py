@@ -1,32 +1,36 @@
 import os
 import numpy as np
-from .utils import load_json, ensure_dir
-from .landmark_extractor import LandmarkExtractor
+from .utils import load_json, ensure_dir, diff_meta_entries, load_summary
 from .visualize import plot_landmarks
+from .render_cv import CvRenderer, topk_indices
+from .inspect_diffs import load_neutral_landmarks
 
 
-def annotate_topk(digraphs_dir, neutral_image_path, k=8):
-    # paths
-    sad_meta = os.path.join(digraphs_dir, 'diff_neutral_sad_meta.json')
-    target_meta = os.path.join(digraphs_dir, 'diff_neutral_target_meta.json')
-    ensure_dir(digraphs_dir)
-
-    sm = load_json(sad_meta)
-    tm = load_json(target_meta)
+def _background_image(digraphs_dir, neutral_image_path, landmarks, reference='neutral'):
+    """Imagem de fundo: --neutral, senão a da referência registrada em summary.json; sem imagem, canvas branco."""
+    import cv2
+    if neutral_image_path is None:
+        neutral_image_path = load_summary(digraphs_dir).get('images', {}).get(reference)
+    if neutral_image_path:
+        img = cv2.imread(neutral_image_path)
+        if img is not None:
+            return img
+    lm = np.asarray(landmarks)
+    w = int(np.ceil(lm[:, 0].max() + lm[:, 0].min()))
+    h = int(np.ceil(lm[:, 1].max() + lm[:, 1].min()))
+    return np.full((max(h, 1), max(w, 1), 3), 255, dtype=np.uint8)
 
-    s_difs = np.array(sm['difs'], dtype=float)
-    t_difs = np.array(tm['difs'], dtype=float)
 
-    s_idx = list(np.argsort(-s_difs)[:k])
-    t_idx = list(np.argsort(-t_difs)[:k])
+def annotate_topk(digraphs_dir, neutral_image_path=None, k=8, renderer='matplotlib', max_side=None):
+    """Gera annotated_<referência>_<rótulo>.png com os top-k landmarks que mais mudaram em cada diff que parte
+    da referência do summary.json ('neutral' por padrão).
 
-    # extrair landmarks da imagem neutra
-    import cv2
-    nb = cv2.imread(neutral_image_path)
-    ext = LandmarkExtractor()
-    n_lm = ext.from_bgr(nb)
-    if n_lm is None:
-        raise RuntimeError('Não foi possível extrair landmarks da imagem neutra')
+    Os landmarks vêm de face_<referência>.json (não roda FaceMesh). Retorna a lista de PNGs gerados.
+    """
+    ensure_dir(digraphs_dir)
+    reference = load_summary(digraphs_dir).get('reference', 'neutral')
+    n_lm = load_neutral_landmarks(digraphs_dir, neutral_image_path, reference=reference)
+    nb = _background_image(digraphs_dir, neutral_image_path, n_lm, reference=reference)
 
     # helper para desenhar com destaque
     def _plot_with_highlights(image, landmarks, highlight_idxs, out_path):
@@ -43,22 +47,30 @@ def annotate_topk(digraphs_dir, neutral_image_path, k=8):
         fig.savefig(out_path, bbox_inches='tight')
         plt.close(fig)
 
-    out_s = os.path.join(digraphs_dir, 'annotated_neutral_sad.png')
-    out_t = os.path.join(digraphs_dir, 'annotated_neutral_target.png')
-    _plot_with_highlights(nb, n_lm, s_idx, out_s)
-    _plot_with_highlights(nb, n_lm, t_idx, out_t)
-
-    return out_s, out_t
+    r = CvRenderer(max_side=max_side) if renderer == 'cv2' else None
+    outputs = []
+    for label, meta_path in diff_meta_entries(digraphs_dir):
+        difs = np.array(load_json(meta_path)['difs'], dtype=float)
+        idx = list(topk_indices(difs, k))
+        out_path = os.path.join(digraphs_dir, f'annotated_{reference}_{label}.png')
+        if r is not None:
+            r.render_highlights(nb, n_lm, idx, out_path=out_path, style='annotate', labels=True)
+        else:
+            _plot_with_highlights(nb, n_lm, idx, out_path)
+        outputs.append(out_path)
+    return outputs
 
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('--dir', required=True)
-    parser.add_argument('--neutral', required=True)
+    parser.add_argument('--dir', required=True, nargs='+', help='diretório(s) com os digraphs')
+    parser.add_argument('--neutral', default=None, help='imagem de fundo (padrão: a da referência registrada em summary.json)')
     parser.add_argument('--k', type=int, default=8)
+    parser.add_argument('--renderer', choices=['matplotlib', 'cv2'], default='matplotlib')
+    parser.add_argument('--max-side', type=int, default=None)
     args = parser.parse_args()
-    a,b = annotate_topk(args.dir, args.neutral, k=args.k)
     print('Anotações salvas em:')
-    print(' ', a)
-    print(' ', b)
+    for d in args.dir:
+        for path in annotate_topk(d, args.neutral, k=args.k, renderer=args.renderer, max_side=args.max_side):
+            print(' ', path)
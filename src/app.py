@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 import streamlit as st
 import json
 import cv2
@@ -10,6 +11,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from src.utils import load_json
+from src.image_loader import imread
 from src.turing import TuringMachine
 from src.pipeline import FacialStatePipeline
 from src.landmark_extractor import LandmarkExtractor
@@ -57,6 +59,9 @@ with col1:
     with col_btn2:
         test_button = st.button('🧪 Testar Thresholds', type='secondary', use_container_width=True)
     
+    save_history = st.checkbox('💾 Gravar no histórico (SQLite)', value=False,
+                               help='Regenerações e análises também são gravadas em test_images/results.db')
+
     st.markdown('---')
     run_button = st.button('▶️ Executar Análise', use_container_width=True)
 
@@ -64,46 +69,119 @@ with col2:
     st.header('Output')
     output_area = st.empty()
 
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_extractor():
+    """LandmarkExtractor (FaceMesh) único por processo, compartilhado entre reruns e sessões."""
+    return LandmarkExtractor()
+
+
+@st.cache_resource(show_spinner=False)
+def get_extractor_lock():
+    # o FaceMesh não é thread-safe e o Streamlit roda cada sessão numa thread
+    return threading.Lock()
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_pipeline(threshold):
+    return FacialStatePipeline(extractor=get_extractor(), threshold=threshold)
+
+
+@st.cache_resource(show_spinner=False)
+def get_results_store():
+    """Histórico SQLite compartilhado pelas sessões (o store é thread-safe)."""
+    from src.results_store import ResultsStore, DEFAULT_DB
+    return ResultsStore(DEFAULT_DB, batch_size=1)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_json_cached(path, mtime):
+    # mtime faz parte da chave: o cache é invalidado quando o arquivo é regravado
+    return load_json(path)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_image_cached(path, mtime, rgb=True, max_side=None):
+    # max_side: decodifica já reduzida (IMREAD_REDUCED_*) quando a imagem só vai ser exibida pequena
+    img = imread(path, max_side=max_side)
+    if img is not None and rgb:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def load_image(path, rgb=True, max_side=None):
+    return _load_image_cached(path, _mtime(path), rgb=rgb, max_side=max_side)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _landmarks_cached(path, mtime):
+    img = _load_image_cached(path, mtime, rgb=False)
+    if img is None:
+        return None
+    with get_extractor_lock():
+        return get_extractor().from_bgr(img)
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    """Runner de jobs em segundo plano (pool de processos) compartilhado por todas as sessões."""
+    from src.jobs import JobRunner
+    return JobRunner(jobs_dir=os.path.join('test_images', 'jobs'))
+
+
+IMAGE_PATHS = ('test_images/neutral.jpg', 'test_images/sad.jpg', 'test_images/happy.jpg')
+
+
 def show_image(path, caption=None, width=400):
     if not os.path.exists(path):
         st.warning(f'Arquivo não encontrado: {path}')
         return
-    img = cv2.imread(path)
+    img = load_image(path, max_side=width)
     if img is None:
         st.warning('Não foi possível ler a imagem: ' + path)
         return
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     st.image(img, caption=caption, use_container_width=False, width=width)
 
 def try_load_json(path):
     if not os.path.exists(path):
         return None
     try:
-        return load_json(path)
+        return _load_json_cached(path, _mtime(path))
     except Exception as e:
         st.error('Erro ao carregar JSON ' + path + ': ' + str(e))
         return None
 
-def analyze_live(neutral_path, target_path, threshold=2.0):
-    """Roda o pipeline diretamente nas imagens BGR e retorna o resultado."""
-    p = FacialStatePipeline(threshold=threshold)
-    nb = cv2.imread(neutral_path)
-    tb = cv2.imread(target_path)
+def analyze_live(neutral_path, target_path, threshold=2.0, save=False):
+    """Roda o pipeline diretamente nas imagens BGR e retorna o resultado (save: grava no histórico)."""
+    p = get_pipeline(threshold)
+    nb = load_image(neutral_path, rgb=False)
+    tb = load_image(target_path, rgb=False)
     if nb is None or tb is None:
         return {'label': 'reject', 'reason': 'file_not_found'}
-    return p.analyze_pair(nb, tb)
+    with get_extractor_lock():
+        res = p.analyze_pair(nb, tb)
+    if save:
+        get_results_store().add(res, source='app', neutral_path=neutral_path, target_path=target_path,
+                                threshold=threshold)
+    return res
 
 def save_landmarks_overlay(image_path, out_path):
     """Extrai landmarks e salva uma imagem com pontos desenhados. Retorna mensagem de erro ou None."""
     try:
-        ext = LandmarkExtractor()
+        get_extractor()
     except Exception as e:
         return f'LandmarkExtractor init failed: {e}'
-    img = cv2.imread(image_path)
+    img = load_image(image_path, rgb=False)
     if img is None:
         return 'image_not_found'
     try:
-        lm = ext.from_bgr(img)
+        lm = _landmarks_cached(image_path, _mtime(image_path))
     except Exception as e:
         return f' landmark extraction error: {e}'
     if lm is None:
@@ -118,66 +196,8 @@ def save_landmarks_overlay(image_path, out_path):
     return None
 
 # Processar botão de teste de thresholds
-if test_button:
-    from src.generate_digraphs import main as gen_main
-    import numpy as np
-    
-    st.markdown("---")
-    st.subheader("🧪 Teste Automático de Thresholds")
-    st.info("Testando vários valores de threshold para encontrar o melhor...")
-    
-    # Testar thresholds de 0.05 a 0.3 em incrementos de 0.05
-    test_thresholds = [0.05, 0.08, 0.10, 0.12, 0.15, 0.18, 0.20, 0.25, 0.30]
-    results = []
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i, th in enumerate(test_thresholds):
-        status_text.text(f'Testando threshold {th}...')
-        try:
-            # Gerar digraphs com este threshold
-            gen_main('test_images/neutral.jpg', 'test_images/sad.jpg', 'test_images/happy.jpg', 'test_images/digraphs', threshold=th)
-            
-            # Carregar os metadados gerados
-            sm = try_load_json('test_images/digraphs/diff_neutral_sad_meta.json')
-            tm = try_load_json('test_images/digraphs/diff_neutral_happy_meta.json')
-            
-            if sm and tm:
-                # Calcular decisões
-                def decide(vec):
-                    arr = vec
-                    if any((v not in (0,1) for v in arr)):
-                        return 'reject'
-                    ones = sum(1 for v in arr if v==1)
-                    zeros = sum(1 for v in arr if v==0)
-                    if ones>zeros: return 'happy'
-                    if zeros>ones: return 'sad'
-                    return 'neutral'
-                
-                dec_sad = decide(sm['binary'])
-                dec_happy = decide(tm['binary'])
-                
-                # Calcular estatísticas
-                sad_ones = sum(sm['binary'])
-                happy_ones = sum(tm['binary'])
-                
-                results.append({
-                    'threshold': th,
-                    'neutral->sad': dec_sad,
-                    'neutral->happy': dec_happy,
-                    'sad_ones': sad_ones,
-                    'happy_ones': happy_ones,
-                    'sad_total': len(sm['binary']),
-                    'happy_total': len(tm['binary'])
-                })
-        except Exception as e:
-            st.warning(f'Erro ao testar threshold {th}: {e}')
-        
-        progress_bar.progress((i + 1) / len(test_thresholds))
-    
-    status_text.text('✅ Teste concluído!')
-    
+def show_threshold_results(results):
+    """Tabela de resultados do teste de thresholds + recomendação do melhor threshold."""
     # Exibir resultados em tabela
     st.markdown("### 📊 Resultados dos Testes:")
     
@@ -210,16 +230,66 @@ if test_button:
         st.markdown("- Tente ajustar manualmente o threshold entre os valores testados")
         st.markdown("- Considere usar imagens com expressões mais distintas")
 
-# Processar botão de regeneração
+
+TEST_THRESHOLDS = [0.05, 0.08, 0.10, 0.12, 0.15, 0.18, 0.20, 0.25, 0.30]
+
+# Processar botão de teste de thresholds (roda em segundo plano; um processo por threshold)
+if test_button:
+    job_id = get_job_runner().submit_threshold_sweep(*IMAGE_PATHS, TEST_THRESHOLDS)
+    st.session_state.setdefault('job_ids', []).append(job_id)
+
+# Processar botão de regeneração (segundo plano; reaproveita o job se já houver um para o mesmo diretório)
 if regen_button:
-    from src.generate_digraphs import main as gen_main
-    with st.spinner(f'🔄 Regenerando digraphs com threshold={regen_threshold}...'):
-        try:
-            gen_main('test_images/neutral.jpg', 'test_images/sad.jpg', 'test_images/happy.jpg', 'test_images/digraphs', threshold=regen_threshold)
-            st.success(f'✅ Digraphs regenerados com threshold={regen_threshold}!')
-            st.info('👉 Clique em "▶️ Executar Análise" para ver os resultados.')
-        except Exception as e:
-            st.error(f'❌ Erro ao regenerar: {e}')
+    from src.results_store import DEFAULT_DB
+    job_id = get_job_runner().submit_regenerate(*IMAGE_PATHS, 'test_images/digraphs', regen_threshold,
+                                                store=DEFAULT_DB if save_history else None)
+    if job_id not in st.session_state.setdefault('job_ids', []):
+        st.session_state['job_ids'].append(job_id)
+
+# Painel de jobs desta sessão: enquanto houver job rodando, o fragmento se reexecuta sozinho a cada JOB_POLL_S
+JOB_POLL_S = 1.0
+
+if st.session_state.get('job_ids'):
+    st.markdown("---")
+    st.subheader("⏳ Jobs em segundo plano")
+    runner = get_job_runner()
+    polling = any((runner.status(i) or {}).get('state') == 'running' for i in st.session_state['job_ids'])
+
+    @st.fragment(run_every=JOB_POLL_S if polling else None)
+    def jobs_panel():
+        jobs = [job for job in (runner.status(i) for i in reversed(st.session_state['job_ids'])) if job is not None]
+        if polling and not any(job['state'] == 'running' for job in jobs):
+            st.rerun()  # todos terminaram: rerun completo para parar o polling e atualizar o resto da página
+        for job in jobs:
+            job_id = job['id']
+            if job['kind'] == 'threshold_sweep':
+                title = f"🧪 Teste de thresholds ({job['total']} valores)"
+            else:
+                title = f"🔄 Regeneração (threshold={job['params'].get('threshold')})"
+            with st.expander(f"{title} — {job['state']} [{job_id}]", expanded=job['state'] in ('running', 'done')):
+                if job['state'] == 'running':
+                    st.progress(job['progress'], text=f"{job['completed']}/{job['total']} tarefas concluídas")
+                    if not job['cancellable']:
+                        st.caption('As tarefas restantes já estão em execução e não podem ser canceladas.')
+                    elif st.button('⛔ Cancelar', key='cancel_' + job_id):
+                        if runner.cancel(job_id):
+                            st.rerun()
+                        st.warning('Não foi possível cancelar: as tarefas restantes já começaram.')
+                for err in job['errors']:
+                    st.warning(f"Erro na tarefa {err['task']}: {err['error']}")
+                if job['state'] in ('done', 'failed') and job['kind'] == 'threshold_sweep':
+                    results = [r for r in job['results'] if r]
+                    if results:
+                        show_threshold_results(results)
+                elif job['state'] == 'done':
+                    st.success(f"✅ Digraphs regenerados com threshold={job['params'].get('threshold')}!")
+                    st.info('👉 Clique em "▶️ Executar Análise" para ver os resultados.')
+                elif job['state'] == 'cancelled':
+                    st.info('Job cancelado.')
+                elif job['state'] == 'lost':
+                    st.warning('Job interrompido (o servidor foi reiniciado durante a execução).')
+
+    jobs_panel()
 
 if run_button:
     ddir = digraphs_dir
@@ -413,12 +483,12 @@ if run_button:
             right_path = os.path.join(ddir, 'diff_neutral_happy.png')
             with col_a:
                 if os.path.exists(left_path):
-                    st.image(left_path, caption='diff_neutral_sad.png', width='stretch')
+                    st.image(load_image(left_path), caption='diff_neutral_sad.png', width='stretch')
                 else:
                     st.write('diff_neutral_sad.png não encontrado')
             with col_b:
                 if os.path.exists(right_path):
-                    st.image(right_path, caption='diff_neutral_happy.png', width='stretch')
+                    st.image(load_image(right_path), caption='diff_neutral_happy.png', width='stretch')
                 else:
                     st.write('diff_neutral_happy.png não encontrado')
 
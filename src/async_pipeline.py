@@ -0,0 +1,210 @@
+import json
+import asyncio
+import argparse
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .pipeline import FacialStatePipeline, result_to_json
+from .image_loader import imread, decode
+
+_DONE = object()
+
+
+def _decode(src):
+    """Aceita caminho, bytes ou array BGR e retorna a imagem BGR."""
+    if isinstance(src, np.ndarray):
+        return src
+    img = imread(src) if isinstance(src, str) else decode(src)
+    if img is None:
+        raise ValueError('imagem inválida ou não encontrada')
+    return img
+
+
+class AsyncPipelineRunner:
+    """Executa o FacialStatePipeline em estágios assíncronos ligados por filas limitadas.
+
+    Estágios: decode -> extract -> analyze -> serialize. Cada estágio tem N corrotinas (configurável)
+    e o trabalho pesado roda em executores (threads); as filas têm tamanho `queue_size`, então uma
+    fonte rápida é freada quando os estágios seguintes não dão conta (backpressure, memória limitada).
+
+    O estágio analyze usa um único FacialStatePipeline sem extractor (`analyzer`; por padrão copia a
+    configuração do primeiro pipeline de extração), sem criar um FaceMesh por thread de análise.
+
+    Itens de entrada: dict com 'neutral' e 'target' (caminho, bytes ou array BGR) e opcionalmente 'id'.
+    Resultados (fora de ordem) são dicts com 'id' e 'result' (JSON-serializável) ou 'error'. Se uma fonte
+    levanta uma exceção, ela vira a linha {'id': 'source[k]', 'error': ...} (k = posição da fonte) e o restante
+    segue normalmente.
+    """
+    def __init__(self, pipeline_factory=FacialStatePipeline, decode_workers=4, extract_workers=2,
+                 analyze_workers=1, serialize_workers=1, queue_size=8, with_graph=False,
+                 decode_executor=None, extract_executor=None, analyze_executor=None, analyzer=None):
+        self.pipeline_factory = pipeline_factory
+        # analyze_landmarks não usa o extractor: um único analisador compartilhado pelas threads de análise
+        self._analyzer = analyzer
+        self._lock = threading.Lock()
+        self.concurrency = {'decode': decode_workers, 'extract': extract_workers,
+                            'analyze': analyze_workers, 'serialize': serialize_workers}
+        self.queue_size = queue_size
+        self.with_graph = with_graph
+        # decode é I/O + imdecode (libera o GIL); extract usa um pipeline (FaceMesh) por thread
+        self._executors = {
+            'decode': decode_executor or ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='decode'),
+            'extract': extract_executor or ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix='extract'),
+            'analyze': analyze_executor or ThreadPoolExecutor(max_workers=analyze_workers, thread_name_prefix='analyze'),
+        }
+        self._local = threading.local()
+
+    def _pipeline(self):
+        """Pipeline (com FaceMesh) da thread de extração atual."""
+        p = getattr(self._local, 'pipeline', None)
+        if p is None:
+            p = self._local.pipeline = self.pipeline_factory()
+            with self._lock:
+                if self._analyzer is None:
+                    # mesma configuração (DFA, threshold, baseline) sem extractor próprio
+                    self._analyzer = FacialStatePipeline(extractor=object(), dfa=p.dfa, threshold=p.threshold,
+                                                         baseline_mode=p.baseline_mode, noise_k=p.noise_k)
+        return p
+
+    # ------------------- funções dos estágios (rodam nos executores) -------------------
+    @staticmethod
+    def _decode_pair(item):
+        return _decode(item['neutral']), _decode(item['target'])
+
+    def _extract_pair(self, images):
+        p = self._pipeline()
+        return p.extractor.from_bgr(images[0]), p.extractor.from_bgr(images[1])
+
+    def _analyze(self, landmarks):
+        # o estágio de extração sempre roda antes, então o analisador já existe (ou foi passado no construtor)
+        return self._analyzer.analyze_landmarks(landmarks[0], landmarks[1], with_graph=self.with_graph)
+
+    # ------------------- orquestração -------------------
+    async def _feed(self, k, source, out_q, counter):
+        try:
+            if hasattr(source, '__aiter__'):
+                async for item in source:
+                    await out_q.put(self._tagged(item, counter))
+            else:
+                for item in source:
+                    await out_q.put(self._tagged(item, counter))
+        except Exception as e:
+            # a falha da fonte segue pelos estágios como uma linha de erro; as outras fontes continuam
+            await out_q.put((f'source[{k}]', e))
+
+    @staticmethod
+    def _tagged(item, counter):
+        item_id = item.get('id', counter[0])
+        counter[0] += 1
+        return item_id, item
+
+    async def _stage_worker(self, name, fn, in_q, out_q, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            msg = await in_q.get()
+            if msg is _DONE:
+                return
+            item_id, payload = msg
+            if isinstance(payload, BaseException):
+                await out_q.put(msg)
+                continue
+            try:
+                if executor is not None:
+                    value = await loop.run_in_executor(executor, fn, payload)
+                else:
+                    value = fn(payload)
+            except Exception as e:
+                value = e
+            await out_q.put((item_id, value))
+
+    async def _run_stage(self, name, fn, in_q, out_q, executor, n_next):
+        workers = [asyncio.create_task(self._stage_worker(name, fn, in_q, out_q, executor))
+                   for _ in range(self.concurrency[name])]
+        await asyncio.gather(*workers)
+        for _ in range(n_next):
+            await out_q.put(_DONE)
+
+    async def run(self, *sources):
+        """Gerador assíncrono de resultados; aceita várias fontes (iteráveis síncronos ou assíncronos)."""
+        decode_q, extract_q, analyze_q, serialize_q, out_q = [asyncio.Queue(maxsize=self.queue_size) for _ in range(5)]
+        counter = [0]
+
+        async def feed_all():
+            # as fontes são consumidas em paralelo; put() bloqueia quando decode_q está cheia
+            try:
+                await asyncio.gather(*(self._feed(k, src, decode_q, counter) for k, src in enumerate(sources)))
+            finally:
+                # sem os sentinelas o consumidor esperaria out_q para sempre; se run() foi encerrado
+                # (cancelamento), ninguém mais lê as filas e o put bloquearia
+                if not asyncio.current_task().cancelling():
+                    for _ in range(self.concurrency['decode']):
+                        await decode_q.put(_DONE)
+
+        c = self.concurrency
+        stages = [
+            ('decode', self._decode_pair, decode_q, extract_q, self._executors['decode'], c['extract']),
+            ('extract', self._extract_pair, extract_q, analyze_q, self._executors['extract'], c['analyze']),
+            ('analyze', self._analyze, analyze_q, serialize_q, self._executors['analyze'], c['serialize']),
+            ('serialize', result_to_json, serialize_q, out_q, None, 1),
+        ]
+        tasks = [asyncio.create_task(feed_all())]
+        tasks += [asyncio.create_task(self._run_stage(*st)) for st in stages]
+        try:
+            while True:
+                msg = await out_q.get()
+                if msg is _DONE:
+                    break
+                item_id, value = msg
+                if isinstance(value, BaseException):
+                    yield {'id': item_id, 'error': f'{type(value).__name__}: {value}'}
+                else:
+                    yield {'id': item_id, 'result': value}
+            await asyncio.gather(*tasks)
+        finally:
+            # consumidor saiu antes do fim (break/exceção): cancela os estágios
+            for t in tasks:
+                t.cancel()
+
+    def close(self):
+        for ex in self._executors.values():
+            ex.shutdown(wait=False)
+
+
+async def collect(runner, *sources):
+    """Consome runner.run(*sources) e retorna a lista de resultados."""
+    return [r async for r in runner.run(*sources)]
+
+
+def _read_pairs(path):
+    """Manifesto CSV simples: uma linha 'neutral,target' por par (linhas '#' ignoradas)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            neutral, target = [p.strip() for p in line.split(',')[:2]]
+            yield {'id': f'{neutral}|{target}', 'neutral': neutral, 'target': target}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline assíncrono em estágios (decode/extract/analyze/serialize)')
+    parser.add_argument('--pairs', required=True, nargs='+', help='manifesto(s) CSV com linhas neutral,target')
+    parser.add_argument('--threshold', type=float, default=2.0)
+    parser.add_argument('--decode-workers', type=int, default=4)
+    parser.add_argument('--extract-workers', type=int, default=2)
+    parser.add_argument('--analyze-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=8)
+    args = parser.parse_args()
+
+    runner = AsyncPipelineRunner(lambda: FacialStatePipeline(threshold=args.threshold),
+                                 decode_workers=args.decode_workers, extract_workers=args.extract_workers,
+                                 analyze_workers=args.analyze_workers, queue_size=args.queue_size)
+
+    async def _main():
+        async for row in runner.run(*(_read_pairs(p) for p in args.pairs)):
+            print(json.dumps(row, ensure_ascii=False))
+
+    try:
+        asyncio.run(_main())
+    finally:
+        runner.close()
@@ -0,0 +1,194 @@
+import time
+import argparse
+import numpy as np
+from . import metrics
+from .utils import load_json
+
+NO_INPUT = -1  # stream sem quadro neste tick
+
+
+def compile_automaton(automaton, return_to_start=True):
+    """automaton.json (dict ou caminho) -> (states, symbols, table int32 (S, L), start).
+
+    Cada chave 'a->b' vira a transição table[a, b] = b (ler o rótulo b no estado a leva a b); rótulos sem
+    transição mantêm o estado. A última coluna é o símbolo 'outro' (rótulos fora do autômato, ex.: reject).
+    return_to_start=True: ler o rótulo do estado inicial volta a ele de qualquer estado (o rosto relaxou).
+    """
+    if isinstance(automaton, str):
+        automaton = load_json(automaton)
+    meta = automaton.get('_metadata', {})
+    edges = [tuple(k.split('->', 1)) for k in automaton if k != '_metadata' and '->' in k]
+    states = list(meta.get('states') or [])
+    for a, b in edges:
+        for s in (a, b):
+            if s not in states:
+                states.append(s)
+    start = meta.get('start') or (edges[0][0] if edges else states[0])
+    idx = {s: i for i, s in enumerate(states)}
+    table = np.tile(np.arange(len(states), dtype=np.int32)[:, None], (1, len(states) + 1))
+    for a, b in edges:
+        table[idx[a], idx[b]] = idx[b]
+    if return_to_start:
+        table[:, idx[start]] = idx[start]
+    return states, states + ['<outro>'], table, start
+
+
+class AutomatonRuntime:
+    """Executa o autômato sobre rótulos por quadro de muitos streams simultâneos (câmeras, sessões).
+
+    O estado de todos os streams vive em arrays NumPy indexados por slot; `tick` avança todos de uma vez
+    com um gather na tabela de transições. min_frames > 1 exige que o rótulo se repita em tantos quadros
+    seguidos antes da transição (filtra o tremor do classificador quadro a quadro).
+
+    Cada transição gera um evento {'stream', 'event': 'entered happy', 'from', 'to', 'frames', 'latency_s',
+    'dwell_s'}: latency_s é o tempo desde o primeiro quadro da sequência que disparou a transição e dwell_s
+    o tempo que o stream passou no estado anterior. Com a instrumentação ligada, o tick entra no histograma
+    do estágio 'automaton_tick' e as latências em 'automaton_enter_<estado>'.
+    """
+    def __init__(self, automaton, capacity=1024, min_frames=1, return_to_start=True, clock=time.monotonic):
+        self.states, self.symbols, self.table, self.start = compile_automaton(automaton, return_to_start)
+        self.start_code = self.states.index(self.start)
+        self.other = len(self.symbols) - 1
+        self._code = {s: i for i, s in enumerate(self.symbols)}
+        self.min_frames = int(min_frames)
+        self.clock = clock
+        self.slot_of = {}
+        self.stream_of = {}
+        self._free = []
+        self.size = 0
+        self.ticks = 0
+        self.events = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = self.size and {k: getattr(self, k) for k in ('state', 'cand', 'run', 'onset', 'entered', 'active')}
+        self.state = np.full(capacity, self.start_code, dtype=np.int32)
+        self.cand = np.full(capacity, NO_INPUT, dtype=np.int32)
+        self.run = np.zeros(capacity, dtype=np.int32)
+        self.onset = np.zeros(capacity)
+        self.entered = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+        if old:
+            for k, v in old.items():
+                getattr(self, k)[:len(v)] = v
+        self._free.extend(range(capacity - 1, self.size - 1, -1))
+        self.size = capacity
+
+    # ------------------- streams -------------------
+    def open(self, stream_id, now=None):
+        """Registra um stream (no estado inicial); retorna o slot. Dobra a capacidade se preciso."""
+        if stream_id in self.slot_of:
+            return self.slot_of[stream_id]
+        if not self._free:
+            self._alloc(2 * self.size)
+        slot = self._free.pop()
+        now = self.clock() if now is None else now
+        self.state[slot] = self.start_code
+        self.cand[slot] = NO_INPUT
+        self.run[slot] = 0
+        self.onset[slot] = self.entered[slot] = now
+        self.active[slot] = True
+        self.slot_of[stream_id] = slot
+        self.stream_of[slot] = stream_id
+        return slot
+
+    def close(self, stream_id):
+        slot = self.slot_of.pop(stream_id)
+        del self.stream_of[slot]
+        self.active[slot] = False
+        self._free.append(slot)
+
+    def state_of(self, stream_id):
+        return self.states[self.state[self.slot_of[stream_id]]]
+
+    def encode(self, labels):
+        """Rótulos (str) -> códigos int32; rótulos desconhecidos viram o símbolo 'outro'."""
+        code = self._code
+        return np.fromiter((code.get(label, self.other) for label in labels), dtype=np.int32, count=len(labels))
+
+    # ------------------- execução -------------------
+    def tick(self, codes, now=None):
+        """Avança todos os streams: codes (size,) int com o símbolo de cada slot ou NO_INPUT. Retorna os eventos."""
+        now = self.clock() if now is None else now
+        with metrics.stage('automaton_tick'):
+            codes = np.asarray(codes, dtype=np.int32)
+            has = (codes >= 0) & self.active
+            same = has & (codes == self.cand)
+            self.run = np.where(same, self.run + 1, np.where(has, 1, self.run)).astype(np.int32)
+            self.onset = np.where(has & ~same, now, self.onset)
+            self.cand = np.where(has, codes, self.cand).astype(np.int32)
+            nxt = self.table[self.state, np.where(has, codes, self.other)]
+            fired = np.flatnonzero(has & (nxt != self.state) & (self.run >= self.min_frames))
+            events = self._events(fired, nxt[fired], now)
+            self.state[fired] = nxt[fired]
+            self.entered[fired] = now
+        self.ticks += 1
+        return events
+
+    def push(self, frames, now=None):
+        """Conveniência: frames = {stream_id: rótulo} (streams novos são abertos). Retorna os eventos."""
+        now = self.clock() if now is None else now
+        slots = np.fromiter((self.open(s, now) for s in frames), dtype=np.int64, count=len(frames))
+        codes = np.full(self.size, NO_INPUT, dtype=np.int32)
+        codes[slots] = self.encode(list(frames.values()))
+        return self.tick(codes, now)
+
+    def _events(self, fired, targets, now):
+        if not len(fired):
+            return []
+        latency = now - self.onset[fired]
+        dwell = now - self.entered[fired]
+        observe = metrics.enabled()
+        events = []
+        for slot, src, dst, frames, lat, dw in zip(fired.tolist(), self.state[fired].tolist(), targets.tolist(),
+                                                   self.run[fired].tolist(), latency.tolist(), dwell.tolist()):
+            to = self.states[dst]
+            events.append({'stream': self.stream_of[slot], 'event': f'entered {to}', 'from': self.states[src],
+                           'to': to, 'frames': frames, 'latency_s': lat, 'dwell_s': dw})
+            if observe:
+                metrics.REGISTRY.observe(f'automaton_enter_{to}', lat, 0.0)
+        self.events += len(events)
+        return events
+
+    def stats(self):
+        """Streams ativos por estado e contadores de ticks/eventos."""
+        counts = np.bincount(self.state[self.active], minlength=len(self.states))
+        return {'streams': len(self.slot_of), 'capacity': self.size, 'ticks': self.ticks, 'events': self.events,
+                'by_state': dict(zip(self.states, counts.tolist()))}
+
+
+if __name__ == '__main__':
+    import json
+    parser = argparse.ArgumentParser(description='Executa o autômato sobre rótulos sintéticos de muitos streams '
+                                                 '(mede ticks/s e latência dos eventos)')
+    parser.add_argument('--automaton', default='test_images/digraphs/automaton.json')
+    parser.add_argument('--streams', type=int, default=5000)
+    parser.add_argument('--ticks', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=30.0, help='relógio simulado dos quadros')
+    parser.add_argument('--min-frames', type=int, default=3)
+    parser.add_argument('--switch', type=float, default=0.02, help='probabilidade de um stream trocar de rótulo')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rt = AutomatonRuntime(args.automaton, capacity=args.streams, min_frames=args.min_frames)
+    for s in range(args.streams):
+        rt.open(s, now=0.0)
+    rng = np.random.default_rng(args.seed)
+    n_symbols = len(rt.symbols)
+    current = np.full(args.streams, rt.start_code, dtype=np.int32)
+    latencies = []
+    elapsed = 0.0
+    for t in range(1, args.ticks + 1):
+        switch = rng.random(args.streams) < args.switch
+        current[switch] = rng.integers(0, n_symbols, int(switch.sum()))
+        codes = np.where(rng.random(args.streams) < 0.05, NO_INPUT, current)  # quadros perdidos
+        t0 = time.perf_counter()
+        events = rt.tick(codes, now=t / args.fps)
+        elapsed += time.perf_counter() - t0
+        latencies.extend(e['latency_s'] for e in events)
+    report = rt.stats()
+    report.update({'ticks_per_s': args.ticks / max(elapsed, 1e-9),
+                   'stream_updates_per_s': args.ticks * args.streams / max(elapsed, 1e-9),
+                   'latency_s_p50': float(np.percentile(latencies, 50)) if latencies else None,
+                   'latency_s_p95': float(np.percentile(latencies, 95)) if latencies else None})
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,94 @@
+import numpy as np
+from .digraph import changed_node_graph
+from .utils import bbox_from_landmarks, face_scale_from_bbox
+
+MODES = ('median', 'min')
+
+
+def _align(src, dst):
+    """Alinha src (N,2) a dst por similaridade (Procrustes: escala, rotação e translação)."""
+    mu_s, mu_d = src.mean(axis=0), dst.mean(axis=0)
+    a, b = src - mu_s, dst - mu_d
+    u, sig, vt = np.linalg.svd(a.T @ b)
+    d = np.sign(np.linalg.det(u @ vt))
+    fix = np.diag([1.0, d])
+    rot = u @ fix @ vt
+    scale = (sig * np.diag(fix)).sum() / max((a * a).sum(), 1e-12)
+    return scale * a @ rot + mu_d
+
+
+class MultiBaseline:
+    """Vários neutros de um mesmo sujeito como um tensor (R,N,2) com mediana e dispersão por landmark.
+
+    - median: mediana por landmark das referências (alinhadas à primeira por similaridade, se align=True)
+    - spread: dispersão robusta por landmark (mediana da distância das referências à mediana), em px
+    - scale: diagonal do bbox da mediana (mesma normalização de `digraph_from_difference`)
+    `diff` compara o alvo com a mediana (mode='median') ou com a referência mais próxima de cada landmark
+    (mode='min'), numa única operação vetorizada; noise_k > 0 soma ao threshold k × spread normalizado,
+    ou seja, landmarks que já tremem entre os neutros exigem um deslocamento maior.
+    """
+    def __init__(self, references, align=True):
+        refs = np.asarray(references, dtype=float)
+        if refs.ndim == 2:
+            refs = refs[None]
+        refs = refs[..., :2]
+        if align and len(refs) > 1:
+            refs = np.stack([refs[0]] + [_align(r, refs[0]) for r in refs[1:]])
+        median = np.median(refs, axis=0)
+        spread = np.median(np.sqrt(((refs - median) ** 2).sum(axis=2)), axis=0)  # (R,N) -> (N,)
+        self._set(refs, median, spread)
+
+    def _set(self, references, median, spread):
+        self.references = references
+        self.median = median
+        self.spread = spread
+        self.scale = face_scale_from_bbox(bbox_from_landmarks(median))
+
+    def __len__(self):
+        return self.references.shape[1]
+
+    @property
+    def count(self):
+        return len(self.references)
+
+    def thresholds(self, threshold=0.05, noise_k=0.0):
+        """Threshold normalizado por landmark (N,): threshold (fração, ou px se > 1) + noise_k × spread/scale."""
+        thr = float(threshold) / (self.scale + 1e-9) if threshold > 1.0 else float(threshold)
+        if not noise_k:
+            return np.full(len(self), thr)
+        return thr + noise_k * self.spread / (self.scale + 1e-9)
+
+    def difs(self, target_landmarks, mode='median'):
+        """Deslocamento normalizado por landmark (N,) em relação à mediana ou à referência mais próxima."""
+        target = np.asarray(target_landmarks, dtype=float)[:, :2]
+        if mode == 'median':
+            d = np.sqrt(((target - self.median) ** 2).sum(axis=1))
+        elif mode == 'min':
+            d = np.sqrt(((target[None] - self.references) ** 2).sum(axis=2)).min(axis=0)
+        else:
+            raise ValueError(f'mode deve ser um de {MODES}')
+        return d / (self.scale + 1e-9)
+
+    def diff(self, target_landmarks, threshold=0.05, mode='median', noise_k=0.0, build_graph=True):
+        """Mesmo retorno de digraph_from_difference: (G_changed, binary, difs)."""
+        dif = self.difs(target_landmarks, mode)
+        changed = (dif >= self.thresholds(threshold, noise_k)).astype(int)
+        if not build_graph:
+            return None, changed, dif
+        return changed_node_graph(target_landmarks, dif, changed, 0.15 * self.scale), changed, dif
+
+    def add(self, landmarks):
+        """Nova captura neutra (N,2): recalcula mediana e dispersão."""
+        self.__init__(np.concatenate([self.references, np.asarray(landmarks, dtype=float)[None, :, :2]]),
+                      align=True)
+
+    def save(self, path):
+        """Grava o tensor de referências (já alinhadas), a mediana e a dispersão num .npz."""
+        np.savez(path, references=self.references, median=self.median, spread=self.spread)
+
+    @classmethod
+    def load(cls, path):
+        obj = cls.__new__(cls)
+        with np.load(path) as data:
+            obj._set(data['references'], data['median'], data['spread'])
+        return obj
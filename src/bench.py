@@ -0,0 +1,281 @@
+import os
+import gc
+import sys
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import networkx as nx
+from .digraph import build_face_digraph, digraph_from_difference
+from .dfa import SimpleEmotionDFA
+from .turing import TuringMachine
+from .utils import map_landmarks_to_regions, save_json, save_json_atomic, load_json
+
+DEFAULT_SIZES = (68, 468, 936)
+DEFAULT_IMAGE_SIDES = (512, 1536)
+
+
+def synthetic_landmarks(n=468, seed=0, side=640.0):
+    """Landmarks sintéticos com formato de rosto: pontos numa elipse centrada na imagem (sem MediaPipe)."""
+    rng = np.random.default_rng(seed)
+    r = np.sqrt(rng.random(n))
+    theta = rng.random(n) * 2 * np.pi
+    cx, cy = side / 2.0, side / 2.0
+    pts = np.stack([cx + 0.30 * side * r * np.cos(theta), cy + 0.40 * side * r * np.sin(theta)], axis=1)
+    return pts[np.argsort(pts[:, 1], kind='stable')]
+
+
+def synthetic_target(neutral, seed=1, moved=0.15, amount=0.04):
+    """Alvo sintético: desloca `moved` dos pontos da metade inferior (boca) em `amount` do tamanho da face."""
+    rng = np.random.default_rng(seed)
+    target = neutral.copy()
+    lower = np.flatnonzero(neutral[:, 1] >= np.median(neutral[:, 1]))
+    idx = rng.choice(lower, size=max(1, int(len(neutral) * moved)), replace=False)
+    scale = float(np.ptp(neutral[:, 1]))
+    target[idx] += rng.normal(size=(len(idx), 2)) * amount * scale
+    return target
+
+
+def measure(fn, repeat=5, min_time=0.05, track_memory=True):
+    """Mediana/mínimo do tempo por chamada (loops calibrados para durar >= min_time) e pico de memória.
+
+    O pico é medido numa execução separada sob tracemalloc, para não distorcer os tempos.
+    """
+    fn()  # aquecimento (imports preguiçosos, caches)
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if dt <= 0 else max(2, min(10, int(min_time / dt) + 1))
+    times = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            times.append((time.perf_counter() - t0) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    res = {'median_s': float(np.median(times)), 'min_s': float(min(times)), 'loops': loops, 'repeat': repeat}
+    if track_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            res['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024.0
+        finally:
+            tracemalloc.stop()
+    return res
+
+
+def build_cases(sizes=DEFAULT_SIZES, image_sides=DEFAULT_IMAGE_SIDES, tmp_dir=None):
+    """Retorna lista de (nome, fn) com os estágios do pipeline em vários tamanhos."""
+    from .generate_digraphs import graph_to_dict
+    from .visualize import plot_diff_graph
+    tmp_dir = tmp_dir or tempfile.mkdtemp(prefix='bench_')
+    cases = []
+    for n in sizes:
+        neutral = synthetic_landmarks(n)
+        target = synthetic_target(neutral)
+        regions = map_landmarks_to_regions(neutral)
+        G_face = build_face_digraph(neutral)
+        binary = digraph_from_difference(neutral, target, threshold=0.01, build_graph=False)[1]
+        dfa = SimpleEmotionDFA(regions=regions)
+        tm = TuringMachine.make_majority_tm_from_length(n)
+        tape = ''.join(str(int(b)) for b in binary)
+        json_path = os.path.join(tmp_dir, f'face_{n}.json')
+
+        def run_tm(tm=tm, tape=tape, n=n):
+            tm.reset(tape)
+            return tm.run(max_steps=n + 2)
+
+        cases += [
+            (f'build_face_digraph[n={n}]', lambda lm=neutral: build_face_digraph(lm)),
+            (f'digraph_from_difference[n={n}]', lambda a=neutral, b=target: digraph_from_difference(a, b, threshold=0.01)),
+            (f'digraph_from_difference[n={n},graph=False]',
+             lambda a=neutral, b=target: digraph_from_difference(a, b, threshold=0.01, build_graph=False)),
+            (f'map_landmarks_to_regions[n={n}]', lambda lm=neutral: map_landmarks_to_regions(lm)),
+            (f'SimpleEmotionDFA.predict[n={n}]', lambda d=dfa, b=binary: d.predict(b)),
+            (f'graph_to_dict[n={n}]', lambda G=G_face: graph_to_dict(G)),
+            (f'save_json[n={n}]', lambda G=G_face, p=json_path: save_json(p, graph_to_dict(G))),
+            (f'TuringMachine.run[n={n}]', run_tm),
+        ]
+    neutral = synthetic_landmarks(468)
+    target = synthetic_target(neutral)
+    diff_graph = digraph_from_difference(neutral, target, threshold=0.01)[0]
+    for side in image_sides:
+        scale = side / 640.0
+        image = np.full((side, side, 3), 200, dtype=np.uint8)
+        lm = neutral * scale
+        for backend in ('matplotlib', 'cv2'):
+            out = os.path.join(tmp_dir, f'diff_{side}_{backend}.png')
+            cases.append((f'plot_diff_graph[side={side},backend={backend}]',
+                          lambda im=image, lm=lm, out=out, b=backend: plot_diff_graph(im, lm, diff_graph, out_path=out, backend=b)))
+    return cases, tmp_dir
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, image_sides=DEFAULT_IMAGE_SIDES, repeat=5, min_time=0.05, select=None,
+                   track_memory=True, verbose=True):
+    """Executa os casos (filtrados por substring em `select`) e retorna o documento de resultados."""
+    cases, tmp_dir = build_cases(sizes, image_sides)
+    results = {}
+    try:
+        for name, fn in cases:
+            if select and not any(s in name for s in select):
+                continue
+            results[name] = measure(fn, repeat=repeat, min_time=min_time, track_memory=track_memory)
+            if verbose:
+                r = results[name]
+                mem = f"  peak={r['peak_kb']:.0f}KB" if 'peak_kb' in r else ''
+                print(f"{name:55s} {r['median_s'] * 1e3:10.3f} ms{mem}", flush=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {
+        'meta': {
+            'created': time.time(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'networkx': nx.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def result_memory(count=10000, n=468, seed=0):
+    """Memória retida (tracemalloc) para guardar `count` resultados de análise em cada formato.
+
+    - dict: formato atual de `analyze_landmarks(..., with_graph=False)` (binary/difs como listas Python)
+    - dict+graph: o mesmo com o 'diff_graph' networkx (medido numa amostra e extrapolado para `count`)
+    - AnalysisResult: objetos com __slots__ e arrays (src.results)
+    - ResultBatch: colunas (src.results)
+    Retorna {formato: {'kb', 'bytes_per_result'}}.
+    """
+    from .results import AnalysisResult, ResultBatch
+    rng = np.random.default_rng(seed)
+    neutral = synthetic_landmarks(n)
+    regions = map_landmarks_to_regions(neutral)
+    sizes = {r: len(idxs) for r, idxs in regions.items()}
+
+    def results(k):
+        for _ in range(k):
+            difs = rng.random(n) * 0.1
+            binary = (difs >= 0.05).astype(int)
+            counts = {r: int(binary[idxs].sum()) for r, idxs in regions.items()}
+            yield binary, difs, counts
+
+    def as_dict(binary, difs, counts):
+        return {'label': 'happy', 'binary': binary.tolist(), 'diff_nodes': np.flatnonzero(binary).tolist(),
+                'counts': counts, 'sizes': dict(sizes), 'difs': difs.tolist()}
+
+    def retained(build, k):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            kept = build(k)
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        del kept
+        return used * count / k
+
+    def build_batch(k):
+        batch = ResultBatch(capacity=k)
+        for b, d, c in results(k):
+            batch.append(AnalysisResult('happy', b, d, c, sizes))
+        return batch
+
+    sample = max(1, min(count, 200))
+    target = synthetic_target(neutral, amount=0.2)
+    builders = {
+        'dict': lambda k: [as_dict(*r) for r in results(k)],
+        'dict+graph': lambda k: [dict(as_dict(*r), diff_graph=digraph_from_difference(neutral, target, 0.01)[0])
+                                 for r in results(k)],
+        'AnalysisResult': lambda k: [AnalysisResult('happy', b, d, c, sizes) for b, d, c in results(k)],
+        'ResultBatch': build_batch,
+    }
+    out = {}
+    for name, build in builders.items():
+        used = retained(build, sample if name == 'dict+graph' else count)
+        out[name] = {'kb': used / 1024.0, 'bytes_per_result': used / count}
+    return out
+
+
+def compare(current, baseline, tolerance=0.25, mem_tolerance=0.5, report_missing=True):
+    """Compara dois documentos de resultados. Regressão: tempo mediano > baseline*(1+tolerance) ou
+    pico de memória > baseline*(1+mem_tolerance). Retorna lista de linhas (dict) com 'status'."""
+    rows = []
+    base = baseline.get('results', {})
+    for name, cur in current.get('results', {}).items():
+        ref = base.get(name)
+        if ref is None:
+            rows.append({'case': name, 'status': 'new', 'ratio': None, 'mem_ratio': None})
+            continue
+        ratio = cur['median_s'] / ref['median_s'] if ref['median_s'] > 0 else float('inf')
+        mem_ratio = None
+        if 'peak_kb' in cur and ref.get('peak_kb'):
+            mem_ratio = cur['peak_kb'] / ref['peak_kb']
+        status = 'ok'
+        if ratio > 1.0 + tolerance:
+            status = 'slower'
+        elif mem_ratio is not None and mem_ratio > 1.0 + mem_tolerance:
+            status = 'more_memory'
+        elif ratio < 1.0 / (1.0 + tolerance):
+            status = 'faster'
+        rows.append({'case': name, 'status': status, 'ratio': ratio, 'mem_ratio': mem_ratio})
+    for name in (base if report_missing else ()):
+        if name not in current.get('results', {}):
+            rows.append({'case': name, 'status': 'missing', 'ratio': None, 'mem_ratio': None})
+    return rows
+
+
+def print_comparison(rows):
+    for r in rows:
+        ratio = f"{r['ratio']:.2f}x" if r['ratio'] is not None else '-'
+        mem = f"{r['mem_ratio']:.2f}x" if r['mem_ratio'] is not None else '-'
+        flag = '  <-- REGRESSÃO' if r['status'] in ('slower', 'more_memory') else ''
+        print(f"{r['case']:55s} tempo {ratio:>8s}  mem {mem:>8s}  {r['status']}{flag}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks dos estágios do pipeline (landmarks sintéticos)')
+    parser.add_argument('--out', default=None, help='grava os resultados (JSON) neste caminho, ex.: bench_baseline.json')
+    parser.add_argument('--compare', default=None, help='baseline JSON para comparar; sai com código 1 se houver regressão')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='aumento relativo de tempo tolerado (0.25 = 25%%)')
+    parser.add_argument('--mem-tolerance', type=float, default=0.5, help='aumento relativo de pico de memória tolerado')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='números de landmarks')
+    parser.add_argument('--image-sides', type=int, nargs='+', default=list(DEFAULT_IMAGE_SIDES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='duração mínima (s) de cada repetição')
+    parser.add_argument('--select', nargs='+', default=None, help='só casos cujo nome contém uma destas substrings')
+    parser.add_argument('--no-memory', action='store_true', help='não mede pico de memória (tracemalloc)')
+    parser.add_argument('--result-memory', type=int, default=None, metavar='N',
+                        help='só compara a memória para guardar N resultados (dict x AnalysisResult x ResultBatch)')
+    args = parser.parse_args()
+
+    if args.result_memory:
+        for name, r in result_memory(args.result_memory).items():
+            print(f"{name:20s} {r['kb'] / 1024.0:10.1f} MB  {r['bytes_per_result']:10.0f} B/resultado")
+        sys.exit(0)
+    doc = run_benchmarks(args.sizes, args.image_sides, repeat=args.repeat, min_time=args.min_time,
+                         select=args.select, track_memory=not args.no_memory)
+    if args.out:
+        save_json_atomic(args.out, doc)
+        print('Resultados salvos em', args.out)
+    if args.compare:
+        rows = compare(doc, load_json(args.compare), tolerance=args.tolerance, mem_tolerance=args.mem_tolerance,
+                       report_missing=not args.select)
+        print_comparison(rows)
+        if any(r['status'] in ('slower', 'more_memory') for r in rows):
+            sys.exit(1)
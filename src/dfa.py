@@ -21,6 +21,26 @@ class SimpleEmotionDFA:
         self.eyes_thresh = eyes_thresh
         self.brows_thresh = brows_thresh
 
+    CONFIG_KEYS = ('mouth_thresh', 'eyes_thresh', 'brows_thresh')
+
+    def to_config(self):
+        """Thresholds do DFA como dict (formato de dfa_config.json)."""
+        return {k: float(getattr(self, k)) for k in self.CONFIG_KEYS}
+
+    @classmethod
+    def from_config(cls, config, regions=None):
+        """Cria o DFA a partir de um dict/arquivo de configuração (chaves extras, ex. 'threshold', são ignoradas)."""
+        return cls(regions=regions, **{k: float(config[k]) for k in cls.CONFIG_KEYS if k in config})
+
+    def save_config(self, path, **extra):
+        from .utils import save_json_atomic
+        save_json_atomic(path, dict(self.to_config(), **extra))
+
+    @classmethod
+    def load_config(cls, path, regions=None):
+        from .utils import load_json
+        return cls.from_config(load_json(path), regions=regions)
+
     def predict(self, binary_vec):
         # se fornecido dicionário com contagens
         if isinstance(binary_vec, dict) and 'counts' in binary_vec:
@@ -27,12 +27,13 @@ def build_face_digraph(landmarks):
     return G
 
 
-def digraph_from_difference(neutral_landmarks, target_landmarks, threshold=0.05, normalize=True):
+def digraph_from_difference(neutral_landmarks, target_landmarks, threshold=0.05, normalize=True, build_graph=True):
     """Gera um digrafo de diferença.
 
     - Se normalize=True: calcula deslocamento por nó normalizado pela escala da face (diagonal do bbox).
       threshold nesse caso é uma fração (ex.: 0.05 = 5% da diagonal).
-    - Retorna (G_changed, binary_vector)
+    - build_graph=False pula a construção do grafo (G_changed é None) quando só os vetores interessam.
+    - Retorna (G_changed, binary_vector, difs)
     """
     N = len(neutral_landmarks)
     if normalize:
@@ -49,20 +50,41 @@ def digraph_from_difference(neutral_landmarks, target_landmarks, threshold=0.05,
         dif = np.linalg.norm(target_landmarks - neutral_landmarks, axis=1)
 
     changed = (dif >= thr).astype(int)
-    G = nx.DiGraph()
-    for i in range(N):
-        if changed[i]:
-            G.add_node(i, change=float(dif[i]))
-
+    if not build_graph:
+        return None, changed, dif
     # conectar nós que mudaram entre si se estiverem a menos de 0.15 * scale (se normalize) ou 50 px
-    nodes = list(G.nodes())
-    for i in range(len(nodes)):
-        for j in range(i+1, len(nodes)):
-            a = nodes[i]
-            b = nodes[j]
-            dist = np.linalg.norm(target_landmarks[a] - target_landmarks[b])
-            limit = 0.15 * scale if normalize else 50.0
-            if dist < limit:
-                G.add_edge(a, b, weight=float(dist))
-                G.add_edge(b, a, weight=float(dist))
+    limit = 0.15 * scale if normalize else 50.0
+    G = changed_node_graph(target_landmarks, dif, changed, limit)
     return G, changed, dif
+
+
+def changed_edge_arrays(target_landmarks, changed, limit):
+    """Arestas entre os nós alterados a menos de `limit` no alvo, direto em arrays: ((E,2) índices, (E,) pesos).
+
+    As distâncias entre os K nós alterados são calculadas por broadcasting; cada par (i<j, linha a linha)
+    aparece nos dois sentidos, na mesma ordem do laço par a par original.
+    """
+    nodes = np.flatnonzero(np.asarray(changed))
+    if len(nodes) < 2:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+    pts = np.asarray(target_landmarks, dtype=float)[nodes]
+    delta = pts[:, None, :] - pts[None, :, :]
+    dist = np.sqrt((delta * delta).sum(axis=2))
+    iu, ju = np.triu_indices(len(nodes), 1)
+    close = dist[iu, ju] < limit
+    a, b, w = nodes[iu[close]], nodes[ju[close]], dist[iu[close], ju[close]]
+    edges = np.stack([np.stack([a, b], axis=1), np.stack([b, a], axis=1)], axis=1).reshape(-1, 2)
+    return edges, np.repeat(w, 2)
+
+
+def changed_node_graph(target_landmarks, dif, changed, limit, edge_arrays=None):
+    """Grafo dos nós que mudaram, com arestas (nos dois sentidos) entre pares a menos de `limit` no alvo.
+
+    Versão vetorizada do laço par a par (ver changed_edge_arrays); edge_arrays reaproveita arrays já calculados.
+    """
+    nodes = np.flatnonzero(np.asarray(changed))
+    G = nx.DiGraph()
+    G.add_nodes_from((int(i), {'change': float(dif[i])}) for i in nodes)
+    edges, weights = edge_arrays if edge_arrays is not None else changed_edge_arrays(target_landmarks, changed, limit)
+    G.add_edges_from((a, b, {'weight': w}) for (a, b), w in zip(edges.tolist(), weights.tolist()))
+    return G
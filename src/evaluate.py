@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import multiprocessing
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from .utils import save_json_atomic, load_json, ensure_dir
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+REGION_CODES = {'mouth': '1', 'eyes': '2', 'brows': '3'}
+
+
+# ------------------- dataset -------------------
+def label_from_filename(name):
+    """'happy.jpg' -> 'happy'; 'happy_02.jpg' / 'Happy-2.png' -> 'happy'."""
+    stem = os.path.splitext(os.path.basename(name))[0].lower()
+    for sep in ('_', '-', ' '):
+        stem = stem.split(sep)[0]
+    return stem
+
+
+def discover(root, exts=IMAGE_EXTS):
+    """Itens do dataset root/<sujeito>/{neutral.jpg, <rótulo>.jpg, ...}, ordenados por sujeito.
+
+    Sujeitos sem imagem neutra são ignorados. Cada item: {'id', 'subject', 'label', 'neutral', 'target'}.
+    """
+    items = []
+    for subject in sorted(os.listdir(root)):
+        sdir = os.path.join(root, subject)
+        if not os.path.isdir(sdir):
+            continue
+        files = sorted(f for f in os.listdir(sdir) if f.lower().endswith(exts))
+        neutral = next((f for f in files if label_from_filename(f) == 'neutral'), None)
+        if neutral is None:
+            continue
+        for f in files:
+            if f == neutral:
+                continue
+            items.append({'id': f'{subject}/{f}', 'subject': subject, 'label': label_from_filename(f),
+                          'neutral': os.path.join(sdir, neutral), 'target': os.path.join(sdir, f)})
+    return items
+
+
+# ------------------- execução nos workers -------------------
+_worker = {}
+
+
+def _init_worker(threshold, majority_threshold, dfa_config=None):
+    from .pipeline import FacialStatePipeline
+    if dfa_config:
+        _worker['pipeline'] = FacialStatePipeline.from_config(dfa_config)
+    else:
+        _worker['pipeline'] = FacialStatePipeline(threshold=threshold)
+    _worker['majority_threshold'] = majority_threshold
+    _worker['cache'] = OrderedDict()
+
+
+def _worker_landmarks(path):
+    # a neutra de um sujeito é reutilizada por todas as expressões dele (itens chegam agrupados por sujeito)
+    from .image_loader import imread
+    cache = _worker['cache']
+    if path in cache:
+        cache.move_to_end(path)
+        return cache[path]
+    img = imread(path)
+    if img is None:
+        raise FileNotFoundError(path)
+    lm = _worker['pipeline'].extractor.from_bgr(img)
+    cache[path] = lm
+    while len(cache) > 64:
+        cache.popitem(last=False)
+    return lm
+
+
+def encode_difs(difs):
+    return base64.b64encode(np.asarray(difs, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def decode_difs(row):
+    """difs (float32) de uma linha do checkpoint."""
+    return np.frombuffer(base64.b64decode(row['difs_b64']), dtype=np.float32)
+
+
+def evaluate_landmarks(pipeline, n_lm, t_lm, majority_threshold):
+    """Predições do SimpleEmotionDFA (via pipeline) e da regra de maioria de generate_digraphs.decide,
+    mais os dados que o tuner reaproveita (difs normalizados, escala da face e região de cada landmark)."""
+    from .generate_digraphs import decide
+    from .digraph import digraph_from_difference
+    from .utils import bbox_from_landmarks, face_scale_from_bbox, map_landmarks_to_regions
+    res = pipeline.analyze_landmarks(n_lm, t_lm, with_graph=False)
+    if res.get('label') == 'reject':
+        return {'status': res.get('reason', 'reject'), 'pred_dfa': 'reject', 'pred_majority': 'reject'}
+    _, binary_major, _ = digraph_from_difference(n_lm, t_lm, threshold=majority_threshold, build_graph=False)
+    difs = np.asarray(res['difs'], dtype=float)
+    regions = map_landmarks_to_regions(n_lm, bbox=bbox_from_landmarks(n_lm))
+    codes = ['0'] * len(difs)
+    for r, idxs in regions.items():
+        for i in idxs:
+            codes[i] = REGION_CODES.get(r, '0')
+    return {
+        'status': 'ok',
+        'pred_dfa': res['label'],
+        'pred_majority': decide(binary_major),
+        'scale': face_scale_from_bbox(bbox_from_landmarks(n_lm)),
+        'regions': ''.join(codes),
+        'difs_b64': encode_difs(difs),
+    }
+
+
+def evaluate_chunk(items):
+    """Executa no worker: uma linha de checkpoint por item (erros viram status='error')."""
+    rows = []
+    pipeline = _worker['pipeline']
+    for item in items:
+        row = {'id': item['id'], 'subject': item['subject'], 'label': item['label']}
+        t0 = time.perf_counter()
+        try:
+            n_lm = _worker_landmarks(item['neutral'])
+            t_lm = _worker_landmarks(item['target'])
+            t1 = time.perf_counter()
+            if n_lm is None or t_lm is None:
+                row.update({'status': 'no_face', 'pred_dfa': 'reject', 'pred_majority': 'reject'})
+            else:
+                row.update(evaluate_landmarks(pipeline, n_lm, t_lm, _worker['majority_threshold']))
+            row['extract_ms'] = (t1 - t0) * 1000.0
+            row['analyze_ms'] = (time.perf_counter() - t1) * 1000.0
+        except Exception as e:
+            row.update({'status': 'error', 'error': f'{type(e).__name__}: {e}',
+                        'pred_dfa': 'reject', 'pred_majority': 'reject',
+                        'extract_ms': (time.perf_counter() - t0) * 1000.0, 'analyze_ms': 0.0})
+        rows.append(row)
+    return rows
+
+
+# ------------------- checkpoint -------------------
+def read_checkpoint(path):
+    """Linhas já concluídas (dict por id). Uma última linha truncada (queda no meio da escrita) é ignorada."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            done[row['id']] = row
+    return done
+
+
+def truncate_partial_line(path):
+    """Corta o arquivo após o último '\\n' (descarta uma linha truncada antes de voltar a anexar)."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b'\n')
+            if nl >= 0:
+                pos = pos - step + nl + 1
+                break
+            pos -= step
+        if pos != end:
+            f.truncate(pos)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run(dataset, out_dir, workers=None, threshold=2.0, majority_threshold=0.05, chunk_size=16,
+        retry_errors=False, verbose=True, dfa_config=None):
+    """Avalia o dataset gravando cada item concluído em out_dir/results.jsonl; retoma de onde parou.
+
+    Retorna o relatório (ver build_report), também gravado em out_dir/report.json.
+    """
+    ensure_dir(out_dir)
+    config = {'dataset': os.path.abspath(dataset), 'threshold': threshold, 'majority_threshold': majority_threshold}
+    if dfa_config:
+        # o DFA configurado (src.tune) define também o threshold do diff
+        config['dfa_config'] = load_json(dfa_config)
+    config_path = os.path.join(out_dir, 'config.json')
+    if os.path.exists(config_path):
+        previous = load_json(config_path)
+        if previous != config:
+            raise ValueError(f'{out_dir} tem checkpoint de outra configuração ({previous}); use outro --out')
+    else:
+        save_json_atomic(config_path, config)
+
+    ckpt_path = os.path.join(out_dir, 'results.jsonl')
+    done = read_checkpoint(ckpt_path)
+    # a próxima linha anexada não pode ficar colada num fragmento deixado por uma queda
+    truncate_partial_line(ckpt_path)
+    if retry_errors:
+        done = {k: v for k, v in done.items() if v.get('status') != 'error'}
+    items = discover(dataset)
+    pending = [it for it in items if it['id'] not in done]
+    if verbose:
+        print(f'{len(items)} itens, {len(items) - len(pending)} já concluídos, {len(pending)} pendentes', flush=True)
+
+    t_start = time.perf_counter()
+    n_done = 0
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        ctx = multiprocessing.get_context('spawn')
+        with open(ckpt_path, 'a', encoding='utf-8') as ckpt, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                    initargs=(threshold, majority_threshold, dfa_config)) as pool:
+            chunks = _chunks(pending, chunk_size)
+            in_flight = set()
+            # no máximo 2 lotes por worker na fila: memória constante mesmo com dezenas de milhares de itens
+            for chunk in chunks:
+                in_flight.add(pool.submit(evaluate_chunk, chunk))
+                if len(in_flight) >= 2 * workers:
+                    break
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    rows = fut.result()
+                    for row in rows:
+                        ckpt.write(json.dumps(row, ensure_ascii=False) + '\n')
+                        done[row['id']] = row
+                    ckpt.flush()
+                    os.fsync(ckpt.fileno())
+                    n_done += len(rows)
+                    nxt = next(chunks, None)
+                    if nxt is not None:
+                        in_flight.add(pool.submit(evaluate_chunk, nxt))
+                if verbose:
+                    rate = n_done / max(time.perf_counter() - t_start, 1e-9)
+                    print(f'\r{n_done}/{len(pending)} ({rate:.1f} itens/s)', end='', flush=True)
+        if verbose:
+            print()
+
+    rows = [done[it['id']] for it in items if it['id'] in done]
+    report = build_report(rows, wall_s=time.perf_counter() - t_start, new_items=n_done)
+    save_json_atomic(os.path.join(out_dir, 'report.json'), report)
+    return report
+
+
+# ------------------- relatório -------------------
+def confusion_matrix(rows, pred_key):
+    """{rótulo_real: {predição: contagem}} e a acurácia (itens com status 'ok')."""
+    matrix = defaultdict(lambda: defaultdict(int))
+    correct = total = 0
+    for r in rows:
+        if r.get('status') != 'ok':
+            continue
+        matrix[r['label']][r[pred_key]] += 1
+        total += 1
+        correct += int(r['label'] == r[pred_key])
+    return {k: dict(v) for k, v in sorted(matrix.items())}, (correct / total if total else None)
+
+
+def build_report(rows, wall_s=None, new_items=0):
+    """Matrizes de confusão (DFA e maioria), contagem de status e vazão por classe."""
+    status = defaultdict(int)
+    per_class = defaultdict(lambda: {'count': 0, 'extract_ms': 0.0, 'analyze_ms': 0.0})
+    for r in rows:
+        status[r.get('status', 'error')] += 1
+        c = per_class[r['label']]
+        c['count'] += 1
+        c['extract_ms'] += r.get('extract_ms', 0.0)
+        c['analyze_ms'] += r.get('analyze_ms', 0.0)
+    throughput = {}
+    for label, c in sorted(per_class.items()):
+        busy_s = (c['extract_ms'] + c['analyze_ms']) / 1000.0
+        throughput[label] = {
+            'count': c['count'],
+            'mean_extract_ms': c['extract_ms'] / c['count'],
+            'mean_analyze_ms': c['analyze_ms'] / c['count'],
+            'items_per_s_per_worker': c['count'] / busy_s if busy_s > 0 else None,
+        }
+    dfa, dfa_acc = confusion_matrix(rows, 'pred_dfa')
+    major, major_acc = confusion_matrix(rows, 'pred_majority')
+    return {
+        'items': len(rows),
+        'status': dict(status),
+        'dfa': {'confusion': dfa, 'accuracy': dfa_acc},
+        'majority': {'confusion': major, 'accuracy': major_acc},
+        'throughput': throughput,
+        'run': {'wall_s': wall_s, 'new_items': new_items,
+                'items_per_s': (new_items / wall_s) if wall_s and new_items else None},
+    }
+
+
+def format_confusion(confusion):
+    preds = sorted({p for row in confusion.values() for p in row})
+    width = max([len('real\\pred')] + [len(x) for x in list(confusion) + preds]) + 2
+    lines = ['real\\pred'.ljust(width) + ''.join(p.rjust(width) for p in preds)]
+    for label, row in confusion.items():
+        lines.append(label.ljust(width) + ''.join(str(row.get(p, 0)).rjust(width) for p in preds))
+    return '\n'.join(lines)
+
+
+def print_report(report, out=sys.stdout):
+    print(f"Itens: {report['items']}  status: {report['status']}", file=out)
+    for key, title in (('dfa', 'SimpleEmotionDFA'), ('majority', 'Maioria (generate_digraphs.decide)')):
+        acc = report[key]['accuracy']
+        print(f"\n{title} — acurácia: {acc:.3f}" if acc is not None else f'\n{title} — sem itens válidos', file=out)
+        if report[key]['confusion']:
+            print(format_confusion(report[key]['confusion']), file=out)
+    print('\nVazão por classe:', file=out)
+    for label, t in report['throughput'].items():
+        ips = t['items_per_s_per_worker']
+        print(f"  {label:12s} n={t['count']:6d}  extract={t['mean_extract_ms']:8.1f} ms  "
+              f"analyze={t['mean_analyze_ms']:7.2f} ms  {ips or 0:.2f} itens/s/worker", file=out)
+    if report['run'].get('items_per_s'):
+        print(f"\nEsta execução: {report['run']['new_items']} itens em {report['run']['wall_s']:.1f}s "
+              f"({report['run']['items_per_s']:.2f} itens/s)", file=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Avalia o pipeline num dataset rotulado (root/<sujeito>/neutral.jpg, happy.jpg, ...)')
+    parser.add_argument('--dataset', required=True)
+    parser.add_argument('--out', required=True, help='diretório do checkpoint (results.jsonl) e do relatório')
+    parser.add_argument('--workers', type=int, default=None, help='processos (padrão: nº de CPUs)')
+    parser.add_argument('--threshold', type=float, default=2.0, help='threshold do pipeline/DFA (px se >1, fração se <=1)')
+    parser.add_argument('--majority-threshold', type=float, default=0.05, help='threshold da regra de maioria')
+    parser.add_argument('--chunk-size', type=int, default=16, help='itens por tarefa enviada aos workers')
+    parser.add_argument('--retry-errors', action='store_true', help='reprocessa itens que falharam')
+    parser.add_argument('--report-only', action='store_true', help='só recalcula o relatório a partir do checkpoint')
+    parser.add_argument('--dfa-config', default=None, help='dfa_config.json gerado por src.tune (substitui --threshold)')
+    args = parser.parse_args()
+
+    if args.report_only:
+        rows = list(read_checkpoint(os.path.join(args.out, 'results.jsonl')).values())
+        report = build_report(rows)
+        save_json_atomic(os.path.join(args.out, 'report.json'), report)
+    else:
+        report = run(args.dataset, args.out, workers=args.workers, threshold=args.threshold,
+                     majority_threshold=args.majority_threshold, chunk_size=args.chunk_size,
+                     retry_errors=args.retry_errors, dfa_config=args.dfa_config)
+    print_report(report)
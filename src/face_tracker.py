@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class FaceTracker:
+    """IDs estáveis para faces entre quadros por casamento de centroides (sem re-identificação).
+
+    A cada update(faces (F,N,2)) as faces são casadas com as trilhas ativas pelo par mais próximo primeiro
+    (guloso sobre a matriz de distâncias F×T), aceitando só distâncias até `max_distance` × diagonal do bbox
+    da face. Faces sem par ganham um ID novo; trilhas sem face por mais de `max_missed` quadros são removidas.
+    """
+    def __init__(self, max_distance=0.5, max_missed=5):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.next_id = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.centroids = np.zeros((0, 2), dtype=float)
+        self.missed = np.zeros(0, dtype=np.int64)
+
+    def update(self, faces):
+        """Retorna a lista de IDs (um por face, na ordem de `faces`)."""
+        faces = np.asarray(faces, dtype=float)
+        n_faces = len(faces)
+        if n_faces:
+            lo = faces.min(axis=1)
+            hi = faces.max(axis=1)
+            centroids = (lo + hi) / 2.0
+            scales = np.hypot(*(hi - lo).T)
+        else:
+            centroids = np.zeros((0, 2))
+            scales = np.zeros(0)
+
+        assigned = np.full(n_faces, -1, dtype=np.int64)
+        track_used = np.zeros(len(self.ids), dtype=bool)
+        if n_faces and len(self.ids):
+            dist = np.linalg.norm(centroids[:, None, :] - self.centroids[None, :, :], axis=2)
+            limit = (self.max_distance * scales)[:, None]
+            order = np.argsort(dist, axis=None)
+            for flat in order:
+                f, t = divmod(int(flat), len(self.ids))
+                if dist[f, t] > limit[f, 0]:
+                    continue
+                if assigned[f] >= 0 or track_used[t]:
+                    continue
+                assigned[f] = t
+                track_used[t] = True
+
+        ids = np.empty(n_faces, dtype=np.int64)
+        new_ids, new_centroids = [], []
+        for f in range(n_faces):
+            if assigned[f] >= 0:
+                t = assigned[f]
+                ids[f] = self.ids[t]
+                self.centroids[t] = centroids[f]
+            else:
+                ids[f] = self.next_id
+                self.next_id += 1
+                new_ids.append(ids[f])
+                new_centroids.append(centroids[f])
+        self.missed = np.where(track_used, 0, self.missed + 1)
+        keep = self.missed <= self.max_missed
+        self.ids = np.concatenate([self.ids[keep], np.asarray(new_ids, dtype=np.int64)])
+        self.centroids = np.concatenate([self.centroids[keep], np.asarray(new_centroids, dtype=float).reshape(-1, 2)])
+        self.missed = np.concatenate([self.missed[keep], np.zeros(len(new_ids), dtype=np.int64)])
+        return ids.tolist()
+
+    def active(self):
+        return self.ids.tolist()
+
+    def reset(self):
+        self.__init__(self.max_distance, self.max_missed)
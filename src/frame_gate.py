@@ -0,0 +1,100 @@
+import argparse
+import numpy as np
+import cv2
+
+
+def gray_thumbnail(bgr, size=(64, 48)):
+    """Miniatura em tons de cinza (float32, 0..1): reduz primeiro (INTER_AREA) e só depois converte a cor."""
+    small = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.float32) * (1.0 / 255.0)
+
+
+def dhash(bgr, hash_size=8):
+    """Hash perceptual por diferença (dHash): hash_size² bits comparando vizinhos horizontais."""
+    g = gray_thumbnail(bgr, (hash_size + 1, hash_size))
+    return np.packbits(g[:, 1:] > g[:, :-1])
+
+
+class FrameGate:
+    """Decide se um quadro precisa passar pelo FaceMesh ou se o resultado anterior pode ser reaproveitado.
+
+    - method='absdiff': média de |Δ| entre miniaturas em cinza (0..1) contra o último quadro processado
+    - method='dhash': fração de bits diferentes entre os dHash
+    Abaixo de `threshold` o quadro é pulado; `max_skip` força reprocessar após tantos pulos seguidos
+    (limita a deriva lenta, ex.: mudança gradual de luz). A comparação é sempre contra o último quadro
+    processado, não contra o anterior, para que mudanças lentas se acumulem.
+    """
+    def __init__(self, threshold=0.02, method='absdiff', size=(64, 48), max_skip=30):
+        if method not in ('absdiff', 'dhash'):
+            raise ValueError(f'método desconhecido: {method}')
+        self.threshold = threshold
+        self.method = method
+        self.size = size
+        self.max_skip = max_skip
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.result = None
+        self.run_length = 0
+        self.processed = 0
+        self.skipped = 0
+
+    def signature(self, bgr):
+        return gray_thumbnail(bgr, self.size) if self.method == 'absdiff' else dhash(bgr)
+
+    def change(self, sig):
+        """Mudança (0..1) da assinatura em relação ao último quadro processado."""
+        if self.reference is None:
+            return 1.0
+        if self.method == 'absdiff':
+            return float(np.abs(sig - self.reference).mean())
+        return float(np.unpackbits(np.bitwise_xor(sig, self.reference)).mean())
+
+    def run(self, bgr, fn):
+        """fn(bgr) só se o quadro mudou; senão devolve o resultado anterior. Retorna (resultado, pulou)."""
+        sig = self.signature(bgr)
+        if (self.result is not None and self.run_length < self.max_skip
+                and self.change(sig) < self.threshold):
+            self.skipped += 1
+            self.run_length += 1
+            return self.result, True
+        self.result = fn(bgr)
+        self.reference = sig
+        self.run_length = 0
+        self.processed += 1
+        return self.result, False
+
+    def stats(self):
+        total = self.processed + self.skipped
+        return {'frames': total, 'processed': self.processed, 'skipped': self.skipped,
+                'skip_ratio': self.skipped / total if total else 0.0}
+
+
+if __name__ == '__main__':
+    import json
+    from .pipeline import FacialStatePipeline
+    from .landmark_extractor import LandmarkExtractor
+    parser = argparse.ArgumentParser(description='Analisa um vídeo pulando o FaceMesh em quadros quase iguais')
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--threshold', type=float, default=0.02)
+    parser.add_argument('--method', choices=('absdiff', 'dhash'), default='absdiff')
+    parser.add_argument('--max-skip', type=int, default=30)
+    parser.add_argument('--max-faces', type=int, default=1)
+    args = parser.parse_args()
+
+    pipeline = FacialStatePipeline(extractor=LandmarkExtractor(max_num_faces=args.max_faces))
+    gate = FrameGate(args.threshold, method=args.method, max_skip=args.max_skip)
+    cap = cv2.VideoCapture(args.video)
+    labels = {}
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        results, _ = gate.run(frame, pipeline.analyze_frame)
+        for r in results:
+            labels[r['label']] = labels.get(r['label'], 0) + 1
+    cap.release()
+    print(json.dumps({'gate': gate.stats(), 'labels': labels}, indent=2))
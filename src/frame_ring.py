@@ -0,0 +1,283 @@
+import argparse
+import multiprocessing
+import queue as queue_mod
+from multiprocessing import shared_memory
+import numpy as np
+
+# status dos resultados
+EMPTY, OK, NO_FACE, ERROR = 0, 1, 2, 3
+
+
+class FrameRing:
+    """Anel de quadros BGR em memória compartilhada, com os resultados (landmarks) num segundo bloco compartilhado.
+
+    Quadros e landmarks nunca passam por pickle: as filas só carregam inteiros (slot, seq). Fluxo:
+    produtor `acquire()` um slot livre, escreve no view `frames[slot]` e `publish(slot)`; um worker lê o view,
+    grava `landmarks[slot]`, `result_seq[slot]` e `status[slot]` e avisa em `done`; o consumidor lê o resultado
+    (conferindo o número de sequência) e `release(slot)` devolve o slot ao produtor.
+
+    `spec()` é um dict pequeno (nomes dos blocos, formas) para reabrir o anel em outro processo com `attach`.
+    """
+    def __init__(self, slots, shape, n_landmarks=468, ctx=None, _spec=None):
+        self.slots = int(slots)
+        self.shape = tuple(shape)
+        self.n_landmarks = int(n_landmarks)
+        frame_bytes = self.slots * int(np.prod(self.shape))
+        result_bytes = self.slots * (self.n_landmarks * 2 * 4 + 8 + 1)
+        if _spec is None:
+            self.owner = True
+            self._frames_shm = shared_memory.SharedMemory(create=True, size=frame_bytes)
+            self._results_shm = shared_memory.SharedMemory(create=True, size=result_bytes)
+            ctx = ctx or multiprocessing.get_context('spawn')
+            # slots livres só circulam no processo dono (produtor/consumidor): fila local entre threads
+            self.free = queue_mod.Queue()
+            self.ready = ctx.Queue()
+            self.done = ctx.Queue()
+            for slot in range(self.slots):
+                self.free.put(slot)
+        else:
+            self.owner = False
+            self._frames_shm = shared_memory.SharedMemory(name=_spec['frames'])
+            self._results_shm = shared_memory.SharedMemory(name=_spec['results'])
+            self.free = None
+            self.ready, self.done = _spec['queues']
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self._frames_shm.buf)
+        buf = self._results_shm.buf
+        lm_bytes = self.slots * self.n_landmarks * 2 * 4
+        self.landmarks = np.ndarray((self.slots, self.n_landmarks, 2), dtype=np.float32, buffer=buf)
+        self.result_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=buf, offset=lm_bytes)
+        self.status = np.ndarray((self.slots,), dtype=np.int8, buffer=buf, offset=lm_bytes + self.slots * 8)
+        if self.owner:
+            self.result_seq[:] = -1
+            self.status[:] = EMPTY
+        self._seq = 0
+
+    def spec(self):
+        return {'frames': self._frames_shm.name, 'results': self._results_shm.name, 'slots': self.slots,
+                'shape': self.shape, 'n_landmarks': self.n_landmarks, 'queues': (self.ready, self.done)}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec['slots'], spec['shape'], spec['n_landmarks'], _spec=spec)
+
+    # ------------------- produtor -------------------
+    def acquire(self, timeout=None):
+        """Slot livre (bloqueia até um ser liberado); escreva o quadro em self.frames[slot]."""
+        return self.free.get(timeout=timeout)
+
+    def publish(self, slot):
+        """Entrega o slot aos workers; retorna o número de sequência do quadro."""
+        seq = self._seq
+        self._seq += 1
+        self.result_seq[slot] = -1
+        self.status[slot] = EMPTY
+        self.ready.put((slot, seq))
+        return seq
+
+    def put(self, frame, timeout=None):
+        """Copia um quadro (mesma forma do anel) para um slot livre e o publica. Retorna o seq."""
+        if frame.shape != self.shape:
+            raise ValueError(f'quadro {frame.shape} != forma do anel {self.shape}')
+        slot = self.acquire(timeout)
+        self.frames[slot] = frame
+        return self.publish(slot)
+
+    # ------------------- consumidor -------------------
+    def get_result(self, timeout=None):
+        """Próximo resultado pronto: (seq, landmarks (N,2) copiados ou None). Libera o slot."""
+        slot, seq = self.done.get(timeout=timeout)
+        if self.result_seq[slot] != seq:
+            raise RuntimeError(f'slot {slot}: seq {int(self.result_seq[slot])} != {seq}')
+        lm = self.landmarks[slot].copy() if self.status[slot] == OK else None
+        self.release(slot)
+        return seq, lm
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        self.frames = self.landmarks = self.result_seq = self.status = None
+        self._frames_shm.close()
+        self._results_shm.close()
+        if self.owner:
+            self._frames_shm.unlink()
+            self._results_shm.unlink()
+
+
+def extraction_worker(spec, extractor_factory=None):
+    """Loop de um processo worker: lê quadros do anel como views e grava os landmarks no bloco de resultados."""
+    ring = FrameRing.attach(spec)
+    if extractor_factory is None:
+        from .landmark_extractor import LandmarkExtractor
+        extractor_factory = LandmarkExtractor
+    extractor = extractor_factory()
+    try:
+        while True:
+            item = ring.ready.get()
+            if item is None:
+                break
+            slot, seq = item
+            try:
+                lm = extractor.from_bgr(ring.frames[slot])
+                if lm is None or len(lm) != ring.n_landmarks:
+                    ring.status[slot] = NO_FACE
+                else:
+                    ring.landmarks[slot] = np.asarray(lm)[:, :2]
+                    ring.status[slot] = OK
+            except Exception:
+                ring.status[slot] = ERROR
+            ring.result_seq[slot] = seq
+            ring.done.put((slot, seq))
+    finally:
+        ring.close()
+
+
+class RingExtractorPool:
+    """Processos de extração de landmarks alimentados por um FrameRing (sem pickle dos quadros).
+
+    submit(frame) -> seq e get_result() -> (seq, landmarks|None) na ordem em que ficam prontos;
+    process(frames) / process_video(path) geram os resultados na ordem dos quadros. extractor_factory deve ser importável
+    (o pool usa spawn).
+    """
+    def __init__(self, shape, workers=2, slots=None, n_landmarks=468, extractor_factory=None):
+        ctx = multiprocessing.get_context('spawn')
+        self.ring = FrameRing(slots or 2 * workers, shape, n_landmarks, ctx=ctx)
+        self.pending = 0
+        self.procs = [ctx.Process(target=extraction_worker, args=(self.ring.spec(), extractor_factory), daemon=True)
+                      for _ in range(workers)]
+        for p in self.procs:
+            p.start()
+
+    def submit(self, frame, timeout=None):
+        seq = self.ring.put(frame, timeout=timeout)
+        self.pending += 1
+        return seq
+
+    def acquire(self, timeout=None):
+        """Slot livre para escrever direto (ex.: cap.read(self.ring.frames[slot])); depois publish(slot)."""
+        return self.ring.acquire(timeout)
+
+    def publish(self, slot):
+        self.pending += 1
+        return self.ring.publish(slot)
+
+    def get_result(self, timeout=None):
+        """Próximo resultado pronto; RuntimeError se todos os workers morreram (evita esperar para sempre)."""
+        waited = 0.0
+        while True:
+            try:
+                res = self.ring.get_result(timeout=1.0)
+                break
+            except queue_mod.Empty:
+                waited += 1.0
+                if not any(p.is_alive() for p in self.procs):
+                    raise RuntimeError('todos os workers de extração terminaram: '
+                                       + ', '.join(str(p.exitcode) for p in self.procs))
+                if timeout is not None and waited >= timeout:
+                    raise
+        self.pending -= 1
+        return res
+
+    def _free_slot(self, reorder, out):
+        """Garante um slot livre: se todos estão em uso, drena um resultado para `reorder`."""
+        while True:
+            try:
+                return self.ring.acquire(timeout=0)
+            except queue_mod.Empty:
+                seq, lm = self.get_result()
+                reorder[seq] = lm
+                out.extend(self._ready_in_order(reorder))
+
+    def _ready_in_order(self, reorder):
+        ready = []
+        while self._next in reorder:
+            ready.append((self._next, reorder.pop(self._next)))
+            self._next += 1
+        return ready
+
+    def process(self, frames):
+        """Gera (seq, landmarks|None) na ordem dos quadros, mantendo até `slots` quadros em processamento."""
+        reorder = {}
+        self._next = self.ring._seq
+        for frame in frames:
+            out = []
+            slot = self._free_slot(reorder, out)
+            yield from out
+            if frame.shape != self.ring.shape:
+                self.ring.release(slot)
+                raise ValueError(f'quadro {frame.shape} != forma do anel {self.ring.shape}')
+            self.ring.frames[slot] = frame
+            self.publish(slot)
+        while self.pending:
+            seq, lm = self.get_result()
+            reorder[seq] = lm
+            yield from self._ready_in_order(reorder)
+
+    def process_video(self, path):
+        """Decodifica um vídeo direto nos slots do anel (cap.read no view compartilhado) e gera os resultados."""
+        import cv2
+        cap = cv2.VideoCapture(path)
+        reorder = {}
+        self._next = self.ring._seq
+        try:
+            while True:
+                out = []
+                slot = self._free_slot(reorder, out)
+                yield from out
+                dst = self.ring.frames[slot]
+                ok, frame = cap.read(dst)
+                if not ok:
+                    self.ring.release(slot)
+                    break
+                # alguns backends ignoram o destino (ou o realocam) e devolvem outro array: copia para o slot
+                if frame is not dst and not np.shares_memory(frame, dst):
+                    if frame.shape != self.ring.shape:
+                        self.ring.release(slot)
+                        raise ValueError(f'quadro {frame.shape} != forma do anel {self.ring.shape}')
+                    np.copyto(dst, frame)
+                self.publish(slot)
+        finally:
+            cap.release()
+        while self.pending:
+            seq, lm = self.get_result()
+            reorder[seq] = lm
+            yield from self._ready_in_order(reorder)
+
+    def close(self):
+        for _ in self.procs:
+            self.ring.ready.put(None)
+        for p in self.procs:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+if __name__ == '__main__':
+    import time
+    import cv2
+    parser = argparse.ArgumentParser(description='Extração de landmarks de um vídeo com workers em processos '
+                                                 'e quadros em memória compartilhada')
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--slots', type=int, default=None)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    cap.release()
+    t0 = time.perf_counter()
+    n = faces = 0
+    with RingExtractorPool(shape, workers=args.workers, slots=args.slots) as pool:
+        for seq, lm in pool.process_video(args.video):
+            n += 1
+            faces += lm is not None
+    dt = time.perf_counter() - t0
+    print(f'{n} quadros ({faces} com face) em {dt:.2f}s: {n / max(dt, 1e-9):.1f} quadros/s')
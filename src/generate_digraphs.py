@@ -1,11 +1,19 @@
 import os
+import re
 import json
+import threading
 import numpy as np
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from .landmark_extractor import LandmarkExtractor
-from .digraph import build_face_digraph, digraph_from_difference
-from .utils import save_json, ensure_dir
+from .image_loader import imread
+from .digraph import build_face_digraph, digraph_from_difference, changed_node_graph, changed_edge_arrays
+from .utils import save_json, save_json_atomic, ensure_dir, BoundedExecutor
 from .visualize import plot_diff_graph
+from . import metrics
+
+# rótulos viram nomes de arquivo (diff_<a>_<b>_*.json): sem '_' (ambíguo) nem separadores de caminho
+LABEL_RE = re.compile(r'[A-Za-z0-9-]+')
 
 
 def graph_to_dict(G):
@@ -36,178 +44,404 @@ def save_graph(path, G):
     save_json(path, d)
 
 
-def main(neutral, sad, happy, out_dir, threshold=0.05):
+# rótulos que `decide` pode devolver
+DECISIONS = ('happy', 'sad', 'neutral')
+
+
+def decide(binary_vec):
+    """Decide baseado na maioria de 1s vs 0s no vetor binário"""
+    ones = int((binary_vec == 1).sum() if hasattr(binary_vec, 'sum') else sum(1 for v in binary_vec if v == 1))
+    zeros = int((binary_vec == 0).sum() if hasattr(binary_vec, 'sum') else sum(1 for v in binary_vec if v == 0))
+    if ones > zeros:
+        return 'happy'
+    elif zeros > ones:
+        return 'sad'
+    else:
+        return 'neutral'
+
+
+def threshold_decisions(n_lm, s_lm, t_lm, threshold):
+    """Decisões de maioria (neutral->sad, neutral->happy) para um threshold, sem gravar artefatos."""
+    _, binary_ns, _ = digraph_from_difference(n_lm, s_lm, threshold=threshold, normalize=True)
+    _, binary_nt, _ = digraph_from_difference(n_lm, t_lm, threshold=threshold, normalize=True)
+    return {
+        'threshold': threshold,
+        'neutral->sad': decide(binary_ns),
+        'neutral->happy': decide(binary_nt),
+        'sad_ones': int(binary_ns.sum()),
+        'happy_ones': int(binary_nt.sum()),
+        'sad_total': len(binary_ns),
+        'happy_total': len(binary_nt)
+    }
+
+
+_thread_local = threading.local()
+
+
+def _thread_extractor():
+    """Um LandmarkExtractor por thread (o FaceMesh não é thread-safe)."""
+    ext = getattr(_thread_local, 'extractor', None)
+    if ext is None:
+        ext = _thread_local.extractor = LandmarkExtractor()
+    return ext
+
+
+EXTRACT_WORKERS = 4
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _extraction_pool():
+    """Pool de extração do módulo: as threads (e o FaceMesh de cada uma) sobrevivem entre chamadas de main_multi."""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix='extract')
+        return _extract_pool
+
+
+def _load_and_extract(path, timer=metrics.NULL_TIMER):
+    with timer.stage('decode'):
+        img = imread(path)
+    if img is None:
+        return None, None, None
+    with timer.stage('extract'):
+        lm = _thread_extractor().from_bgr(img)
+    with timer.stage('graph_build'):
+        G = build_face_digraph(lm) if lm is not None else None
+    return img, lm, G
+
+
+def _timed(timer, stage, fn, *args):
+    with timer.stage(stage):
+        return fn(*args)
+
+
+def _meta_dict(binary, difs):
+    return {
+        'binary': binary.tolist() if hasattr(binary, 'tolist') else list(binary),
+        'difs': difs.tolist() if hasattr(difs, 'tolist') else list(difs)
+    }
+
+
+def pairwise_differences(landmarks, threshold=0.05):
+    """Deslocamentos normalizados entre todas as expressões de uma vez, por broadcasting.
+
+    landmarks (E,N,2) -> (difs (E,E,N), binary (E,E,N) int, scales (E,)): difs[i, j] é o deslocamento de cada
+    landmark da expressão i para a j dividido pela diagonal do bbox de i — o mesmo que
+    `digraph_from_difference(landmarks[i], landmarks[j], threshold)` para cada par.
+    """
+    lm = np.asarray(landmarks, dtype=float)
+    scales = np.hypot(*(lm.max(axis=1) - lm.min(axis=1)).T)
+    delta = lm[None, :, :, :] - lm[:, None, :, :]
+    difs = np.sqrt((delta * delta).sum(axis=3)) / (scales + 1e-9)[:, None, None]
+    thr = float(threshold) / (scales + 1e-9) if threshold > 1.0 else np.full(len(lm), float(threshold))
+    binary = (difs >= thr[:, None, None]).astype(int)
+    return difs, binary, scales
+
+
+def _render_png(renderer, image, landmarks, G, out_path, max_side=None):
+    """Tarefa de renderização; `image` pode ser o array BGR ou o caminho (processos de renderização)."""
+    if isinstance(image, str):
+        image = imread(image)
+    plot_diff_graph(image, landmarks, G, out_path=out_path, backend=renderer, max_side=max_side)
+
+
+def main_multi(images, out_dir, reference='neutral', pairs='all', threshold=0.05, renderer='matplotlib',
+               max_side=None, io_workers=4, render_processes=0, metrics_out=None, store=None, subject=None,
+               expected=None):
+    """Gera os artefatos para qualquer conjunto de expressões rotuladas: images = {rótulo: caminho}.
+
+    - Extrações em paralelo num pool do módulo (o FaceMesh de cada thread é reaproveitado); os deslocamentos de todos os pares saem de uma única operação (pairwise_differences).
+    - pairs='all' grava os grafos/metas/PNGs de todos os pares ordenados; pairs='reference' só reference->outra.
+    - automaton.json e turing_machine.json têm um estado por expressão (início em `reference`); expected =
+      {alvo: happy/sad/neutral} dá a decisão que a TM aceita para reference->alvo (padrão: o próprio rótulo,
+      se for um desses três). Alvos sem regra ficam só no grafo (ver _write_automaton_and_tm).
+    - PNGs: o renderer cv2 usa threads; com render_processes > 0 o matplotlib roda nesse número de processos.
+    - summary.json lista todos os pares gravados com rótulo de maioria, contagem de 1s e arquivos.
+    """
+    labels = list(images)
+    bad = [label for label in labels if not LABEL_RE.fullmatch(str(label))]
+    if bad:
+        raise ValueError(f'rótulos inválidos {bad}: use só letras, dígitos e "-"')
+    if reference not in images:
+        raise ValueError(f'expressão de referência {reference!r} não está em images')
+    bad = {t: e for t, e in (expected or {}).items() if t not in images or e not in DECISIONS}
+    if bad:
+        raise ValueError(f'expected inválido {bad}: alvos de images -> {", ".join(DECISIONS)}')
     ensure_dir(out_dir)
-    ext = LandmarkExtractor()
+    if metrics_out:
+        metrics.enable()
+    timer = metrics.timer()
 
-    import cv2
-    nb = cv2.imread(neutral)
-    sb = cv2.imread(sad)
-    tb = cv2.imread(happy)
-    if nb is None or sb is None or tb is None:
+    pool = _extraction_pool()
+    futs = [pool.submit(_load_and_extract, images[label], timer) for label in labels]
+    loaded = [f.result() for f in futs]
+    if any(img is None for img, _, _ in loaded):
         raise FileNotFoundError('Uma das imagens não pôde ser lida. Verifique os caminhos')
+    for label, (_, lm, _) in zip(labels, loaded):
+        if lm is None:
+            raise RuntimeError(f'Não foi possível extrair landmarks da imagem {label}')
+    imgs = {label: img for label, (img, _, _) in zip(labels, loaded)}
+    lms = {label: lm for label, (_, lm, _) in zip(labels, loaded)}
 
-    n_lm = ext.from_bgr(nb)
-    s_lm = ext.from_bgr(sb)
-    t_lm = ext.from_bgr(tb)
-    if n_lm is None:
-        raise RuntimeError('Não foi possível extrair landmarks da imagem neutra')
-    if s_lm is None:
-        raise RuntimeError('Não foi possível extrair landmarks da imagem sad')
-    if t_lm is None:
-        raise RuntimeError('Não foi possível extrair landmarks da imagem happy')
-
-    # gerar grafos de face individuais
-    G_neutral = build_face_digraph(n_lm)
-    G_sad = build_face_digraph(s_lm)
-    G_target = build_face_digraph(t_lm)
-
-    save_graph(os.path.join(out_dir, 'face_neutral.json'), G_neutral)
-    save_graph(os.path.join(out_dir, 'face_sad.json'), G_sad)
-    save_graph(os.path.join(out_dir, 'face_happy.json'), G_target)
-
-    # gerar grafos de diferença usando neutro como base
-    diff_ns, binary_ns, difs_ns = digraph_from_difference(n_lm, s_lm, threshold=threshold, normalize=True)
-    diff_nt, binary_nt, difs_nt = digraph_from_difference(n_lm, t_lm, threshold=threshold, normalize=True)
-
-    # salvar diffs (grafo + vetores)
-    save_graph(os.path.join(out_dir, 'diff_neutral_sad_graph.json'), diff_ns)
-    save_json(os.path.join(out_dir, 'diff_neutral_sad_meta.json'), {
-        'binary': binary_ns.tolist() if hasattr(binary_ns, 'tolist') else list(binary_ns),
-        'difs': difs_ns.tolist() if hasattr(difs_ns, 'tolist') else list(difs_ns)
-    })
-
-    # salvar visualização PNG dos diffs usando a imagem neutra como pano de fundo
+    with timer.stage('diff'):
+        difs, binary, scales = pairwise_differences(np.stack([lms[label] for label in labels]), threshold)
+    idx = {label: i for i, label in enumerate(labels)}
+    if pairs == 'all':
+        pair_list = [(a, b) for a in labels for b in labels if a != b]
+    else:
+        pair_list = [(reference, b) for b in labels if b != reference]
+
+    render_local = threading.local()
+
+    def render(G, a, name):
+        """G é o grafo (matplotlib) ou, no renderer cv2, a tupla (arestas, pesos) de changed_edge_arrays."""
+        try:
+            with timer.stage('render'):
+                out_path = os.path.join(out_dir, name)
+                if renderer == 'cv2':
+                    if not hasattr(render_local, 'r'):
+                        from .render_cv import CvRenderer
+                        render_local.r = CvRenderer(max_side=max_side)
+                    render_local.r.render_diff_edges(imgs[a], lms[a], *G, out_path=out_path)
+                else:
+                    plot_diff_graph(imgs[a], lms[a], G, out_path=out_path)
+        except Exception as e:
+            print(f'Falha ao gerar visualização {name}:', e)
+
+    # matplotlib fica numa única thread de renderização (ou em processos); o renderer cv2 usa uma instância por thread
+    io = BoundedExecutor(max_workers=io_workers, max_pending=2 * io_workers)
+    renders = BoundedExecutor(max_workers=1 if renderer != 'cv2' else 2, max_pending=4)
+    procs = None
+    if render_processes and renderer != 'cv2':
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        procs = ProcessPoolExecutor(max_workers=render_processes, mp_context=multiprocessing.get_context('spawn'))
+    proc_futs = []
+    manifest = []
     try:
-        plot_diff_graph(nb, n_lm, diff_ns, out_path=os.path.join(out_dir, 'diff_neutral_sad.png'))
-    except Exception as e:
-        print('Falha ao gerar visualização diff_neutral_sad.png:', e)
+        for label in labels:
+            io.submit(_timed, timer, 'serialize', save_graph, os.path.join(out_dir, f'face_{label}.json'),
+                      loaded[idx[label]][2])
+
+        # grafos de diferença a partir dos deslocamentos já calculados; gravação e PNG seguem em segundo plano
+        for a, b in pair_list:
+            i, j = idx[a], idx[b]
+            with timer.stage('diff'):
+                # arestas direto dos arrays de diff: o renderer cv2 as usa sem percorrer o grafo
+                edge_arrays = changed_edge_arrays(lms[b], binary[i, j], 0.15 * scales[i])
+                G = changed_node_graph(lms[b], difs[i, j], binary[i, j], 0.15 * scales[i], edge_arrays=edge_arrays)
+            prefix = f'diff_{a}_{b}'
+            io.submit(_timed, timer, 'serialize', save_graph, os.path.join(out_dir, prefix + '_graph.json'), G)
+            io.submit(_timed, timer, 'serialize', save_json, os.path.join(out_dir, prefix + '_meta.json'),
+                      _meta_dict(binary[i, j], difs[i, j]))
+            if procs is not None:
+                proc_futs.append(procs.submit(_render_png, renderer, images[a], lms[a], G,
+                                              os.path.join(out_dir, prefix + '.png')))
+            else:
+                renders.submit(render, edge_arrays if renderer == 'cv2' else G, a, prefix + '.png')
+            manifest.append({'from': a, 'to': b, 'graph': prefix + '_graph.json', 'meta': prefix + '_meta.json',
+                             'image': prefix + '.png', 'label': decide(binary[i, j]),
+                             'ones': int(binary[i, j].sum()), 'total': int(binary.shape[2])})
+
+        targets = [b for b in labels if b != reference]
+        _write_automaton_and_tm(io, out_dir, [(reference, b, binary[idx[reference], idx[b]]) for b in targets],
+                                threshold, timer, states=labels, pairs=manifest if pairs == 'all' else None,
+                                expected=expected)
+
+        # aguardar todas as gravações (erros de escrita são propagados) e renderizações
+        for fut in io.join():
+            fut.result()
+        renders.join()
+        for fut in proc_futs:
+            try:
+                fut.result()
+            except Exception as e:
+                print('Falha ao gerar visualização:', e)
+    finally:
+        io.shutdown()
+        renders.shutdown()
+        if procs is not None:
+            procs.shutdown()
+
+    summary = {
+        'face_graphs': [f'face_{label}.json' for label in labels],
+        'diff_graphs': [m['graph'] for m in manifest],
+        'meta': [m['meta'] for m in manifest],
+        'automaton': 'automaton.json',
+        'turing_machine': 'turing_machine.json',
+        'images': dict(images),
+        'reference': reference,
+        'pairs': manifest,
+    }
+    timer.attach(summary)
+    save_json_atomic(os.path.join(out_dir, 'summary.json'), summary)
+    if store is not None:
+        _record(store, subject, threshold, summary.get('timings'),
+                [(b, images[a], images[b], binary[idx[a], idx[b]], difs[idx[a], idx[b]]) for a, b in pair_list])
+    if metrics_out:
+        metrics.REGISTRY.write(metrics_out)
+    print('Arquivos salvos em', out_dir)
+    return summary
+
 
-    save_graph(os.path.join(out_dir, 'diff_neutral_happy_graph.json'), diff_nt)
-    save_json(os.path.join(out_dir, 'diff_neutral_happy_meta.json'), {
-        'binary': binary_nt.tolist() if hasattr(binary_nt, 'tolist') else list(binary_nt),
-        'difs': difs_nt.tolist() if hasattr(difs_nt, 'tolist') else list(difs_nt)
-    })
+def main(neutral, sad, happy, out_dir, threshold=0.05, renderer='matplotlib', max_side=None, io_workers=4,
+         metrics_out=None, store=None, subject=None):
+    """Gera os artefatos em out_dir para o trio neutral/sad/happy (pares neutral->sad e neutral->happy).
 
+    Pipeline: as três extrações (imread + FaceMesh + grafo da face) rodam em paralelo; gravações JSON e PNGs
+    vão para executores em segundo plano com fila limitada, e todos são aguardados antes de gravar
+    summary.json de forma atômica.
+    Com a instrumentação ligada (metrics.enable() ou metrics_out), summary.json traz 'timings' por estágio
+    e, se metrics_out for dado, os histogramas são gravados nesse arquivo (texto Prometheus).
+    store (ResultsStore ou caminho de um banco SQLite) também grava os dois diffs no histórico.
+    Caso particular de main_multi.
+    """
+    return main_multi({'neutral': neutral, 'sad': sad, 'happy': happy}, out_dir, reference='neutral',
+                      pairs='reference', threshold=threshold, renderer=renderer, max_side=max_side,
+                      io_workers=io_workers, metrics_out=metrics_out, store=store, subject=subject)
+
+
+def _record(store, subject, threshold, timings, rows):
+    """Grava os diffs (expected, neutro, alvo, binary, difs) no histórico SQLite."""
+    from .results_store import open_store
+    store, owned = open_store(store)
     try:
-        plot_diff_graph(nb, n_lm, diff_nt, out_path=os.path.join(out_dir, 'diff_neutral_happy.png'))
-    except Exception as e:
-        print('Falha ao gerar visualização diff_neutral_happy.png:', e)
-
-    # Calcular decisões reais baseadas nos vetores binários
-    def decide(binary_vec):
-        """Decide baseado na maioria de 1s vs 0s no vetor binário"""
-        ones = int((binary_vec == 1).sum() if hasattr(binary_vec, 'sum') else sum(1 for v in binary_vec if v == 1))
-        zeros = int((binary_vec == 0).sum() if hasattr(binary_vec, 'sum') else sum(1 for v in binary_vec if v == 0))
-        if ones > zeros:
-            return 'happy'
-        elif zeros > ones:
-            return 'sad'
-        else:
-            return 'neutral'
-    
-    dec_sad = decide(binary_ns)
-    dec_happy = decide(binary_nt)
-    
+        for expected, neutral, target, binary, difs in rows:
+            store.add({'label': decide(binary), 'binary': binary, 'difs': difs, 'timings': timings},
+                      source='generate_digraphs', subject=subject, expected=expected, neutral_path=neutral,
+                      target_path=target, threshold=threshold)
+        store.flush()
+    finally:
+        if owned:
+            store.close()
+
+
+def _write_automaton_and_tm(io, out_dir, transitions, threshold, timer=metrics.NULL_TIMER, states=None, pairs=None,
+                            expected=None):
+    """Calcula as decisões reais e agenda a gravação de automaton.json e turing_machine.json em `io`.
+
+    transitions: [(origem, destino, binary)], um por expressão alvo. `decide` só responde happy/sad/neutral,
+    então cada alvo precisa de uma regra de aceitação: expected = {alvo: decisão esperada}; sem regra, alvos
+    chamados happy/sad/neutral esperam o próprio rótulo. Alvos sem regra (ex.: surprise) ficam só no grafo:
+    a transição existe no autômato com valor None e a TM não tem símbolo nem q_check_<alvo> para eles.
+    A TM lê o símbolo k (k-ésimo alvo com regra) e aceita se a decisão desse par for a esperada.
+    states/pairs (opcionais) vão para os metadados do autômato (lista de estados e decisões de todos os pares).
+    """
+    expected = expected or {}
+    with timer.stage('dfa'):
+        decisions = [(f'{a}->{b}', b, decide(binary), binary, expected.get(b, b if b in DECISIONS else None))
+                     for a, b, binary in transitions]
+    checked = [d for d in decisions if d[4] is not None]
+
     # Mapear decisões para valores numéricos: happy=1, sad=0, neutral=0.5, reject=-1
     label_map = {'happy': 1, 'sad': 0, 'neutral': 0.5, 'reject': -1}
-    
-    # construir autômato com valores reais calculados
-    automaton = {
-        'neutral->sad': label_map.get(dec_sad, -1),
-        'neutral->happy': label_map.get(dec_happy, -1),
-        '_metadata': {
-            'neutral->sad_label': dec_sad,
-            'neutral->happy_label': dec_happy,
-            'neutral->sad_ones': int((binary_ns == 1).sum() if hasattr(binary_ns, 'sum') else sum(1 for v in binary_ns if v == 1)),
-            'neutral->sad_total': int(len(binary_ns)),
-            'neutral->happy_ones': int((binary_nt == 1).sum() if hasattr(binary_nt, 'sum') else sum(1 for v in binary_nt if v == 1)),
-            'neutral->happy_total': int(len(binary_nt)),
-            'threshold': threshold
-        }
-    }
-    save_json(os.path.join(out_dir, 'automaton.json'), automaton)
+
+    # construir autômato com valores reais calculados (None: transição só de grafo, sem regra de aceitação)
+    automaton = {key: label_map.get(dec, -1) if exp is not None else None for key, _, dec, _, exp in decisions}
+    meta = {f'{key}_label': dec for key, _, dec, _, _ in decisions}
+    for key, _, _, binary, exp in decisions:
+        meta[f'{key}_ones'] = int((binary == 1).sum())
+        meta[f'{key}_total'] = int(len(binary))
+        meta[f'{key}_expected'] = exp
+    meta['graph_only'] = [target for _, target, _, _, exp in decisions if exp is None]
+    meta['threshold'] = threshold
+    if states is not None:
+        meta['states'] = list(states)
+        meta['start'] = transitions[0][0] if transitions else None
+    if pairs is not None:
+        meta['pairs'] = {f"{p['from']}->{p['to']}": p['label'] for p in pairs}
+    automaton['_metadata'] = meta
+    io.submit(_timed, timer, 'serialize', save_json, os.path.join(out_dir, 'automaton.json'), automaton)
 
     # Gerar Máquina de Turing com valores reais baseados na análise
-    # Arquitetura simplificada: a TM lê símbolos 0 (tentativa de sad) ou 1 (tentativa de happy)
-    # e decide se aceita ou rejeita baseado nas decisões reais da análise
-    
-    # Criar estados específicos para cada decisão
+    # Arquitetura simplificada: a TM lê o símbolo k (tentativa do k-ésimo alvo com regra)
+    # e decide se aceita ou rejeita comparando a decisão real com a esperada
+    symbols = [str(k) for k in range(len(checked))]
+    delta = {}
+    for sym, (_, target, _, _, _) in zip(symbols, checked):
+        # Estado inicial: ler símbolo e ir para estado de checagem correspondente
+        delta[f'q_start,{sym}'] = {'next': f'q_check_{target}', 'write': sym, 'dir': 'R'}
+    delta['q_start,_'] = {'next': 'q_reject', 'write': '_', 'dir': 'N'}
+    for _, target, dec, _, exp in checked:
+        # Estado q_check_<alvo>: aceita se a análise decidiu o esperado para o alvo, rejeita caso contrário
+        delta[f'q_check_{target},_'] = {'next': 'q_accept' if dec == exp else 'q_reject', 'write': '_', 'dir': 'N'}
+
+    tm_meta = {'description': 'Máquina de Turing gerada com base na análise real das expressões faciais'}
+    for key, _, dec, _, _ in checked:
+        tm_meta[f'{key}_decision'] = dec
+    tm_meta['threshold'] = threshold
+    tm_meta['symbol_mapping'] = {sym: f'Testa se {key} foi classificado como {exp}'
+                                 for sym, (key, _, _, _, exp) in zip(symbols, checked)}
+    tm_meta['symbol_mapping']['_'] = 'blank (fim da fita)'
+    tm_meta['logic'] = {
+        f'entrada_{sym}': f"Lê {sym} ({target}) → vai para q_check_{target} → "
+                          f"{'ACEITA' if dec == exp else 'REJEITA'} (análise decidiu: {dec}, esperado: {exp})"
+        for sym, (_, target, dec, _, exp) in zip(symbols, checked)}
+    tm_meta['graph_only'] = meta['graph_only']
     turing_machine = {
-        'Q': ['q_start', 'q_check_sad', 'q_check_happy', 'q_accept', 'q_reject'],
-        'Sigma': ['0', '1'],  # 0=testar sad, 1=testar happy
-        'Gamma': ['0', '1', '_'],
+        'Q': ['q_start'] + [f'q_check_{target}' for _, target, _, _, _ in checked] + ['q_accept', 'q_reject'],
+        'Sigma': symbols,
+        'Gamma': symbols + ['_'],
         'blank': '_',
         'q0': 'q_start',
         'accept': ['q_accept'],
         'reject': ['q_reject'],
-        'delta': {
-            # Estado inicial: ler símbolo e ir para estado de checagem correspondente
-            'q_start,0': {
-                'next': 'q_check_sad',
-                'write': '0',
-                'dir': 'R'
-            },
-            'q_start,1': {
-                'next': 'q_check_happy',
-                'write': '1',
-                'dir': 'R'
-            },
-            'q_start,_': {
-                'next': 'q_reject',
-                'write': '_',
-                'dir': 'N'
-            },
-            
-            # Estado q_check_sad: aceita se a análise decidiu 'sad', rejeita caso contrário
-            'q_check_sad,_': {
-                'next': 'q_accept' if dec_sad == 'sad' else 'q_reject',
-                'write': '_',
-                'dir': 'N'
-            },
-            
-            # Estado q_check_happy: aceita se a análise decidiu 'happy', rejeita caso contrário
-            'q_check_happy,_': {
-                'next': 'q_accept' if dec_happy == 'happy' else 'q_reject',
-                'write': '_',
-                'dir': 'N'
-            }
-        },
-        '_metadata': {
-            'description': 'Máquina de Turing gerada com base na análise real das expressões faciais',
-            'neutral->sad_decision': dec_sad,
-            'neutral->happy_decision': dec_happy,
-            'threshold': threshold,
-            'symbol_mapping': {
-                '0': 'Testa se neutral->sad foi classificado como sad',
-                '1': 'Testa se neutral->happy foi classificado como happy',
-                '_': 'blank (fim da fita)'
-            },
-            'logic': {
-                'entrada_0': f"Lê 0 (sad) → vai para q_check_sad → {'ACEITA' if dec_sad == 'sad' else 'REJEITA'} (análise decidiu: {dec_sad})",
-                'entrada_1': f"Lê 1 (happy) → vai para q_check_happy → {'ACEITA' if dec_happy == 'happy' else 'REJEITA'} (análise decidiu: {dec_happy})"
-            }
-        }
+        'delta': delta,
+        '_metadata': tm_meta,
     }
-    save_json(os.path.join(out_dir, 'turing_machine.json'), turing_machine)
-
-    summary = {
-        'face_graphs': ['face_neutral.json', 'face_sad.json', 'face_happy.json'],
-        'diff_graphs': ['diff_neutral_sad_graph.json', 'diff_neutral_happy_graph.json'],
-        'meta': ['diff_neutral_sad_meta.json', 'diff_neutral_happy_meta.json'],
-        'automaton': 'automaton.json',
-        'turing_machine': 'turing_machine.json'
-    }
-    save_json(os.path.join(out_dir, 'summary.json'), summary)
-    print('Arquivos salvos em', out_dir)
+    io.submit(_timed, timer, 'serialize', save_json, os.path.join(out_dir, 'turing_machine.json'), turing_machine)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Gera dígrafos de faces e diferenças usando neutro como base')
-    parser.add_argument('--neutral', required=True)
-    parser.add_argument('--sad', required=True)
-    parser.add_argument('--happy', required=True, help='imagem com a expressão alvo (happy)')
+    parser.add_argument('--neutral')
+    parser.add_argument('--sad')
+    parser.add_argument('--happy', help='imagem com a expressão alvo (happy)')
+    parser.add_argument('--images', nargs='+', default=None, metavar='ROTULO=CAMINHO',
+                        help='conjunto qualquer de expressões rotuladas (ex.: neutral=n.jpg surprise=s.jpg ...)')
+    parser.add_argument('--reference', default='neutral', help='expressão inicial do autômato (com --images)')
+    parser.add_argument('--expected', nargs='+', default=None, metavar='ROTULO=DECISAO',
+                        help='com --images: decisão (happy/sad/neutral) que a TM aceita para referência->rótulo; '
+                             'alvos sem regra ficam só no grafo')
+    parser.add_argument('--pairs', choices=('all', 'reference'), default='all',
+                        help='com --images: todos os pares ordenados ou só referência->outra')
+    parser.add_argument('--render-processes', type=int, default=0,
+                        help='processos para os PNGs matplotlib (0 = uma thread de renderização)')
     parser.add_argument('--out', default='out_digraphs')
     parser.add_argument('--threshold', type=float, default=0.05, help='limiar normalizado (fração da diagonal)')
+    parser.add_argument('--renderer', choices=['matplotlib', 'cv2'], default='matplotlib',
+                        help='backend dos PNGs de diff (cv2 é bem mais rápido)')
+    parser.add_argument('--max-side', type=int, default=None, help='reduz o canvas do renderer cv2 (px do maior lado)')
+    parser.add_argument('--metrics-out', default=None,
+                        help='liga a instrumentação por estágio e grava as métricas (texto Prometheus) neste arquivo')
+    parser.add_argument('--store', default=None, help='banco SQLite do histórico (ex.: test_images/results.db)')
+    parser.add_argument('--subject', default=None, help='identificador do sujeito gravado no histórico')
     args = parser.parse_args()
-    main(args.neutral, args.sad, args.happy, args.out, threshold=args.threshold)
+    if args.images:
+        images = {}
+        for item in args.images:
+            label, sep, path = item.partition('=')
+            if not sep or not path:
+                parser.error(f'--images espera ROTULO=CAMINHO, recebido {item!r}')
+            if not LABEL_RE.fullmatch(label):
+                parser.error(f'rótulo inválido {label!r}: use só letras, dígitos e "-"')
+            if label in images:
+                parser.error(f'rótulo repetido em --images: {label!r}')
+            images[label] = path
+        expected = {}
+        for item in args.expected or []:
+            label, sep, dec = item.partition('=')
+            if not sep or label not in images or dec not in DECISIONS:
+                parser.error(f'--expected espera ROTULO=happy|sad|neutral com ROTULO de --images, recebido {item!r}')
+            expected[label] = dec
+        main_multi(images, args.out, reference=args.reference, pairs=args.pairs, threshold=args.threshold,
+                   renderer=args.renderer, max_side=args.max_side, render_processes=args.render_processes,
+                   metrics_out=args.metrics_out, store=args.store, subject=args.subject, expected=expected)
+    else:
+        if not (args.neutral and args.sad and args.happy):
+            parser.error('informe --neutral, --sad e --happy, ou --images')
+        main(args.neutral, args.sad, args.happy, args.out, threshold=args.threshold,
+             renderer=args.renderer, max_side=args.max_side, metrics_out=args.metrics_out,
+             store=args.store, subject=args.subject)
@@ -0,0 +1,147 @@
+import os
+import argparse
+import numpy as np
+from .similarity_index import SimilarityIndex
+
+# cantos externos dos olhos usados para alinhar a rotação (FaceMesh 468 e iBUG/dlib 68)
+EYE_CORNERS = {468: (33, 263), 478: (33, 263), 68: (36, 45)}
+
+
+def embed(landmarks):
+    """Embedding geométrico normalizado de landmarks (N,2) ou de um lote (B,N,2) -> (2N,) ou (B,2N) float32.
+
+    Remove a pose no plano: rotação pelos cantos dos olhos (quando a topologia é conhecida), translação pelo
+    centro do bbox e escala pela diagonal do bbox — a mesma normalização de `digraph_from_difference`.
+    """
+    lm = np.asarray(landmarks, dtype=np.float32)
+    single = lm.ndim == 2
+    if single:
+        lm = lm[None]
+    # x e y em arrays contíguos (B,N): as reduções por face ficam no eixo rápido
+    x = np.ascontiguousarray(lm[..., 0])
+    y = np.ascontiguousarray(lm[..., 1])
+    corners = EYE_CORNERS.get(lm.shape[1])
+    if corners is not None:
+        i, j = corners
+        angle = np.arctan2(y[:, j] - y[:, i], x[:, j] - x[:, i])
+        c = np.cos(-angle)[:, None]
+        s = np.sin(-angle)[:, None]
+        x, y = c * x - s * y, s * x + c * y
+    x_min, x_max = x.min(axis=1, keepdims=True), x.max(axis=1, keepdims=True)
+    y_min, y_max = y.min(axis=1, keepdims=True), y.max(axis=1, keepdims=True)
+    scale = np.sqrt((x_max - x_min) ** 2 + (y_max - y_min) ** 2) + 1e-9
+    out = np.empty((len(x), x.shape[1], 2), dtype=np.float32)
+    out[..., 0] = (x - (x_min + x_max) / 2.0) / scale
+    out[..., 1] = (y - (y_min + y_max) / 2.0) / scale
+    out = out.reshape(len(x), -1)
+    return out[0] if single else out
+
+
+class Gallery:
+    """Galeria 1:N persistente de identidades: embeddings float32 contíguos num `SimilarityIndex` em disco.
+
+    Uma identidade pode ter várias amostras; `identify` devolve as k identidades distintas mais próximas
+    (menor distância entre as amostras de cada uma). Cadastro e busca aceitam lotes.
+    """
+    def __init__(self, path, n_landmarks=None):
+        dim = None if n_landmarks is None else 2 * int(n_landmarks)
+        self.index = SimilarityIndex(path, dim=dim)
+        self.n_landmarks = self.index.dim // 2
+
+    def __len__(self):
+        return len(self.index)
+
+    def identities(self):
+        return list(self.index.meta['labels'])
+
+    def enroll(self, identities, landmarks):
+        """Cadastra um lote: identities (B,) e landmarks (B,N,2). Retorna os índices das amostras."""
+        identities = [str(i) for i in identities]
+        emb = embed(np.asarray(landmarks))
+        if emb.ndim == 1:
+            emb = emb[None]
+        if len(emb) != len(identities):
+            raise ValueError('identities e landmarks com tamanhos diferentes')
+        return self.index.add(emb, labels=identities, ids=identities)
+
+    def identify(self, landmarks, k=5, max_distance=None, approx=False):
+        """Top-k identidades para cada face do lote: lista (por consulta) de {'identity', 'distance'}.
+
+        max_distance: descarta candidatos mais distantes (reconhecimento em conjunto aberto).
+        """
+        emb = embed(np.asarray(landmarks))
+        if emb.ndim == 1:
+            emb = emb[None]
+        if len(self) == 0:
+            return [[] for _ in range(len(emb))]
+        counts = np.bincount(np.asarray(self.index.labels[:len(self)]) + 1)
+        per_identity = int(counts[1:].max()) if len(counts) > 1 else 1
+        # com no máximo `per_identity` amostras por identidade, k * per_identity vizinhos contêm k identidades
+        dists, idx = self.index.search(emb, k=k * per_identity, approx=approx)
+        names = self.index.meta['labels']
+        codes = self.index.labels[idx] if idx.size else idx
+        out = []
+        for row_d, row_c in zip(dists, codes):
+            seen = []
+            used = set()
+            for d, c in zip(row_d, row_c):
+                if c in used or (max_distance is not None and d > max_distance):
+                    continue
+                used.add(c)
+                seen.append({'identity': names[c], 'distance': float(d)})
+                if len(seen) == k:
+                    break
+            out.append(seen)
+        return out
+
+
+def _landmarks_from_images(paths, workers=4):
+    from .image_loader import load_images
+    from .landmark_extractor import LandmarkExtractor
+    extractor = LandmarkExtractor()
+    out = []
+    for path, img in zip(paths, load_images(paths, workers=workers)):
+        lm = None if img is None else extractor.from_bgr(img)
+        if lm is None:
+            print('sem face:', path)
+        out.append(lm)
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Identificação 1:N pela geometria normalizada dos landmarks')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_en = sub.add_parser('enroll', help='cadastra imagens <dir>/<identidade>/*.jpg (ou arquivos soltos)')
+    p_en.add_argument('--gallery', required=True)
+    p_en.add_argument('--images', nargs='+', required=True)
+    p_id = sub.add_parser('identify', help='identidades mais próximas de cada imagem')
+    p_id.add_argument('--gallery', required=True)
+    p_id.add_argument('--images', nargs='+', required=True)
+    p_id.add_argument('--k', type=int, default=5)
+    p_id.add_argument('--max-distance', type=float, default=None)
+    args = parser.parse_args()
+
+    paths = []
+    for p in args.images:
+        if os.path.isdir(p):
+            for sub_dir in sorted(os.listdir(p)):
+                d = os.path.join(p, sub_dir)
+                if os.path.isdir(d):
+                    paths.extend(os.path.join(d, f) for f in sorted(os.listdir(d)))
+        else:
+            paths.append(p)
+    lms = _landmarks_from_images(paths)
+    ok = [(p, lm) for p, lm in zip(paths, lms) if lm is not None]
+    if not ok:
+        parser.error('nenhuma face encontrada')
+    batch = np.stack([lm for _, lm in ok])
+    if args.cmd == 'enroll':
+        gallery = Gallery(args.gallery, n_landmarks=batch.shape[1])
+        # identidade: nome do diretório (ou do arquivo, sem extensão)
+        names = [os.path.basename(os.path.dirname(p)) or os.path.splitext(os.path.basename(p))[0] for p, _ in ok]
+        gallery.enroll(names, batch)
+        print(f'{len(ok)} amostras cadastradas; {len(gallery.identities())} identidades')
+    else:
+        gallery = Gallery(args.gallery)
+        for (p, _), matches in zip(ok, gallery.identify(batch, k=args.k, max_distance=args.max_distance)):
+            print(p, ' '.join(f"{m['identity']}:{m['distance']:.4f}" for m in matches) or '-')
@@ -0,0 +1,200 @@
+import os
+import struct
+import threading
+import numpy as np
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+# fator de redução -> flag de decodificação (o libjpeg reduz durante o decode, sem gerar a imagem cheia)
+REDUCE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_thread_local = threading.local()
+
+
+def read_bytes(path, buf=None):
+    """Lê o arquivo inteiro para `buf` (bytearray reutilizado, cresce se preciso) e retorna um memoryview."""
+    size = os.path.getsize(path)
+    if buf is None:
+        buf = bytearray(size)
+    elif len(buf) < size:
+        buf.extend(bytes(size - len(buf)))
+    view = memoryview(buf)[:size]
+    with open(path, 'rb', buffering=0) as f:
+        n = f.readinto(view)
+    return view[:n]
+
+
+def image_size(data):
+    """(largura, altura) lida do cabeçalho PNG/JPEG, sem decodificar; None se não reconhecido."""
+    data = bytes(data[:256 * 1024])
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        seg_len = struct.unpack('>H', data[i + 2:i + 4])[0]
+        # SOF0..SOF15, exceto DHT (C4), JPG (C8) e DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack('>HH', data[i + 5:i + 9])
+            return w, h
+        i += 2 + seg_len
+    return None
+
+
+def exif_orientation(data):
+    """Tag Orientation (1..8) do EXIF de um JPEG, sem decodificar; 1 se ausente ou não reconhecida."""
+    data = bytes(data[:256 * 1024])
+    if data[:2] != b'\xff\xd8':
+        return 1
+    i = 2
+    while i + 4 <= len(data) and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker == 0xDA:  # início dos dados da imagem: não há mais segmentos APPn
+            break
+        seg_len = struct.unpack('>H', data[i + 2:i + 4])[0]
+        seg = data[i + 4:i + 2 + seg_len]
+        if marker == 0xE1 and seg[:6] == b'Exif\x00\x00':
+            tiff = seg[6:]
+            endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+            if endian is None or len(tiff) < 8:
+                return 1
+            ifd = struct.unpack(endian + 'I', tiff[4:8])[0]
+            if ifd + 2 > len(tiff):
+                return 1
+            count = struct.unpack(endian + 'H', tiff[ifd:ifd + 2])[0]
+            for k in range(count):
+                entry = tiff[ifd + 2 + 12 * k:ifd + 14 + 12 * k]
+                if len(entry) < 12:
+                    break
+                if struct.unpack(endian + 'H', entry[:2])[0] == 0x0112:
+                    value = struct.unpack(endian + 'H', entry[8:10])[0]
+                    return value if 1 <= value <= 8 else 1
+            return 1
+        i += 2 + seg_len
+    return 1
+
+
+def reduce_for(size, max_side):
+    """Maior fator (1, 2, 4 ou 8) que mantém o maior lado >= max_side."""
+    if not max_side or size is None:
+        return 1
+    side = max(size)
+    for factor in (8, 4, 2):
+        if side / factor >= max_side:
+            return factor
+    return 1
+
+
+def decode(data, reduce=1, max_side=None):
+    """Decodifica bytes (JPEG/PNG...) para BGR com cv2.imdecode (libera o GIL).
+
+    reduce: 1, 2, 4 ou 8 (IMREAD_REDUCED_COLOR_*); com max_side, o fator é escolhido pelo cabeçalho
+    para que o maior lado continue >= max_side. Retorna None se os bytes não forem uma imagem.
+    """
+    if max_side:
+        reduce = reduce_for(image_size(data), max_side)
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if arr.size == 0:
+        return None
+    return cv2.imdecode(arr, REDUCE_FLAGS[int(reduce)])
+
+
+def _thread_buffer():
+    buf = getattr(_thread_local, 'buf', None)
+    if buf is None:
+        buf = _thread_local.buf = bytearray()
+    return buf
+
+
+def imread(path, reduce=1, max_side=None):
+    """Substituto de cv2.imread: lê num buffer por thread (reutilizado) e decodifica com imdecode.
+
+    Como cv2.imread, retorna None se o arquivo não existir ou não puder ser decodificado.
+    """
+    try:
+        data = read_bytes(path, _thread_buffer())
+    except OSError:
+        return None
+    try:
+        # imdecode copia os pixels para a saída, então o buffer pode ser reutilizado em seguida
+        return decode(data, reduce=reduce, max_side=max_side)
+    finally:
+        data.release()
+
+
+def imread_reduced(path, reduce=2):
+    """Lê com redução no decode e retorna (imagem, escala) onde escala=(sx, sy) converte coordenadas
+    da imagem reduzida para a resolução original (landmarks * escala). (None, None) se a leitura falhar.
+    """
+    try:
+        data = read_bytes(path, _thread_buffer())
+    except OSError:
+        return None, None
+    try:
+        size = image_size(data)
+        # o decode aplica a rotação do EXIF; orientações 5..8 trocam largura e altura
+        if size is not None and exif_orientation(data) >= 5:
+            size = size[::-1]
+        img = decode(data, reduce=reduce)
+    finally:
+        data.release()
+    if img is None:
+        return None, None
+    h, w = img.shape[:2]
+    if size is None:
+        return img, np.array([float(reduce), float(reduce)])
+    return img, np.array([size[0] / float(w), size[1] / float(h)])
+
+
+class ImageLoader:
+    """Carregamento em lote: leitura dos arquivos e imdecode num pool de threads.
+
+    load_many() preserva a ordem dos caminhos; cada thread reutiliza o próprio buffer de leitura.
+    """
+    def __init__(self, workers=4, reduce=1, max_side=None):
+        self.reduce = reduce
+        self.max_side = max_side
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imgload')
+
+    def load(self, path, reduce=None, max_side=None):
+        return imread(path, reduce=reduce or self.reduce, max_side=max_side or self.max_side)
+
+    def load_many(self, paths, reduce=None, max_side=None):
+        return list(self._pool.map(lambda p: self.load(p, reduce, max_side), paths))
+
+    def iter_load(self, paths, reduce=None, max_side=None):
+        """Gera (caminho, imagem) na ordem de entrada, com as próximas leituras já em andamento."""
+        futures = [(p, self._pool.submit(self.load, p, reduce, max_side)) for p in paths]
+        for p, fut in futures:
+            yield p, fut.result()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_images(paths, reduce=1, max_side=None, workers=4):
+    """Carrega vários arquivos em paralelo (atalho para ImageLoader.load_many)."""
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [imread(p, reduce=reduce, max_side=max_side) for p in paths]
+    with ImageLoader(workers=min(workers, len(paths)), reduce=reduce, max_side=max_side) as loader:
+        return loader.load_many(paths)
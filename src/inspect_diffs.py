@@ -1,23 +1,22 @@
 import os
 import json
 import numpy as np
-from .utils import load_json, bbox_from_landmarks, map_landmarks_to_regions
-from .landmark_extractor import LandmarkExtractor
+from .utils import load_json, landmarks_from_graph_json, diff_meta_entries, map_landmarks_to_regions, summary_reference
+from .render_cv import topk_indices
 
 
-def summarize_diff(meta_path, landmarks):
+def summarize_diff(meta_path, landmarks, top_k=8, regions=None):
     meta = load_json(meta_path)
     binary = np.array(meta['binary'], dtype=int)
     difs = np.array(meta['difs'], dtype=float)
     changed_idx = np.where(binary == 1)[0].tolist()
     total_changed = int(binary.sum())
     # top changes by magnitude
-    top_k = 8
-    idx_sorted = np.argsort(-difs)
-    top = [(int(i), float(difs[i])) for i in idx_sorted[:top_k] if difs[i] > 0]
+    top = [(int(i), float(difs[i])) for i in topk_indices(difs, top_k) if difs[i] > 0]
 
     # regions
-    regions = map_landmarks_to_regions(landmarks)
+    if regions is None:
+        regions = map_landmarks_to_regions(landmarks)
     region_counts = {r: int(binary[idxs].sum()) if idxs else 0 for r, idxs in regions.items()}
 
     return {
@@ -28,52 +27,73 @@ def summarize_diff(meta_path, landmarks):
     }
 
 
-def main(digraphs_dir, neutral_img_path=None):
-    # carregar landmarks da face neutra para mapear regiões
-    ext = LandmarkExtractor()
-    import cv2
+def load_neutral_landmarks(digraphs_dir, neutral_img_path=None, reference=None):
+    """Landmarks da face de referência (summary.json['reference'], 'neutral' por padrão): lidos de
+    face_<referência>.json (sem MediaPipe).
+
+    Só extrai da imagem (MediaPipe) se o grafo salvo não existir e `neutral_img_path` for fornecido.
+    """
+    reference = reference or summary_reference(digraphs_dir)
+    graph_path = os.path.join(digraphs_dir, f'face_{reference}.json')
+    if os.path.exists(graph_path):
+        return landmarks_from_graph_json(graph_path)
     if neutral_img_path is None:
-        # tentar encontrar imagens e extrair landmarks da pasta pai
-        raise ValueError('Forneça o caminho da imagem neutra para extrair landmarks')
+        raise FileNotFoundError(f'face_{reference}.json não encontrado em {digraphs_dir}; forneça --neutral')
+    import cv2
+    from .landmark_extractor import LandmarkExtractor
     nb = cv2.imread(neutral_img_path)
     if nb is None:
         raise FileNotFoundError(neutral_img_path)
-    n_lm = ext.from_bgr(nb)
+    n_lm = LandmarkExtractor().from_bgr(nb)
     if n_lm is None:
         raise RuntimeError('Não foi possível extrair landmarks da imagem neutra')
+    return n_lm
 
-    sad_meta = os.path.join(digraphs_dir, 'diff_neutral_sad_meta.json')
-    target_meta = os.path.join(digraphs_dir, 'diff_neutral_happy_meta.json')
-    if not os.path.exists(sad_meta) or not os.path.exists(target_meta):
-        raise FileNotFoundError('Arquivos de meta diffs não encontrados em ' + digraphs_dir)
 
-    ssum = summarize_diff(sad_meta, n_lm)
-    tsum = summarize_diff(target_meta, n_lm)
+def inspect_dir(digraphs_dir, neutral_img_path=None, top_k=8):
+    """Retorna {rótulo: resumo} para os diffs que partem da referência do summary.json do diretório."""
+    n_lm = load_neutral_landmarks(digraphs_dir, neutral_img_path)
+    regions = map_landmarks_to_regions(n_lm)
+    out = {}
+    for label, meta_path in diff_meta_entries(digraphs_dir):
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError('Arquivo de meta diff não encontrado: ' + meta_path)
+        out[label] = summarize_diff(meta_path, n_lm, top_k=top_k, regions=regions)
+    return out
 
-    print('Resumo da comparação: NEUTRAL -> SAD')
-    print('  Landmarks alterados (total):', ssum['total_changed'])
-    print('  Contagem por região:', ssum['region_counts'])
-    print('  Top mudanças (idx, magnitude):')
-    for i, v in ssum['top_changes']:
-        print(f'    {i}: {v:.4f}')
 
-    print('\nResumo da comparação: NEUTRAL -> HAPPY')
-    print('  Landmarks alterados (total):', tsum['total_changed'])
-    print('  Contagem por região:', tsum['region_counts'])
-    print('  Top mudanças (idx, magnitude):')
-    for i, v in tsum['top_changes']:
-        print(f'    {i}: {v:.4f}')
+def main(digraphs_dirs, neutral_img_path=None, top_k=8):
+    if isinstance(digraphs_dirs, str):
+        digraphs_dirs = [digraphs_dirs]
+    for digraphs_dir in digraphs_dirs:
+        if len(digraphs_dirs) > 1:
+            print(f'=== {digraphs_dir} ===')
+        reference = summary_reference(digraphs_dir)
+        summaries = inspect_dir(digraphs_dir, neutral_img_path, top_k=top_k)
+        for i, (label, summ) in enumerate(summaries.items()):
+            if i:
+                print()
+            print(f'Resumo da comparação: {reference.upper()} -> {label.upper()}')
+            print('  Landmarks alterados (total):', summ['total_changed'])
+            print('  Contagem por região:', summ['region_counts'])
+            print('  Top mudanças (idx, magnitude):')
+            for idx, v in summ['top_changes']:
+                print(f'    {idx}: {v:.4f}')
 
-    # indicar onde estão os PNGs
-    print('\nVisualizações geradas:')
-    print('  ', os.path.join(digraphs_dir, 'diff_neutral_sad.png'))
-    print('  ', os.path.join(digraphs_dir, 'diff_neutral_happy.png'))
+        # indicar onde estão os PNGs
+        print('\nVisualizações geradas:')
+        for label in summaries:
+            print('  ', os.path.join(digraphs_dir, f'diff_{reference}_{label}.png'))
+        if len(digraphs_dirs) > 1:
+            print()
 
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('--dir', required=True, help='diretório com os digraphs (summary.json)')
-    parser.add_argument('--neutral', required=True, help='caminho para a imagem neutra (para extrair landmarks)')
+    parser.add_argument('--dir', required=True, nargs='+', help='diretório(s) com os digraphs (summary.json)')
+    parser.add_argument('--neutral', default=None,
+                        help='imagem da referência (só usada se face_<referência>.json não existir; requer MediaPipe)')
+    parser.add_argument('--k', type=int, default=8, help='quantidade de top mudanças listadas')
     args = parser.parse_args()
-    main(args.dir, args.neutral)
+    main(args.dir, args.neutral, top_k=args.k)
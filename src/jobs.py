@@ -0,0 +1,264 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .utils import save_json_atomic, load_json, ensure_dir
+
+
+# ------------------- funções executadas nos processos do pool -------------------
+_worker_extractor = None
+_worker_landmarks = OrderedDict()
+WORKER_CACHE_SIZE = 64
+
+
+def _landmarks(path):
+    """Landmarks de uma imagem com cache LRU por processo (chave: caminho + mtime); o extractor fica quente."""
+    global _worker_extractor
+    from .image_loader import imread
+    from .landmark_extractor import LandmarkExtractor
+    key = (path, os.path.getmtime(path))
+    if key in _worker_landmarks:
+        _worker_landmarks.move_to_end(key)
+        return _worker_landmarks[key]
+    if _worker_extractor is None:
+        _worker_extractor = LandmarkExtractor()
+    img = imread(path)
+    if img is None:
+        raise FileNotFoundError(path)
+    lm = _worker_landmarks[key] = _worker_extractor.from_bgr(img)
+    while len(_worker_landmarks) > WORKER_CACHE_SIZE:
+        _worker_landmarks.popitem(last=False)
+    return lm
+
+
+def threshold_trial(neutral, sad, happy, threshold):
+    """Tarefa: decisões de maioria para um threshold (não grava artefatos)."""
+    from .generate_digraphs import threshold_decisions
+    n_lm, s_lm, t_lm = _landmarks(neutral), _landmarks(sad), _landmarks(happy)
+    if n_lm is None or s_lm is None or t_lm is None:
+        raise RuntimeError('Não foi possível extrair landmarks de uma das imagens')
+    return threshold_decisions(n_lm, s_lm, t_lm, threshold)
+
+
+def regenerate(neutral, sad, happy, out_dir, threshold, renderer='matplotlib', store=None):
+    """Tarefa: regenera os artefatos de generate_digraphs em out_dir (store: banco SQLite do histórico)."""
+    from .generate_digraphs import main as gen_main
+    gen_main(neutral, sad, happy, out_dir, threshold=threshold, renderer=renderer, store=store)
+    return {'out_dir': out_dir, 'threshold': threshold}
+
+
+# ------------------- gerenciador de jobs -------------------
+class JobRunner:
+    """Executa jobs em segundo plano num pool de processos.
+
+    - Um job é uma lista de tarefas (chamadas de função picklable); o progresso é tarefas concluídas/total.
+    - Estados: 'running', 'done', 'failed' (alguma tarefa falhou), 'cancelled'.
+    - Cada mudança de estado é persistida em jobs_dir/<id>.json; jobs antigos são recarregados na criação
+      (jobs que estavam rodando quando o processo morreu aparecem como 'lost').
+    - cancel() cancela as tarefas ainda na fila; tarefas já em execução terminam, mas o resultado é descartado.
+      Um job cujas tarefas restantes já estão todas em execução (ex.: uma regeneração em andamento) não é
+      cancelável: cancel() devolve False e ele continua 'running' (status()['cancellable'] diz de antemão).
+    - Só os keep_finished jobs terminados mais recentes são mantidos (memória e jobs_dir); os demais são apagados.
+    - Resultados de tarefas determinísticas (ex.: threshold_trial) ficam num cache limitado, com chave que
+      inclui o mtime dos arquivos de entrada; repetir um threshold já calculado não reexecuta nada.
+    Pensado para ficar num st.cache_resource (um por servidor), compartilhado por todas as sessões.
+    """
+    CACHEABLE = ('threshold_trial',)
+
+    def __init__(self, jobs_dir='test_images/jobs', max_workers=None, cache_size=256, keep_finished=50):
+        self.jobs_dir = jobs_dir
+        self.cache_size = cache_size
+        self.keep_finished = keep_finished
+        self._cache = OrderedDict()
+        self.max_workers = max_workers
+        ensure_dir(jobs_dir)
+        self._pool = self._new_pool()
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._futures = {}
+        self._load_persisted()
+
+    def _new_pool(self):
+        # spawn: o processo do Streamlit tem várias threads, fork não é seguro
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _submit_task(self, fn, args, kwargs):
+        try:
+            return self._pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # um worker morreu (ex.: crash nativo); recria o pool e tenta de novo
+            self._pool = self._new_pool()
+            return self._pool.submit(fn, *args, **kwargs)
+
+    def _load_persisted(self):
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                job = load_json(os.path.join(self.jobs_dir, name))
+            except Exception:
+                continue
+            if job.get('state') == 'running':
+                job['state'] = 'lost'
+            self._jobs[job['id']] = job
+        self._prune()
+
+    def _prune(self):
+        """Apaga (memória e disco) os jobs terminados além dos keep_finished mais recentes."""
+        with self._lock:
+            finished = sorted((j for j in self._jobs.values() if j['state'] != 'running'),
+                              key=lambda j: j.get('finished') or j.get('created') or 0, reverse=True)
+            for job in finished[self.keep_finished:]:
+                del self._jobs[job['id']]
+                try:
+                    os.remove(os.path.join(self.jobs_dir, job['id'] + '.json'))
+                except OSError:
+                    pass
+
+    def _cache_key(self, fn, args, kwargs):
+        if fn.__name__ not in self.CACHEABLE:
+            return None
+        mtimes = tuple(os.path.getmtime(a) if isinstance(a, str) and os.path.exists(a) else None for a in args)
+        return (fn.__name__, tuple(args), tuple(sorted(kwargs.items())), mtimes)
+
+    def _cache_put(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _persist(self, job):
+        save_json_atomic(os.path.join(self.jobs_dir, job['id'] + '.json'), job)
+
+    def submit(self, kind, tasks, params=None):
+        """Submete um job. tasks: lista de (fn, args) ou (fn, args, kwargs). Retorna o id do job."""
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'params': params or {},
+            'state': 'running',
+            'created': time.time(),
+            'finished': None,
+            'total': len(tasks),
+            'completed': 0,
+            'results': [None] * len(tasks),
+            'errors': [],
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist(job)
+            futures = []
+            for i, task in enumerate(tasks):
+                fn, args = task[0], tuple(task[1])
+                kwargs = task[2] if len(task) > 2 else {}
+                key = self._cache_key(fn, args, kwargs)
+                if key is not None and key in self._cache:
+                    job['results'][i] = self._cache[key]
+                    job['completed'] += 1
+                    continue
+                fut = self._submit_task(fn, args, kwargs)
+                # se a tarefa já terminou, o callback roda aqui mesmo (o RLock é reentrante)
+                fut.add_done_callback(lambda f, i=i, key=key: self._on_done(job_id, i, f, key))
+                futures.append(fut)
+            if job['state'] == 'running':
+                self._futures[job_id] = futures
+            if job['completed'] >= job['total']:
+                self._finish(job_id)
+        return job_id
+
+    def _on_done(self, job_id, index, fut, key=None):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job['state'] == 'cancelled' or fut.cancelled():
+                return
+            try:
+                job['results'][index] = fut.result()
+                if key is not None:
+                    self._cache_put(key, job['results'][index])
+            except Exception as e:
+                job['errors'].append({'task': index, 'error': str(e)})
+            job['completed'] += 1
+            if job['completed'] >= job['total']:
+                self._finish(job_id)
+            else:
+                self._persist(job)
+
+    def _finish(self, job_id):
+        """Fecha o job uma única vez (chamado pelo último callback e/ou pelo submit)."""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job['state'] != 'running':
+                return
+            self._futures.pop(job_id, None)
+            job['state'] = 'failed' if job['errors'] else 'done'
+            job['finished'] = time.time()
+            self._persist(job)
+            self._prune()
+
+    def cancel(self, job_id):
+        """Cancela as tarefas na fila e marca o job 'cancelled'; False se não existe, já terminou ou não é cancelável."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'running':
+                return False
+            # fut.cancel() só funciona para tarefas que ainda não começaram
+            if not any([fut.cancel() for fut in self._futures.get(job_id, []) if not fut.done()]):
+                return False
+            self._futures.pop(job_id, None)
+            job['state'] = 'cancelled'
+            job['finished'] = time.time()
+            self._persist(job)
+            self._prune()
+            return True
+
+    def status(self, job_id):
+        """Snapshot do job (dict) com 'progress' em [0,1] e 'cancellable'; None se não existir (ou já foi apagado)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snap = dict(job)
+            snap['results'] = list(job['results'])
+            snap['errors'] = list(job['errors'])
+            snap['cancellable'] = job['state'] == 'running' and \
+                any(not (fut.running() or fut.done()) for fut in self._futures.get(job_id, []))
+        snap['progress'] = (snap['completed'] / snap['total']) if snap['total'] else 1.0
+        return snap
+
+    def list_jobs(self, kind=None):
+        with self._lock:
+            ids = [j['id'] for j in sorted(self._jobs.values(), key=lambda j: j['created'], reverse=True)
+                   if kind is None or j['kind'] == kind]
+        return [self.status(i) for i in ids]
+
+    def active_job(self, kind, **params):
+        """Retorna o id de um job em execução do tipo `kind` com os mesmos parâmetros (ou None)."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['kind'] == kind and job['state'] == 'running' and \
+                        all(job['params'].get(k) == v for k, v in params.items()):
+                    return job['id']
+        return None
+
+    # ------------------- atalhos para os jobs usados pelo app -------------------
+    def submit_threshold_sweep(self, neutral, sad, happy, thresholds):
+        """Uma tarefa por threshold: os thresholds rodam em paralelo nos processos do pool."""
+        tasks = [(threshold_trial, (neutral, sad, happy, th)) for th in thresholds]
+        return self.submit('threshold_sweep', tasks, params={
+            'neutral': neutral, 'sad': sad, 'happy': happy, 'thresholds': list(thresholds)})
+
+    def submit_regenerate(self, neutral, sad, happy, out_dir, threshold, renderer='matplotlib', store=None):
+        """Regenera out_dir; se já houver uma regeneração rodando para o mesmo diretório, retorna o id dela."""
+        running = self.active_job('regenerate', out_dir=out_dir)
+        if running is not None:
+            return running
+        return self.submit('regenerate', [(regenerate, (neutral, sad, happy, out_dir, threshold, renderer, store))], params={
+            'neutral': neutral, 'sad': sad, 'happy': happy, 'out_dir': out_dir, 'threshold': threshold})
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
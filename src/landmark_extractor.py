@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from .utils import landmarks_to_np
+from .image_loader import imread, imread_reduced
 
 try:
     import mediapipe as mp
@@ -10,29 +11,50 @@ except Exception:
 
 class LandmarkExtractor:
     """Extrator de landmarks. Prefere MediaPipe, pode usar CSV do OpenFace com adapter."""
-    def __init__(self, use_mediapipe=True):
+    def __init__(self, use_mediapipe=True, max_num_faces=1):
+        """max_num_faces>1 deixa o FaceMesh detectar várias faces numa única inferência (ver from_bgr_multi)."""
         self.use_mediapipe = use_mediapipe and (mp is not None)
+        self.max_num_faces = max_num_faces
         if self.use_mediapipe:
-            self.face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True)
+            self.face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=max_num_faces)
 
-    def from_image(self, image_path):
-        img = cv2.imread(image_path)
+    def from_image(self, image_path, reduce=1):
+        """reduce=2/4 decodifica a imagem já reduzida (mais rápido em fotos grandes);
+        os landmarks são devolvidos nas coordenadas da resolução original."""
+        if reduce == 1:
+            img = imread(image_path)
+            if img is None:
+                raise FileNotFoundError(image_path)
+            return self.from_bgr(img)
+        img, scale = imread_reduced(image_path, reduce)
         if img is None:
             raise FileNotFoundError(image_path)
-        return self.from_bgr(img)
+        lm = self.from_bgr(img)
+        return None if lm is None else lm * scale
 
-    def from_bgr(self, bgr_image):
-        if self.use_mediapipe:
-            img_rgb = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(img_rgb)
-            if not results.multi_face_landmarks:
-                return None
-            lm = results.multi_face_landmarks[0]
-            h, w, _ = bgr_image.shape
-            pts = [(p.x * w, p.y * h) for p in lm.landmark]
-            return landmarks_to_np(pts)
-        else:
+    def _process(self, bgr_image):
+        if not self.use_mediapipe:
             raise RuntimeError('MediaPipe não disponível. Use adapter OpenFace.')
+        img_rgb = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB)
+        return self.face_mesh.process(img_rgb).multi_face_landmarks or []
+
+    def from_bgr(self, bgr_image):
+        faces = self._process(bgr_image)
+        if not faces:
+            return None
+        h, w, _ = bgr_image.shape
+        pts = [(p.x * w, p.y * h) for p in faces[0].landmark]
+        return landmarks_to_np(pts)
+
+    def from_bgr_multi(self, bgr_image):
+        """Todas as faces detectadas numa única inferência: array (F, N, 2) em pixels (F=0 sem faces)."""
+        faces = self._process(bgr_image)
+        h, w, _ = bgr_image.shape
+        if not faces:
+            return np.zeros((0, 468, 2), dtype=float)
+        out = np.array([[(p.x, p.y) for p in face.landmark] for face in faces], dtype=float)
+        out *= (w, h)
+        return out
 
 
 def parse_openface_csv(csv_path):
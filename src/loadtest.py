@@ -0,0 +1,82 @@
+import json
+import time
+import base64
+import argparse
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _post(url, payload, timeout=60.0):
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        body = resp.read()
+        headers = dict(resp.headers)
+    return (time.perf_counter() - t0) * 1000.0, json.loads(body), headers
+
+
+def run_load_test(url, neutral, target, requests=200, concurrency=16, subject=None):
+    """Dispara `requests` POST /analyze com `concurrency` clientes e retorna estatísticas de vazão/latência.
+
+    Se `subject` for dado, cadastra o neutro uma vez (POST /enroll) e envia só o alvo. `target` pode ser uma
+    lista de caminhos, usados em rodízio (alvos distintos não são deduplicados pelo servidor).
+    """
+    targets = [target] if isinstance(target, str) else list(target)
+    targets_b64 = []
+    for path in targets:
+        with open(path, 'rb') as f:
+            targets_b64.append(base64.b64encode(f.read()).decode('ascii'))
+    with open(neutral, 'rb') as f:
+        neutral_b64 = base64.b64encode(f.read()).decode('ascii')
+    base = url.rstrip('/')
+    if subject is not None:
+        _post(base + '/enroll', {'subject': subject, 'neutral': neutral_b64})
+        payloads = [{'subject': subject, 'target': t} for t in targets_b64]
+    else:
+        payloads = [{'neutral': neutral_b64, 'target': t} for t in targets_b64]
+
+    def one(i):
+        try:
+            ms, body, headers = _post(base + '/analyze', payloads[i % len(payloads)])
+            return ms, body.get('label'), int(headers.get('X-Batch-Size', 1)), float(headers.get('X-Queue-Time-Ms', 0.0))
+        except Exception as e:
+            return None, str(e), 0, 0.0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        rows = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+
+    ok = [r for r in rows if r[0] is not None]
+    lat = np.array([r[0] for r in ok]) if ok else np.zeros(1)
+    labels = {}
+    for r in ok:
+        labels[r[1]] = labels.get(r[1], 0) + 1
+    return {
+        'requests': requests,
+        'ok': len(ok),
+        'errors': len(rows) - len(ok),
+        'elapsed_s': elapsed,
+        'rps': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {'p50': float(np.percentile(lat, 50)), 'p90': float(np.percentile(lat, 90)),
+                       'p99': float(np.percentile(lat, 99)), 'max': float(lat.max())},
+        'mean_batch_size': float(np.mean([r[2] for r in ok])) if ok else 0.0,
+        'mean_queue_ms': float(np.mean([r[3] for r in ok])) if ok else 0.0,
+        'labels': labels,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cliente de carga para o serviço src.serve')
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--neutral', required=True)
+    parser.add_argument('--target', required=True, nargs='+', help='um ou mais alvos (usados em rodízio)')
+    parser.add_argument('-n', '--requests', type=int, default=200)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('--subject', default=None, help='cadastra o neutro como este sujeito e envia só o alvo')
+    args = parser.parse_args()
+    stats = run_load_test(args.url, args.neutral, args.target, requests=args.requests,
+                          concurrency=args.concurrency, subject=args.subject)
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,208 @@
+import os
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .utils import ensure_dir
+
+# limites (segundos) dos buckets dos histogramas
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get('FACIAL_METRICS', '').lower() in ('1', 'true', 'yes')
+
+
+def enable(flag=True):
+    """Liga/desliga a instrumentação no processo (também via variável de ambiente FACIAL_METRICS=1)."""
+    global _enabled
+    _enabled = bool(flag)
+
+
+def enabled():
+    return _enabled
+
+
+class Histogram:
+    """Histograma cumulativo no estilo Prometheus (contagens por bucket, soma e total)."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histogramas de tempo de parede e de CPU por estágio, compartilhados pelo processo."""
+    METRICS = (
+        ('facial_stage_wall_seconds', 'Tempo de parede por estágio do pipeline'),
+        ('facial_stage_cpu_seconds', 'Tempo de CPU (da thread) por estágio do pipeline'),
+    )
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hist = {name: {} for name, _ in self.METRICS}
+
+    def observe(self, stage, wall, cpu):
+        with self._lock:
+            for name, value in (('facial_stage_wall_seconds', wall), ('facial_stage_cpu_seconds', cpu)):
+                h = self._hist[name].get(stage)
+                if h is None:
+                    h = self._hist[name][stage] = Histogram(self.buckets)
+                h.observe(value)
+
+    def snapshot(self):
+        """{stage: {'count', 'wall_sum', 'cpu_sum'}} (útil para logs/testes)."""
+        with self._lock:
+            wall, cpu = self._hist['facial_stage_wall_seconds'], self._hist['facial_stage_cpu_seconds']
+            return {s: {'count': h.count, 'wall_sum': h.sum, 'cpu_sum': cpu[s].sum} for s, h in wall.items()}
+
+    def reset(self):
+        with self._lock:
+            self._hist = {name: {} for name, _ in self.METRICS}
+
+    def to_prometheus(self):
+        """Exporta no formato texto do Prometheus (exposition format 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, help_text in self.METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for stage in sorted(self._hist[name]):
+                    h = self._hist[name][stage]
+                    acc = 0
+                    for le, c in zip(h.buckets, h.counts):
+                        acc += c
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{le:g}"}} {acc}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.9g}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Grava o texto Prometheus de forma atômica (ex.: para o textfile collector do node_exporter)."""
+        d = os.path.dirname(path)
+        if d:
+            ensure_dir(d)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 't0', 'c0')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self.c0 = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.t0, time.thread_time() - self.c0)
+        return False
+
+
+class StageTimer:
+    """Acumula tempos por estágio de uma análise e alimenta os histogramas do registry.
+
+    Uso: `with timer.stage('extract'): ...`. Thread-safe (estágios podem rodar em threads diferentes);
+    o tempo de CPU é o da thread que executou o estágio.
+    """
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def record(self, name, wall, cpu):
+        with self._lock:
+            t = self.timings.get(name)
+            if t is None:
+                t = self.timings[name] = {'wall_ms': 0.0, 'cpu_ms': 0.0}
+            t['wall_ms'] += wall * 1000.0
+            t['cpu_ms'] += cpu * 1000.0
+        if self.registry is not None:
+            self.registry.observe(name, wall, cpu)
+
+    def attach(self, result):
+        """Copia os tempos para result['timings'] (se result for um dict)."""
+        if isinstance(result, dict):
+            with self._lock:
+                result['timings'] = {k: dict(v) for k, v in self.timings.items()}
+        return result
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullTimer:
+    """Timer desligado: sem relógio, sem lock, sem alocação por estágio."""
+    __slots__ = ()
+    timings = None
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def record(self, name, wall, cpu):
+        pass
+
+    def attach(self, result):
+        return result
+
+
+NULL_TIMER = _NullTimer()
+
+
+def timer(registry=REGISTRY):
+    """StageTimer novo se a instrumentação estiver ligada; senão o NULL_TIMER compartilhado."""
+    return StageTimer(registry) if _enabled else NULL_TIMER
+
+
+def stage(name):
+    """Mede um estágio só nos histogramas (sem resultado associado)."""
+    return StageTimer(REGISTRY).stage(name) if _enabled else NULL_TIMER.stage(name)
+
+
+def start_http_server(port=9464, host='127.0.0.1', registry=REGISTRY):
+    """Serve GET /metrics numa thread daemon; retorna o servidor (use .shutdown() para parar)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            data = registry.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -1,65 +1,236 @@
 import numpy as np
 from .landmark_extractor import LandmarkExtractor
+from .image_loader import load_images
 from .digraph import digraph_from_difference, build_face_digraph
 from .dfa import SimpleEmotionDFA
+from .baseline import MultiBaseline
 from .utils import map_landmarks_to_regions, bbox_from_landmarks
+from . import metrics
 
 
 class FacialStatePipeline:
-    def __init__(self, extractor=None, dfa=None, threshold=2.0):
+    def __init__(self, extractor=None, dfa=None, threshold=2.0, store=None, subject=None, baseline_mode='median',
+                 noise_k=0.0, max_faces=4):
+        """store: ResultsStore (ou caminho do banco SQLite) para gravar cada analyze_images no histórico;
+        com um caminho, o store é deste pipeline e `close()` (ou o `with`) o fecha.
+        baseline_mode/noise_k: como comparar com um neutro MultiBaseline (ver src.baseline).
+        max_faces: faces por quadro em analyze_frame quando o extractor é o padrão (de uma face só)."""
+        from .results_store import open_store
+        self._default_extractor = extractor is None
         self.extractor = extractor or LandmarkExtractor()
+        self.max_faces = max_faces
+        self._frame_extractor = None
+        self.store, self._owns_store = open_store(store)
+        self.subject = subject
         self.threshold = threshold
         self.dfa = dfa or SimpleEmotionDFA()
+        self.baseline_mode = baseline_mode
+        self.noise_k = noise_k
+        self.baselines = {}
+        self.tracker = None
 
-    def analyze_pair(self, neutral_bgr, happy_bgr):
-        n_lm = self.extractor.from_bgr(neutral_bgr)
-        t_lm = self.extractor.from_bgr(happy_bgr)
+    def close(self):
+        """Grava as linhas pendentes do histórico; fecha o store se ele foi aberto aqui (a partir de um caminho)."""
+        if self.store is None:
+            return
+        if self._owns_store:
+            self.store.close()
+            self.store = None
+        else:
+            self.store.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @classmethod
+    def from_config(cls, path, extractor=None, **kwargs):
+        """Pipeline com os thresholds de um dfa_config.json (gerado por src.tune): DFA + 'threshold' do diff."""
+        from .utils import load_json
+        config = load_json(path)
+        return cls(extractor=extractor, dfa=SimpleEmotionDFA.from_config(config),
+                   threshold=float(config.get('threshold', 2.0)), **kwargs)
+
+    def analyze_pair(self, neutral_bgr, happy_bgr, timer=None):
+        timer = timer or metrics.timer()
+        with timer.stage('extract'):
+            n_lm = self.extractor.from_bgr(neutral_bgr)
+            t_lm = self.extractor.from_bgr(happy_bgr)
+        return self.analyze_landmarks(n_lm, t_lm, timer=timer)
+
+    def analyze_landmarks(self, n_lm, t_lm, with_graph=True, timer=None, compact=False):
+        """Mesma análise de analyze_pair, a partir de landmarks já extraídos (ex.: neutro cadastrado).
+
+        with_graph=False não constrói os grafos (networkx); o resultado não tem 'diff_graph'.
+        compact=True retorna um AnalysisResult (src.results: binário empacotado, difs float32, sem grafo)
+        em vez do dict; use para guardar muitos resultados.
+        Com a instrumentação ligada (metrics.enable()), o resultado traz 'timings' por estágio.
+        """
+        timer = timer or metrics.timer()
         if n_lm is None or t_lm is None:
-            return {'label':'reject','reason':'no_face'}
+            return self._result(timer, compact, label='reject', reason='no_face')
         if len(n_lm) != len(t_lm):
-            return {'label':'reject','reason':'landmark_count_mismatch'}
+            return self._result(timer, compact, label='reject', reason='landmark_count_mismatch')
+        if compact:
+            with_graph = False
 
         # construir grafos (opcional)
-        G_neutral = build_face_digraph(n_lm)
-        G_target = build_face_digraph(t_lm)
+        if with_graph:
+            with timer.stage('graph_build'):
+                G_neutral = build_face_digraph(n_lm.median if isinstance(n_lm, MultiBaseline) else n_lm)
+                G_target = build_face_digraph(t_lm)
 
         # mapear regiões a partir do neutro
-        bbox = bbox_from_landmarks(n_lm)
-        regions = map_landmarks_to_regions(n_lm, bbox=bbox)
+        multi = isinstance(n_lm, MultiBaseline)
+        ref = n_lm.median if multi else n_lm
+        with timer.stage('region_mapping'):
+            bbox = bbox_from_landmarks(ref)
+            regions = map_landmarks_to_regions(ref, bbox=bbox)
 
         # gerar diff normalizado por escala da face
-        diff_graph, binary, difs = digraph_from_difference(n_lm, t_lm, threshold=self.threshold, normalize=True)
-
-        # instanciar DFA com regiões encontradas
-        dfa = SimpleEmotionDFA(regions=regions)
-        # passar tanto o vetor binário quanto as magnitudes para o DFA (se suportado)
-        dfa_input = {
-            'counts': {r: int(binary[idxs].sum()) if idxs else 0 for r, idxs in regions.items()},
-            'sizes': {r: len(idxs) for r, idxs in regions.items()},
-            'difs': difs,
-            'binary': binary
-        }
-        label = dfa.predict(dfa_input)
+        with timer.stage('diff'):
+            if multi:
+                diff_graph, binary, difs = n_lm.diff(t_lm, threshold=self.threshold, mode=self.baseline_mode,
+                                                     noise_k=self.noise_k, build_graph=with_graph)
+            else:
+                diff_graph, binary, difs = digraph_from_difference(n_lm, t_lm, threshold=self.threshold,
+                                                                   normalize=True, build_graph=with_graph)
+
+        with timer.stage('dfa'):
+            # instanciar DFA com regiões encontradas (mantendo os thresholds configurados em self.dfa)
+            dfa = SimpleEmotionDFA.from_config(self.dfa.to_config(), regions=regions)
+            # passar tanto o vetor binário quanto as magnitudes para o DFA (se suportado)
+            dfa_input = {
+                'counts': {r: int(binary[idxs].sum()) if idxs else 0 for r, idxs in regions.items()},
+                'sizes': {r: len(idxs) for r, idxs in regions.items()},
+                'difs': difs,
+                'binary': binary
+            }
+            label = dfa.predict(dfa_input)
 
         # estatísticas por região
         counts = {r: int(binary[idxs].sum()) if idxs else 0 for r, idxs in regions.items()}
         sizes = {r: len(idxs) for r, idxs in regions.items()}
+        if compact:
+            return self._result(timer, compact, label=label, binary=binary, difs=difs, counts=counts, sizes=sizes)
 
-        return {
+        res = {
             'label': label,
             'binary': binary.tolist() if isinstance(binary, np.ndarray) else binary,
-            'diff_nodes': list(diff_graph.nodes()),
+            'diff_nodes': list(diff_graph.nodes()) if with_graph else np.flatnonzero(binary).tolist(),
             'diff_graph': diff_graph,
             'counts': counts,
             'sizes': sizes,
             'difs': difs.tolist() if isinstance(difs, np.ndarray) else difs
         }
+        if not with_graph:
+            del res['diff_graph']
+        return timer.attach(res)
+
+    @staticmethod
+    def _result(timer, compact, **fields):
+        if not compact:
+            return timer.attach(fields)
+        from .results import AnalysisResult
+        return AnalysisResult(timings=timer.attach({}).get('timings'), **fields)
+
+    def enroll_baseline(self, face_id, landmarks):
+        """Cadastra os landmarks neutros de uma face (ID do FaceTracker ou qualquer chave).
+
+        Várias capturas (R,N,2) ou um MultiBaseline viram um neutro multi-referência.
+        """
+        if not isinstance(landmarks, MultiBaseline):
+            landmarks = np.asarray(landmarks, dtype=float)
+            if landmarks.ndim == 3:
+                landmarks = MultiBaseline(landmarks)
+        self.baselines[face_id] = landmarks
+
+    def _multi_face_extractor(self):
+        """Extractor de analyze_frame: o próprio se detecta várias faces; o padrão ganha uma versão multi-face."""
+        max_num_faces = getattr(self.extractor, 'max_num_faces', None)
+        if max_num_faces is None or max_num_faces > 1:
+            return self.extractor
+        if not self._default_extractor:
+            raise ValueError(f'analyze_frame requer um extractor com max_num_faces > 1 (recebido {max_num_faces}); '
+                             'use LandmarkExtractor(max_num_faces=N)')
+        if self._frame_extractor is None:
+            self._frame_extractor = LandmarkExtractor(max_num_faces=self.max_faces)
+        return self._frame_extractor
+
+    def analyze_frame(self, bgr, auto_enroll=True, with_graph=False, timer=None):
+        """Analisa todas as faces de um quadro com uma única inferência do FaceMesh.
+
+        As faces recebem IDs estáveis entre quadros (self.tracker, um FaceTracker) e cada uma é comparada com o
+        próprio neutro cadastrado. Com auto_enroll, o primeiro quadro de uma face nova vira o neutro dela.
+        Um extractor passado no construtor deve ter max_num_faces > 1 (ValueError se não); com o extractor padrão,
+        é criado um LandmarkExtractor(max_num_faces=self.max_faces). Retorna uma lista com um resultado por face,
+        cada um com 'face_id' e 'bbox'.
+        """
+        from .face_tracker import FaceTracker
+        timer = timer or metrics.timer()
+        extractor = self._multi_face_extractor()
+        if self.tracker is None:
+            self.tracker = FaceTracker()
+        with timer.stage('extract'):
+            faces = extractor.from_bgr_multi(bgr)
+        ids = self.tracker.update(faces)
+        # IDs de trilhas encerradas não voltam (são crescentes): descarta os neutros delas
+        active = set(self.tracker.active())
+        for face_id in [k for k in self.baselines if isinstance(k, int) and k < self.tracker.next_id
+                        and k not in active]:
+            del self.baselines[face_id]
+        out = []
+        for face_id, lm in zip(ids, faces):
+            n_lm = self.baselines.get(face_id)
+            if n_lm is None:
+                if auto_enroll:
+                    self.enroll_baseline(face_id, lm)
+                    res = {'label': 'neutral', 'reason': 'baseline_enrolled'}
+                else:
+                    res = {'label': 'reject', 'reason': 'no_baseline'}
+            else:
+                res = self.analyze_landmarks(n_lm, lm, with_graph=with_graph, timer=timer)
+            res['face_id'] = face_id
+            res['bbox'] = bbox_from_landmarks(lm)
+            out.append(res)
+        return out
+
+    def analyze_images(self, neutral_path, happy_path, reduce=1, expected=None):
+        """Lê as duas imagens em paralelo; com reduce>1 decodifica reduzida e reescala os landmarks.
+
+        Com self.store, o resultado também vai para o histórico (expected: expressão esperada do alvo).
+        """
+        timer = metrics.timer()
+        if reduce == 1:
+            with timer.stage('decode'):
+                nb, tb = load_images([neutral_path, happy_path])
+            res = self.analyze_pair(nb, tb, timer=timer)
+        else:
+            with timer.stage('extract'):
+                n_lm = self.extractor.from_image(neutral_path, reduce=reduce)
+                t_lm = self.extractor.from_image(happy_path, reduce=reduce)
+            res = self.analyze_landmarks(n_lm, t_lm, timer=timer)
+        if self.store is not None:
+            self.store.add(res, source='pipeline', subject=self.subject, expected=expected,
+                           neutral_path=neutral_path, target_path=happy_path, threshold=self.threshold,
+                           params={'reduce': reduce, 'dfa': self.dfa.to_config()})
+        return res
+
 
-    def analyze_images(self, neutral_path, happy_path):
-        import cv2
-        nb = cv2.imread(neutral_path)
-        tb = cv2.imread(happy_path)
-        return self.analyze_pair(nb, tb)
+def result_to_json(res):
+    """Versão serializável do resultado: o diff_graph vira uma lista resumida de arestas."""
+    timer = metrics.timer()
+    with timer.stage('serialize'):
+        out = dict(res)
+        if 'diff_graph' in out:
+            dg = out.pop('diff_graph')
+            out['diff_edges'] = [(int(a), int(b), float(dg[a][b].get('weight', 0.0))) for a,b in dg.edges()]
+    if timer.timings and 'timings' in out:
+        out['timings'] = dict(out['timings'], **timer.timings)
+    return out
 
 
 if __name__ == '__main__':
@@ -70,23 +241,36 @@ if __name__ == '__main__':
     parser.add_argument('--threshold', type=float, default=2.0, help='threshold em pixels (>1) ou fração (<=1)')
     parser.add_argument('--visualize', action='store_true', help='gera imagens de visualização em --out')
     parser.add_argument('--out', default=None, help='diretório de saída para visualizações')
+    parser.add_argument('--reduce', type=int, default=1, choices=(1, 2, 4, 8),
+                        help='decodifica as fotos reduzidas por este fator (landmarks reescalados)')
+    parser.add_argument('--metrics-out', default=None,
+                        help='liga a instrumentação por estágio e grava as métricas (texto Prometheus) neste arquivo')
+    parser.add_argument('--dfa-config', default=None, help='dfa_config.json (src.tune); substitui --threshold')
+    parser.add_argument('--store', default=None, help='banco SQLite do histórico (ex.: test_images/results.db)')
+    parser.add_argument('--subject', default=None, help='identificador do sujeito gravado no histórico')
+    parser.add_argument('--expected', default=None, help='expressão esperada do alvo, gravada no histórico')
     args = parser.parse_args()
-    p = FacialStatePipeline(threshold=args.threshold)
-    out = p.analyze_images(args.neutral, args.happy)
+    if args.metrics_out:
+        metrics.enable()
+    if args.dfa_config:
+        p = FacialStatePipeline.from_config(args.dfa_config, store=args.store, subject=args.subject)
+    else:
+        p = FacialStatePipeline(threshold=args.threshold, store=args.store, subject=args.subject)
+    with p:
+        out = p.analyze_images(args.neutral, args.happy, reduce=args.reduce, expected=args.expected)
     import json, os
     # diff_graph não é serializável; substituir por lista de arestas resumida
-    out_printable = dict(out)
-    if 'diff_graph' in out_printable:
-        dg = out_printable.pop('diff_graph')
-        out_printable['diff_edges'] = [(int(a), int(b), float(dg[a][b].get('weight', 0.0))) for a,b in dg.edges()]
-    print(json.dumps(out_printable, indent=2))
+    print(json.dumps(result_to_json(out), indent=2))
     if args.visualize and args.out:
         os.makedirs(args.out, exist_ok=True)
         from .visualize import plot_diff_graph
-        import cv2
-        nb = cv2.imread(args.neutral)
+        from .image_loader import imread
+        nb = imread(args.neutral)
         # res já contém 'diff_graph' e 'difs'
         res = out
         n_lm = p.extractor.from_bgr(nb)
         # salvar visualização do diff
-        plot_diff_graph(nb, n_lm, res['diff_graph'], out_path=os.path.join(args.out, 'diff.png'))
+        with metrics.stage('render'):
+            plot_diff_graph(nb, n_lm, res['diff_graph'], out_path=os.path.join(args.out, 'diff.png'))
+    if args.metrics_out:
+        metrics.REGISTRY.write(args.metrics_out)
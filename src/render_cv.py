@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+
+
+def topk_indices(values, k):
+    """Retorna os índices dos k maiores valores (ordem decrescente) usando argpartition (O(n))."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        idx = np.argpartition(-values, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-values[idx], kind='stable')]
+
+
+def graph_edge_arrays(diff_graph, landmarks=None):
+    """Converte as arestas de um grafo de diferença em arrays (E,2) de índices e (E,) de pesos.
+
+    Usa o atributo 'weight' (ou 'w', 'dist', 'distance'); na ausência, a distância geométrica
+    entre os landmarks (se fornecidos) ou 1.0.
+    """
+    edges = []
+    weights = []
+    lm = None if landmarks is None else np.asarray(landmarks)
+    for a, b, edata in diff_graph.edges(data=True):
+        w = None
+        for key in ('weight', 'w', 'dist', 'distance'):
+            if key in edata:
+                try:
+                    w = float(edata[key])
+                    break
+                except Exception:
+                    pass
+        if w is None:
+            w = float(np.linalg.norm(lm[a] - lm[b])) if lm is not None else 1.0
+        edges.append((a, b))
+        weights.append(w)
+    return np.asarray(edges, dtype=np.int64).reshape(-1, 2), np.asarray(weights, dtype=float)
+
+
+def select_top_edges(edges, weights, k=8, pct=98):
+    """Mesma seleção de `visualize.plot_diff_graph` (arestas acima do percentil `pct`, limitadas às k maiores),
+    mas direto sobre arrays. Retorna os índices dos nós envolvidos nas arestas selecionadas.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    weights = np.asarray(weights, dtype=float)
+    if len(weights) == 0:
+        return np.zeros(0, dtype=np.int64)
+    cand = np.flatnonzero(weights >= np.percentile(weights, pct))
+    if len(cand) == 0:
+        cand = np.arange(len(weights))
+        k = min(k, max(2, int(len(weights) * 0.06)))
+    if len(cand) > k:
+        cand = cand[topk_indices(weights[cand], k)]
+    return np.unique(edges[cand].ravel())
+
+
+class CvRenderer:
+    """Renderizador rápido de landmarks/diffs com OpenCV.
+
+    Desenha direto num buffer BGR reutilizado entre chamadas (sem criar figuras do matplotlib).
+    - max_side: se definido, a imagem de fundo é reduzida para que o maior lado tenha no máximo esse tamanho.
+    Não é thread-safe (o buffer é compartilhado); use uma instância por thread.
+    """
+    def __init__(self, max_side=None):
+        self.max_side = max_side
+        self._canvas = None
+
+    def _prepare(self, image):
+        h, w = image.shape[:2]
+        scale = 1.0
+        if self.max_side and max(h, w) > self.max_side:
+            scale = float(self.max_side) / max(h, w)
+        out_w, out_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        if self._canvas is None or self._canvas.shape != (out_h, out_w, 3):
+            self._canvas = np.empty((out_h, out_w, 3), dtype=np.uint8)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:  # BGRA (ex.: PNG com alfa): o canvas é BGR
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        if scale != 1.0:
+            cv2.resize(image, (out_w, out_h), dst=self._canvas, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(self._canvas, image)
+        return self._canvas, scale
+
+    def _scaled_points(self, landmarks, scale):
+        return np.rint(np.asarray(landmarks, dtype=float)[:, :2] * scale).astype(np.int32)
+
+    def render_highlights(self, image, landmarks, highlight_idxs, out_path=None, style='diff', labels=False):
+        """Desenha todos os landmarks e destaca `highlight_idxs`.
+
+        style='diff': pontos vermelhos pequenos + destaques vermelhos com borda branca (como plot_diff_graph)
+        style='annotate': destaques amarelos com borda preta (como annotate_diffs)
+        Retorna o buffer desenhado (view reutilizada; copie se precisar guardar).
+        """
+        canvas, scale = self._prepare(image)
+        pts = self._scaled_points(landmarks, scale)
+        unit = max(1, int(round(max(canvas.shape[:2]) / 800.0)))
+        for x, y in pts:
+            cv2.circle(canvas, (int(x), int(y)), unit, (0, 0, 255), -1, cv2.LINE_AA)
+        idxs = np.asarray(highlight_idxs, dtype=np.int64)
+        if style == 'annotate':
+            fill, border, radius = (0, 255, 255), (0, 0, 0), 5 * unit
+        else:
+            fill, border, radius = (51, 51, 255), (255, 255, 255), 4 * unit
+        for i in idxs:
+            x, y = int(pts[i, 0]), int(pts[i, 1])
+            cv2.circle(canvas, (x, y), radius, fill, -1, cv2.LINE_AA)
+            cv2.circle(canvas, (x, y), radius, border, max(1, unit // 2), cv2.LINE_AA)
+            if labels:
+                cv2.putText(canvas, str(int(i)), (x + radius, y + radius), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.4 * unit, (0, 0, 0), max(1, unit), cv2.LINE_AA)
+        if out_path:
+            cv2.imwrite(out_path, canvas)
+        return canvas
+
+    def render_diff_graph(self, image, landmarks, diff_graph, out_path=None, k=8):
+        """Equivalente rápido de `visualize.plot_diff_graph`."""
+        edges, weights = graph_edge_arrays(diff_graph, landmarks)
+        return self.render_diff_edges(image, landmarks, edges, weights, out_path=out_path, k=k)
+
+    def render_diff_edges(self, image, landmarks, edges, weights, out_path=None, k=8):
+        """Destaca os nós das k arestas de maior peso, a partir de arrays (E,2) e (E,)."""
+        nodes = select_top_edges(edges, weights, k=k)
+        return self.render_highlights(image, landmarks, nodes, out_path=out_path, style='diff')
+
+    def render_topk_nodes(self, image, landmarks, difs, out_path=None, k=8, labels=True):
+        """Destaca os k landmarks de maior deslocamento (`difs`), como annotate_diffs."""
+        idxs = topk_indices(difs, k)
+        return self.render_highlights(image, landmarks, idxs, out_path=out_path, style='annotate', labels=labels)
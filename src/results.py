@@ -0,0 +1,249 @@
+import json
+import numpy as np
+
+_REGION_NAMES = {}
+
+
+def _region_names(names):
+    """Tupla canônica de nomes de região (uma só instância compartilhada por todos os resultados)."""
+    names = tuple(names)
+    return _REGION_NAMES.setdefault(names, names)
+
+
+class AnalysisResult:
+    """Resultado compacto de uma análise: o vetor binário empacotado (1 bit por landmark), difs em float32 e
+    contagens/tamanhos por região em arrays int16, em vez de listas Python de objetos e do grafo networkx.
+
+    `to_dict()` reconstrói o formato de `FacialStatePipeline.analyze_landmarks` (sem 'diff_graph', que não é
+    guardado; 'diff_nodes' vem do binário) e `to_json()` o serializa. Chaves extras do dict (ex.: 'face_id',
+    'bbox') ficam em `extra`.
+    """
+    __slots__ = ('label', 'reason', 'n', 'bits', 'difs', 'regions', 'counts', 'sizes', 'timings', 'extra')
+
+    def __init__(self, label, binary=None, difs=None, counts=None, sizes=None, reason=None, timings=None,
+                 extra=None):
+        self.label = label
+        self.reason = reason
+        if binary is None:
+            self.n, self.bits = 0, None
+        else:
+            binary = np.asarray(binary)
+            self.n = len(binary)
+            self.bits = np.packbits(binary.astype(bool))
+        self.difs = None if difs is None else np.asarray(difs, dtype=np.float32)
+        if counts is None:
+            self.regions = self.counts = self.sizes = None
+        else:
+            self.regions = _region_names(counts)
+            self.counts = np.fromiter((counts[r] for r in self.regions), dtype=np.int16, count=len(self.regions))
+            self.sizes = None if sizes is None else np.fromiter((sizes[r] for r in self.regions), dtype=np.int16,
+                                                                count=len(self.regions))
+        self.timings = timings
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, res):
+        known = ('label', 'reason', 'binary', 'difs', 'counts', 'sizes', 'timings', 'diff_nodes', 'diff_graph')
+        extra = {k: v for k, v in res.items() if k not in known} or None
+        return cls(res.get('label'), res.get('binary'), res.get('difs'), res.get('counts'), res.get('sizes'),
+                   reason=res.get('reason'), timings=res.get('timings'), extra=extra)
+
+    @property
+    def binary(self):
+        """Vetor binário (N,) int8 desempacotado."""
+        if self.bits is None:
+            return None
+        return np.unpackbits(self.bits, count=self.n).view(np.int8)
+
+    @property
+    def diff_nodes(self):
+        return None if self.bits is None else np.flatnonzero(self.binary)
+
+    def counts_dict(self):
+        return None if self.counts is None else dict(zip(self.regions, self.counts.tolist()))
+
+    def to_dict(self):
+        """Mesmo formato de `analyze_landmarks(..., with_graph=False)` (listas Python)."""
+        res = {'label': self.label}
+        if self.reason is not None:
+            res['reason'] = self.reason
+        if self.bits is not None:
+            binary = self.binary
+            res['binary'] = binary.tolist()
+            res['diff_nodes'] = np.flatnonzero(binary).tolist()
+        if self.counts is not None:
+            res['counts'] = self.counts_dict()
+            if self.sizes is not None:
+                res['sizes'] = dict(zip(self.regions, self.sizes.tolist()))
+        if self.difs is not None:
+            res['difs'] = self.difs.astype(float).tolist()
+        if self.timings is not None:
+            res['timings'] = self.timings
+        if self.extra:
+            res.update(self.extra)
+        return res
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @property
+    def nbytes(self):
+        """Bytes dos arrays (sem contar o cabeçalho dos objetos)."""
+        return sum(a.nbytes for a in (self.bits, self.difs, self.counts, self.sizes) if a is not None)
+
+    def __repr__(self):
+        changed = int(np.unpackbits(self.bits).sum()) if self.bits is not None else None
+        return f'AnalysisResult(label={self.label!r}, n={self.n}, changed={changed})'
+
+
+class ResultBatch:
+    """Muitos resultados em colunas: rótulos como códigos int8, binários empacotados (M, ⌈N/8⌉) uint8,
+    difs (M, N) float32 e contagens por região (M, R) int16, com capacidade que dobra conforme cresce.
+
+    `append` aceita um AnalysisResult ou o dict do pipeline; `batch[i]` devolve um AnalysisResult (cópia da
+    linha). Resultados sem vetores (ex.: reject por no_face) ficam com `has_vectors` False. Todos os
+    resultados com vetores devem ter o mesmo número de landmarks e as mesmas regiões; 'timings' e `extra`
+    não são guardados.
+    """
+    def __init__(self, n_landmarks=None, capacity=1024):
+        self.n = n_landmarks
+        self.labels = []      # vocabulário de rótulos; a coluna guarda o índice
+        self.reasons = []
+        self.regions = None
+        self.size = 0
+        self._capacity = capacity
+        self.label_codes = np.zeros(capacity, dtype=np.int8)
+        self.reason_codes = np.full(capacity, -1, dtype=np.int8)
+        self.has_vectors = np.zeros(capacity, dtype=bool)
+        self.bits = self.difs = self.counts = self.sizes = None
+
+    def _columns(self, n, regions):
+        self.n = n
+        self.regions = regions
+        self.bits = np.zeros((self._capacity, (n + 7) // 8), dtype=np.uint8)
+        self.difs = np.zeros((self._capacity, n), dtype=np.float32)
+        self.counts = np.zeros((self._capacity, len(regions)), dtype=np.int16)
+        self.sizes = np.zeros((self._capacity, len(regions)), dtype=np.int16)
+
+    def _grow(self):
+        self._capacity *= 2
+        for name in ('label_codes', 'reason_codes', 'has_vectors', 'bits', 'difs', 'counts', 'sizes'):
+            col = getattr(self, name)
+            if col is None:
+                continue
+            new = np.full((self._capacity,) + col.shape[1:], -1 if name == 'reason_codes' else 0, dtype=col.dtype)
+            new[:len(col)] = col
+            setattr(self, name, new)
+
+    @staticmethod
+    def _code(vocab, value):
+        try:
+            return vocab.index(value)
+        except ValueError:
+            vocab.append(value)
+            return len(vocab) - 1
+
+    def append(self, result):
+        if not isinstance(result, AnalysisResult):
+            result = AnalysisResult.from_dict(result)
+        if self.size == self._capacity:
+            self._grow()
+        i = self.size
+        self.label_codes[i] = self._code(self.labels, result.label)
+        if result.reason is not None:
+            self.reason_codes[i] = self._code(self.reasons, result.reason)
+        if result.bits is not None:
+            if self.bits is None:
+                self._columns(result.n, result.regions or ())
+            if result.n != self.n:
+                raise ValueError(f'resultado com {result.n} landmarks num lote de {self.n}')
+            if result.regions is not None and result.regions != self.regions:
+                raise ValueError(f'regiões {result.regions} != regiões do lote {self.regions}')
+            self.has_vectors[i] = True
+            self.bits[i] = result.bits
+            if result.difs is not None:
+                self.difs[i] = result.difs
+            if result.counts is not None:
+                self.counts[i] = result.counts
+                if result.sizes is not None:
+                    self.sizes[i] = result.sizes
+        self.size += 1
+        return i
+
+    def extend(self, results):
+        for r in results:
+            self.append(r)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not -self.size <= i < self.size:
+            raise IndexError(i)
+        i %= self.size
+        r = AnalysisResult(self.labels[self.label_codes[i]])
+        if self.reason_codes[i] >= 0:
+            r.reason = self.reasons[self.reason_codes[i]]
+        if self.has_vectors[i]:
+            r.n = self.n
+            r.bits = self.bits[i].copy()
+            r.difs = self.difs[i].copy()
+            if self.regions:
+                r.regions = self.regions
+                r.counts = self.counts[i].copy()
+                r.sizes = self.sizes[i].copy()
+        return r
+
+    def __iter__(self):
+        return (self[i] for i in range(self.size))
+
+    def label_array(self):
+        """Rótulos como array de strings (M,)."""
+        return np.asarray(self.labels, dtype=object)[self.label_codes[:self.size]]
+
+    def binary_matrix(self):
+        """Binários desempacotados (M, N) int8 (linhas sem vetor ficam zeradas)."""
+        if self.bits is None:
+            return np.zeros((self.size, 0), dtype=np.int8)
+        return np.unpackbits(self.bits[:self.size], axis=1, count=self.n).view(np.int8)
+
+    @property
+    def nbytes(self):
+        cols = (self.label_codes, self.reason_codes, self.has_vectors, self.bits, self.difs, self.counts, self.sizes)
+        return sum(c[:self.size].nbytes for c in cols if c is not None)
+
+    def to_dicts(self):
+        return [r.to_dict() for r in self]
+
+    def save(self, path):
+        """Grava as colunas usadas num .npz (vocabulários e regiões num JSON embutido)."""
+        cols = {name: getattr(self, name)[:self.size]
+                for name in ('label_codes', 'reason_codes', 'has_vectors', 'bits', 'difs', 'counts', 'sizes')
+                if getattr(self, name) is not None}
+        header = json.dumps({'n': self.n, 'labels': self.labels, 'reasons': self.reasons,
+                             'regions': list(self.regions) if self.regions is not None else None})
+        np.savez(path, header=np.array(header), **cols)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            batch = cls(header['n'], capacity=max(1, len(data['label_codes'])))
+            batch.labels, batch.reasons = header['labels'], header['reasons']
+            if header['regions'] is not None:
+                batch.regions = _region_names(header['regions'])
+            for name in ('label_codes', 'reason_codes', 'has_vectors', 'bits', 'difs', 'counts', 'sizes'):
+                if name in data:
+                    col = data[name]
+                    if name in ('bits', 'difs', 'counts', 'sizes'):
+                        setattr(batch, name, np.zeros((batch._capacity,) + col.shape[1:], dtype=col.dtype))
+                    getattr(batch, name)[:len(col)] = col
+            batch.size = len(data['label_codes'])
+        return batch
+
+    def write_jsonl(self, path):
+        """Exporta um resultado por linha no formato dict (para ferramentas que esperam JSON)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for r in self:
+                f.write(r.to_json() + '\n')
+
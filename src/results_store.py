@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import numpy as np
+from .utils import ensure_dir
+
+DEFAULT_DB = os.path.join('test_images', 'results.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    source TEXT,
+    subject TEXT,
+    expected TEXT,
+    neutral_path TEXT,
+    target_path TEXT,
+    threshold REAL,
+    params TEXT,
+    label TEXT,
+    reason TEXT,
+    counts TEXT,
+    n_landmarks INTEGER,
+    n_changed INTEGER,
+    binary BLOB,
+    difs BLOB,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_subject ON analyses(subject, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_label ON analyses(label, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses(created_at);
+'''
+
+COLUMNS = ('created_at', 'source', 'subject', 'expected', 'neutral_path', 'target_path', 'threshold', 'params',
+           'label', 'reason', 'counts', 'n_landmarks', 'n_changed', 'binary', 'difs', 'timings')
+
+
+def pack_binary(binary):
+    """Vetor 0/1 (N,) -> BLOB com 1 bit por landmark."""
+    return np.packbits(np.asarray(binary, dtype=bool)).tobytes()
+
+
+def unpack_binary(blob, n):
+    return np.unpackbits(np.frombuffer(blob, dtype=np.uint8), count=n).astype(int)
+
+
+def pack_difs(difs):
+    return np.asarray(difs, dtype=np.float32).tobytes()
+
+
+def unpack_difs(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def _json_or_none(obj):
+    return None if obj is None else json.dumps(obj, ensure_ascii=False, sort_keys=True)
+
+
+class ResultsStore:
+    """Histórico de análises num SQLite local (WAL), com inserts em lote e índices por sujeito, rótulo e data.
+
+    Cada linha guarda origem, sujeito, rótulo esperado (ex.: 'happy' no par neutro→happy), caminhos das imagens,
+    parâmetros, rótulo obtido, contagens por região, o vetor binário com 1 bit por landmark e os difs em
+    float32 (BLOBs), além dos tempos por estágio. `add` acumula linhas e grava a cada `batch_size`;
+    `flush`/`close` (ou o `with`) gravam o restante. Thread-safe: uma conexão protegida por lock.
+    """
+    def __init__(self, path=DEFAULT_DB, batch_size=64):
+        self.path = path
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            ensure_dir(os.path.dirname(path))
+        self._lock = threading.Lock()
+        self._pending = []
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def add(self, result, source=None, subject=None, expected=None, neutral_path=None, target_path=None,
+            threshold=None, params=None, created_at=None):
+        """Enfileira um resultado do pipeline (dict com 'label', 'binary', 'difs', 'counts', 'timings'...)."""
+        binary = result.get('binary')
+        difs = result.get('difs')
+        row = (
+            time.time() if created_at is None else float(created_at), source, subject, expected, neutral_path,
+            target_path, threshold, _json_or_none(params), result.get('label'), result.get('reason'),
+            _json_or_none(result.get('counts')),
+            None if binary is None else len(binary),
+            None if binary is None else int(np.count_nonzero(binary)),
+            None if binary is None else pack_binary(binary),
+            None if difs is None else pack_difs(difs),
+            _json_or_none(result.get('timings')),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(f'INSERT INTO analyses ({", ".join(COLUMNS)}) VALUES '
+                                  f'({", ".join("?" * len(COLUMNS))})', self._pending)
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def query(self, subject=None, label=None, expected=None, source=None, since=None, until=None, limit=None,
+              with_vectors=False):
+        """Linhas filtradas (mais recentes primeiro). since/until: timestamps unix (time.time())."""
+        self.flush()
+        where, args = [], []
+        for col, value in (('subject', subject), ('label', label), ('expected', expected), ('source', source)):
+            if value is not None:
+                where.append(f'{col} = ?')
+                args.append(value)
+        if since is not None:
+            where.append('created_at >= ?')
+            args.append(float(since))
+        if until is not None:
+            where.append('created_at < ?')
+            args.append(float(until))
+        cols = ['id'] + [c for c in COLUMNS if with_vectors or c not in ('binary', 'difs')]
+        sql = f'SELECT {", ".join(cols)} FROM analyses'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created_at DESC'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with self._lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        out = []
+        for row in rows:
+            rec = dict(zip(cols, row))
+            for key in ('params', 'counts', 'timings'):
+                if rec[key] is not None:
+                    rec[key] = json.loads(rec[key])
+            if with_vectors:
+                if rec['binary'] is not None:
+                    rec['binary'] = unpack_binary(rec['binary'], rec['n_landmarks'])
+                if rec['difs'] is not None:
+                    rec['difs'] = unpack_difs(rec['difs'])
+            out.append(rec)
+        return out
+
+    def count(self):
+        self.flush()
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def open_store(store):
+    """Aceita um ResultsStore, um caminho de banco ou None; retorna (store, criado_aqui)."""
+    if store is None or isinstance(store, ResultsStore):
+        return store, False
+    return ResultsStore(store), True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consulta o histórico de análises (SQLite)')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    parser.add_argument('--subject', default=None)
+    parser.add_argument('--label', default=None, help='rótulo obtido (ex.: reject)')
+    parser.add_argument('--expected', default=None, help='expressão esperada do par (ex.: happy)')
+    parser.add_argument('--source', default=None, help='generate_digraphs, pipeline ou app')
+    parser.add_argument('--days', type=float, default=None, help='só os últimos N dias')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days is not None else None
+    with ResultsStore(args.db) as store:
+        rows = store.query(subject=args.subject, label=args.label, expected=args.expected, source=args.source,
+                           since=since, limit=args.limit)
+    for r in rows:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(r['created_at']))
+        print(f"{r['id']:6d} {when} {r['source'] or '-':18s} {r['subject'] or '-':12s} "
+              f"{r['expected'] or '-':8s} -> {r['label'] or '-':8s} changed={r['n_changed']} {r['target_path'] or ''}")
+    print(f'{len(rows)} linha(s)')
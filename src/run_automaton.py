@@ -1,6 +1,10 @@
 import os
+import sys
+import csv
+import glob
 import json
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from .utils import load_json
 
 
@@ -12,32 +16,170 @@ def decide_from_vector(vec, automaton_map):
     - Se encontrar qualquer valor fora de {0,1} -> rejeição
     Também retornamos a decisão lendo apenas o primeiro símbolo (simulação MT simples).
     """
-    arr = np.array(vec)
-    # verificar valores inválidos
-    unique_vals = np.unique(arr)
-    if any((v not in (0,1) for v in unique_vals)):
-        return {'decision':'reject','reason':'invalid_symbols','by_first':None,'by_majority':None}
+    arr = np.asarray(vec).reshape(1, -1)
+    # automaton_map é mantido na assinatura para compatibilidade; a decisão final é a maioria
+    return decide_batch(arr)[0]
 
+
+def stack_vectors(vectors):
+    """Empilha vetores (possivelmente de tamanhos diferentes) numa matriz (M, N_max).
+
+    Posições além do tamanho de cada vetor são preenchidas com 0 e ignoradas via `lengths`.
+    Retorna (matriz, lengths).
+    """
+    lengths = np.array([len(v) for v in vectors], dtype=np.int64)
+    if not vectors:
+        return np.zeros((0, 0)), lengths
+    n_max = int(lengths.max())
+    if np.all(lengths == n_max):
+        return np.stack([np.asarray(v) for v in vectors]), lengths
+    mat = np.zeros((len(vectors), n_max), dtype=float)
+    for i, v in enumerate(vectors):
+        mat[i, :lengths[i]] = v
+    return mat, lengths
+
+
+def decide_batch(matrix, lengths=None, counts=False):
+    """Versão vetorizada de `decide_from_vector` para uma matriz (M, N) de vetores binários.
+
+    `lengths` (opcional) indica o tamanho válido de cada linha quando os vetores
+    foram empilhados com preenchimento (ver `stack_vectors`).
+    Retorna lista de dicts no mesmo formato de `decide_from_vector`; com counts=True (modo batch)
+    as linhas válidas trazem também 'ones' e 'zeros'.
+    """
+    mat = np.asarray(matrix)
+    if mat.ndim == 1:
+        mat = mat.reshape(1, -1)
+    m, n = mat.shape
+    if lengths is None:
+        lengths = np.full(m, n, dtype=np.int64)
+    valid = np.arange(n)[None, :] < np.asarray(lengths)[:, None]
+
+    is_one = (mat == 1) & valid
+    is_zero = (mat == 0) & valid
+    invalid = (valid & ~(is_one | is_zero)).any(axis=1)
+
+    ones = is_one.sum(axis=1)
+    zeros = is_zero.sum(axis=1)
     # by first symbol (simulação de fita lendo primeiro bit)
-    first = int(arr[0]) if arr.size>0 else None
-    by_first = 'happy' if first==1 else ('sad' if first==0 else 'reject')
-
-    # by majority
-    ones = int((arr==1).sum())
-    zeros = int((arr==0).sum())
-    if ones > zeros:
-        by_majority = 'happy'
-    elif zeros > ones:
-        by_majority = 'sad'
+    first = mat[:, 0] if n > 0 else np.full(m, -1)
+    has_first = np.asarray(lengths) > 0
+    by_first = np.where(has_first & (first == 1), 'happy', np.where(has_first & (first == 0), 'sad', 'reject'))
+    # by majority; empate -> rejeição/indeterminado
+    by_majority = np.where(ones > zeros, 'happy', np.where(zeros > ones, 'sad', 'reject'))
+
+    out = []
+    for i in range(m):
+        if invalid[i]:
+            out.append({'decision': 'reject', 'reason': 'invalid_symbols', 'by_first': None, 'by_majority': None})
+        else:
+            row = {'decision': str(by_majority[i]), 'by_first': str(by_first[i]), 'by_majority': str(by_majority[i])}
+            if counts:
+                row.update(ones=int(ones[i]), zeros=int(zeros[i]))
+            out.append(row)
+    return out
+
+
+def load_vectors_file(path):
+    """Carrega vetores binários de um arquivo.
+
+    Formatos aceitos:
+    - `*_meta.json` (chave 'binary')
+    - `.npy` com shape (N,) ou (M, N)
+    - `.npz` com chave 'binary' (shape (N,) ou (M, N))
+    Retorna lista de (id, vetor).
+    """
+    if path.endswith('.json'):
+        return [(path, np.asarray(load_json(path)['binary']))]
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            arr = np.asarray(data['binary'])
+    elif path.endswith('.npy'):
+        arr = np.load(path)
     else:
-        # empate -> rejeição/indeterminado
-        by_majority = 'reject'
+        raise ValueError('Formato não suportado: ' + path)
+    if arr.ndim == 1:
+        return [(path, arr)]
+    return [(f'{path}#{i}', arr[i]) for i in range(arr.shape[0])]
 
-    # consultar automaton_map (if present) for mapping
-    # automaton_map is expected like {'neutral->happy':1,'neutral->sad':0}
-    # here we only return final result as by_majority, but include both.
-    final = by_majority
-    return {'decision': final, 'by_first': by_first, 'by_majority': by_majority}
+
+def expand_inputs(patterns=None, manifest=None):
+    """Expande globs e/ou um manifesto (um caminho por linha) numa lista ordenada de arquivos."""
+    paths = []
+    for pat in patterns or []:
+        if os.path.isdir(pat):
+            pat = os.path.join(pat, '*_meta.json')
+        matches = sorted(glob.glob(pat, recursive=True))
+        paths.extend(matches if matches else ([pat] if os.path.exists(pat) else []))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return paths
+
+
+def iter_batch_decisions(paths, workers=8, chunk_size=1024):
+    """Carrega os arquivos com um pool de threads e decide em lotes vetorizados.
+
+    Gera dicts {'id', 'decision', 'by_first', 'by_majority', ...} na ordem dos caminhos.
+    Arquivos que falham ao carregar geram uma linha com 'error'.
+    """
+    def _load(p):
+        try:
+            return load_vectors_file(p)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for start in range(0, len(paths), chunk_size):
+            chunk = paths[start:start + chunk_size]
+            loaded = list(pool.map(_load, chunk))
+            vectors = [vec for item in loaded if not isinstance(item, Exception) for _, vec in item]
+            decisions = iter(decide_batch(*stack_vectors(vectors), counts=True) if vectors else ())
+            # linhas de erro intercaladas na posição do arquivo, preservando a ordem dos caminhos
+            for p, item in zip(chunk, loaded):
+                if isinstance(item, Exception):
+                    yield {'id': p, 'decision': 'reject', 'reason': 'load_error', 'error': str(item)}
+                    continue
+                for vid, _ in item:
+                    row = {'id': vid}
+                    row.update(next(decisions))
+                    yield row
+
+
+BATCH_FIELDS = ['id', 'decision', 'by_first', 'by_majority', 'ones', 'zeros', 'reason', 'error']
+
+
+def write_batch_results(rows, out=None, fmt='jsonl'):
+    """Escreve as decisões em streaming (JSONL ou CSV) num arquivo ou stdout. Retorna o nº de linhas."""
+    f = open(out, 'w', encoding='utf-8', newline='') if out else sys.stdout
+    n = 0
+    try:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=BATCH_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                n += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                n += 1
+    finally:
+        if out:
+            f.close()
+    return n
+
+
+def main_batch(patterns=None, manifest=None, out=None, fmt='jsonl', workers=8, chunk_size=1024):
+    paths = expand_inputs(patterns, manifest)
+    if not paths:
+        raise FileNotFoundError('Nenhum arquivo de meta encontrado para os padrões informados')
+    return write_batch_results(iter_batch_decisions(paths, workers=workers, chunk_size=chunk_size), out=out, fmt=fmt)
 
 
 def main(digraphs_dir):
@@ -72,6 +214,19 @@ def main(digraphs_dir):
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('--dir', required=True, help='diretório com os digraphs')
+    parser.add_argument('--dir', help='diretório com os digraphs')
+    parser.add_argument('--batch', nargs='+', default=None,
+                        help='globs/diretórios com *_meta.json, .npy ou .npz (modo lote)')
+    parser.add_argument('--manifest', default=None, help='arquivo texto com um caminho por linha (modo lote)')
+    parser.add_argument('--out', default=None, help='arquivo de saída do modo lote (padrão: stdout)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--workers', type=int, default=8, help='threads de leitura no modo lote')
+    parser.add_argument('--chunk-size', type=int, default=1024, help='vetores por passo vetorizado')
     args = parser.parse_args()
-    main(args.dir)
+    if args.batch or args.manifest:
+        main_batch(args.batch, args.manifest, out=args.out, fmt=args.format,
+                   workers=args.workers, chunk_size=args.chunk_size)
+    elif args.dir:
+        main(args.dir)
+    else:
+        parser.error('informe --dir ou --batch/--manifest')
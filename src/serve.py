@@ -0,0 +1,457 @@
+import os
+import json
+import time
+import queue
+import base64
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .pipeline import FacialStatePipeline, result_to_json
+from .image_loader import decode
+from .baseline import MultiBaseline
+from . import metrics
+
+
+def decode_image(data):
+    """Decodifica bytes (JPEG/PNG...) para BGR."""
+    img = decode(data)
+    if img is None:
+        raise ValueError('imagem inválida ou formato não suportado')
+    return img
+
+
+class MicroBatcher:
+    """Fila de requisições agrupadas em micro-lotes e processadas por workers com extractor quente.
+
+    - Um coletor junta as requisições já na fila (até `max_batch`); só espera até `max_latency_ms` por mais
+      quando todos os workers estão ocupados, então com workers livres nenhuma requisição fica parada.
+    - As imagens do lote são distribuídas entre todos os workers (decode + extração em paralelo); cada worker
+      tem seu próprio FacialStatePipeline (o FaceMesh não é thread-safe), criado uma vez.
+    - Imagens repetidas (ex.: a mesma neutra para vários alvos) são extraídas uma só vez: os landmarks das
+      últimas `recent_images` imagens distintas (por hash, inclusive extrações ainda em andamento) são
+      reaproveitados entre lotes.
+    - Cada requisição é analisada (analyze_landmarks, sem FaceMesh) assim que os landmarks dela ficam prontos,
+      na thread que terminou a última extração, com o pipeline do primeiro worker.
+    - Sujeitos cadastrados (`enroll`) guardam os landmarks neutros; análises por sujeito só extraem o alvo.
+      Com `append`, cada captura neutra extra entra num `MultiBaseline` (mediana e dispersão por landmark).
+      Uma análise por sujeito espera os cadastros do mesmo sujeito que vieram antes dela no lote.
+    - O grafo de diferença (networkx) só é construído se a requisição pedir `include_graph`.
+    submit() retorna um Future com (resultado, timings).
+    """
+    def __init__(self, pipeline_factory=FacialStatePipeline, workers=2, max_batch=8, max_latency_ms=5.0, max_queue=1024,
+                 recent_images=64):
+        if int(workers) < 1:
+            raise ValueError(f'workers deve ser >= 1 (recebido {workers})')
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self.workers = workers = int(workers)
+        self._queue = queue.Queue(maxsize=max_queue)
+        # extrações pendentes (uma por imagem distinta do lote), consumidas por qualquer worker
+        self._tasks = queue.Queue(maxsize=workers * self.max_batch * 2)
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._analyzer = None
+        self.recent_images = max(0, int(recent_images))
+        self._recent = OrderedDict()  # hash da imagem -> Future dos landmarks
+        self._recent_lock = threading.Lock()
+        self._subjects = {}
+        self._subjects_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Barrier(workers + 1)
+        self._init_errors = []
+        self._threads = [threading.Thread(target=self._collect, name='batcher-collect', daemon=True)]
+        for i in range(workers):
+            self._threads.append(threading.Thread(target=self._work, args=(pipeline_factory,),
+                                                  name=f'batcher-worker-{i}', daemon=True))
+        for t in self._threads:
+            t.start()
+        # esperar os workers aquecerem (criação do FaceMesh) antes de aceitar requisições
+        self._ready.wait()
+        if self._init_errors:
+            self.close()
+            raise RuntimeError('Falha ao inicializar workers: ' + str(self._init_errors[0]))
+
+    def submit(self, request, timeout=None):
+        if self._stop.is_set():
+            raise RuntimeError('MicroBatcher encerrado')
+        fut = Future()
+        self._queue.put((request, fut, time.perf_counter()), timeout=timeout)
+        if self._stop.is_set():
+            # close() pode ter drenado a fila entre a checagem e o put
+            self._fail_pending()
+        return fut
+
+    def subjects(self):
+        with self._subjects_lock:
+            return sorted(self._subjects)
+
+    def close(self, timeout=5.0):
+        """Para o coletor e os workers (extrações em andamento terminam) e falha as requisições pendentes."""
+        self._stop.set()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout)
+        self._fail_pending()
+
+    @staticmethod
+    def _closed_error():
+        return RuntimeError('MicroBatcher encerrado antes de processar a requisição')
+
+    def _fail(self, items):
+        for _, fut, _ in items:
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(self._closed_error())
+
+    def _fail_pending(self):
+        while True:
+            try:
+                self._fail([self._queue.get_nowait()])
+            except queue.Empty:
+                break
+        # falhar a extração falha (pelos callbacks) as requisições que dependem dela
+        while True:
+            try:
+                _, lm_fut, _ = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if not lm_fut.done():
+                lm_fut.set_exception(self._closed_error())
+
+    def _all_busy(self):
+        with self._busy_lock:
+            return self._busy + self._tasks.qsize() >= self.workers
+
+    def _collect(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_latency
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                # com worker livre, despacha já; só vale esperar por mais requisições se todos estão ocupados
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._all_busy():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _put_task(self, task):
+        # com a fila de extrações cheia, não bloquear para sempre se close() for chamado
+        while True:
+            try:
+                self._tasks.put(task, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    task[1].set_exception(self._closed_error())
+                    return
+
+    def _dispatch(self, batch):
+        """Manda as imagens distintas do lote para os workers e agenda a análise de cada requisição."""
+        t_batch = time.perf_counter()
+        images = {}
+        enrolls = {}
+
+        def landmarks(data, timer):
+            key = hashlib.blake2b(data, digest_size=16).digest()
+            if key not in images:
+                lm_fut = self._recent_landmarks(key)
+                if lm_fut is None:
+                    lm_fut = Future()
+                    self._remember(key, lm_fut)
+                    self._put_task((data, lm_fut, timer))
+                images[key] = lm_fut
+            return images[key]
+
+        for request, fut, t_enqueued in batch:
+            if not fut.set_running_or_notify_cancel():
+                continue
+            timer = metrics.timer()
+            if timer.timings is not None:
+                metrics.REGISTRY.observe('queue', t_batch - t_enqueued, 0.0)
+            if request.get('op') == 'enroll':
+                deps = [landmarks(request['neutral'], timer)]
+                enrolls.setdefault(request['subject'], []).append(fut)
+            elif request.get('subject') is not None:
+                deps = enrolls.get(request['subject'], []) + [landmarks(request['target'], timer)]
+            else:
+                deps = [landmarks(request['neutral'], timer), landmarks(request['target'], timer)]
+            job = (request, fut, timer, deps, (t_enqueued, t_batch, len(batch)))
+            self._when_done(deps, lambda job=job: self._finish(*job))
+
+    def _recent_landmarks(self, key):
+        with self._recent_lock:
+            lm_fut = self._recent.get(key)
+            if lm_fut is not None:
+                self._recent.move_to_end(key)
+            return lm_fut
+
+    def _remember(self, key, lm_fut):
+        if not self.recent_images:
+            return
+        with self._recent_lock:
+            self._recent[key] = lm_fut
+            while len(self._recent) > self.recent_images:
+                self._recent.popitem(last=False)
+
+        def forget_failure(f):
+            # falhas (imagem inválida, encerramento) não ficam no cache
+            if f.exception() is not None:
+                with self._recent_lock:
+                    if self._recent.get(key) is f:
+                        del self._recent[key]
+
+        lm_fut.add_done_callback(forget_failure)
+
+    @staticmethod
+    def _when_done(futures, fn):
+        """Chama fn() uma vez, quando todos os futures terminarem (na thread que concluir o último)."""
+        if not futures:
+            fn()
+            return
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                fn()
+
+        for f in list(futures):
+            f.add_done_callback(done)
+
+    def _work(self, pipeline_factory):
+        pipeline = None
+        try:
+            pipeline = pipeline_factory()
+            with self._busy_lock:
+                if self._analyzer is None:
+                    self._analyzer = pipeline
+        except Exception as e:
+            self._init_errors.append(e)
+        finally:
+            self._ready.wait()
+        if pipeline is None:
+            return
+        while not self._stop.is_set():
+            try:
+                data, lm_fut, timer = self._tasks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                with timer.stage('decode'):
+                    img = decode_image(data)
+                with timer.stage('extract'):
+                    lm = pipeline.extractor.from_bgr(img)
+            except Exception as e:
+                lm_fut.set_exception(e)
+            else:
+                lm_fut.set_result(lm)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+
+    def _finish(self, request, fut, timer, deps, times):
+        t_enqueued, t_batch, batch_size = times
+        try:
+            if request.get('op') == 'enroll':
+                lm = deps[0].result()
+                if lm is None:
+                    raise ValueError('nenhuma face detectada na imagem neutra')
+                with self._subjects_lock:
+                    prev = self._subjects.get(request['subject']) if request.get('append') else None
+                    if prev is None:
+                        baseline = lm
+                    elif isinstance(prev, MultiBaseline):
+                        baseline = MultiBaseline(np.concatenate([prev.references, lm[None, :, :2]]))
+                    else:
+                        baseline = MultiBaseline(np.stack([prev[:, :2], lm[:, :2]]))
+                    self._subjects[request['subject']] = baseline
+                res = {'subject': request['subject'], 'landmarks': int(len(lm)),
+                       'references': baseline.count if isinstance(baseline, MultiBaseline) else 1}
+            else:
+                if request.get('subject') is not None:
+                    with self._subjects_lock:
+                        n_lm = self._subjects.get(request['subject'])
+                    if n_lm is None:
+                        raise KeyError('sujeito não cadastrado: ' + str(request['subject']))
+                else:
+                    n_lm = deps[0].result()
+                res = self._analyzer.analyze_landmarks(n_lm, deps[-1].result(),
+                                                       with_graph=bool(request.get('include_graph')), timer=timer)
+            now = time.perf_counter()
+            fut.set_result((res, {
+                'queue_ms': (t_batch - t_enqueued) * 1000.0,
+                # extrações (em paralelo nos workers) + análise desta requisição, desde o despacho do lote
+                'process_ms': (now - t_batch) * 1000.0,
+                'batch_ms': (now - t_batch) * 1000.0,
+                'batch_size': batch_size,
+            }))
+        except Exception as e:
+            fut.set_exception(e)
+
+
+def _read_image_field(body, name, image_root=None):
+    """Campo de imagem: '<name>' em base64 ou '<name>_path' (arquivo local).
+
+    '<name>_path' só é aceito com image_root configurado (opt-in) e precisa apontar para dentro dele;
+    sem isso qualquer cliente HTTP leria arquivos arbitrários do servidor.
+    """
+    if body.get(name) is not None:
+        return base64.b64decode(body[name])
+    if body.get(name + '_path') is not None:
+        if image_root is None:
+            raise ValueError(f"'{name}_path' desabilitado (inicie o servidor com --image-root)")
+        root = os.path.realpath(image_root)
+        path = os.path.realpath(os.path.join(root, body[name + '_path']))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"'{name}_path' fora de --image-root")
+        with open(path, 'rb') as f:
+            return f.read()
+    return None
+
+
+def make_handler(batcher, timeout=30.0, verbose=False, image_root=None):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = 'FacialStateServe/1.0'
+
+        def _send_json(self, status, obj, headers=None):
+            data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            if verbose:
+                super().log_message(fmt, *args)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok', 'workers': batcher.workers, 'subjects': len(batcher.subjects())})
+            elif self.path == '/metrics':
+                data = metrics.REGISTRY.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(404, {'error': 'not_found'})
+
+        def do_POST(self):
+            t0 = time.perf_counter()
+            if self.path not in ('/analyze', '/enroll'):
+                self._send_json(404, {'error': 'not_found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path == '/enroll':
+                    request = {'op': 'enroll', 'subject': body['subject'], 'neutral': _read_image_field(body, 'neutral', image_root),
+                               'append': bool(body.get('append', False))}
+                    if request['neutral'] is None:
+                        raise ValueError("informe 'neutral' (base64) ou 'neutral_path'")
+                else:
+                    request = {'op': 'analyze', 'subject': body.get('subject'),
+                               'include_graph': bool(body.get('include_graph', False)),
+                               'neutral': _read_image_field(body, 'neutral', image_root),
+                               'target': _read_image_field(body, 'target', image_root)}
+                    if request['target'] is None or (request['subject'] is None and request['neutral'] is None):
+                        raise ValueError("informe 'target' e 'neutral' (ou 'subject' cadastrado)")
+            except (ValueError, KeyError, OSError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+
+            try:
+                res, timings = batcher.submit(request).result(timeout=timeout)
+            except KeyError as e:
+                self._send_json(404, {'error': str(e)})
+                return
+            except ValueError as e:
+                # imagem corrompida/não decodificável ou sem face no cadastro: erro do cliente
+                self._send_json(400, {'error': str(e)})
+                return
+            except FutureTimeoutError:
+                self._send_json(504, {'error': f'sem resposta em {timeout:g}s'})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+            headers = {
+                'X-Queue-Time-Ms': f"{timings['queue_ms']:.3f}",
+                'X-Process-Time-Ms': f"{timings['process_ms']:.3f}",
+                'X-Batch-Size': str(timings['batch_size']),
+                'X-Total-Time-Ms': f"{(time.perf_counter() - t0) * 1000.0:.3f}",
+            }
+            self._send_json(200, result_to_json(res), headers=headers)
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=8765, batcher=None, timeout=30.0, verbose=False, image_root=None):
+    """image_root: diretório de onde os campos '*_path' podem ler arquivos (None = campos desabilitados)."""
+    batcher = batcher or MicroBatcher()
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, timeout=timeout, verbose=verbose,
+                                                            image_root=image_root))
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+def main(host='127.0.0.1', port=8765, workers=2, max_batch=8, max_latency_ms=5.0, threshold=2.0, verbose=False,
+         with_metrics=False, image_root=None):
+    if with_metrics:
+        metrics.enable()
+    batcher = MicroBatcher(lambda: FacialStatePipeline(threshold=threshold), workers=workers,
+                           max_batch=max_batch, max_latency_ms=max_latency_ms)
+    server = make_server(host, port, batcher, verbose=verbose, image_root=image_root)
+    print(f'Servindo em http://{host}:{server.server_address[1]} (workers={workers}, max_batch={max_batch}, '
+          f'max_latency_ms={max_latency_ms})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serviço HTTP local de inferência (FacialStatePipeline) com micro-lotes')
+    parser.add_argument('--host', default='127.0.0.1', help='interface (padrão: só localhost)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='workers com extractor quente')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0, help='espera máxima para completar um lote')
+    parser.add_argument('--threshold', type=float, default=2.0, help='threshold em pixels (>1) ou fração (<=1)')
+    parser.add_argument('--image-root', default=None,
+                        help="habilita 'neutral_path'/'target_path', restritos a arquivos dentro deste diretório")
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--metrics', action='store_true',
+                        help="tempos por estágio nas respostas ('timings') e histogramas em GET /metrics")
+    args = parser.parse_args()
+    main(args.host, args.port, workers=args.workers, max_batch=args.max_batch,
+         max_latency_ms=args.max_latency_ms, threshold=args.threshold, verbose=args.verbose,
+         with_metrics=args.metrics, image_root=args.image_root)
@@ -0,0 +1,297 @@
+import os
+import argparse
+import numpy as np
+from .utils import save_json_atomic, load_json, ensure_dir
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(x):
+    """Soma de bits por linha de uma matriz uint8 (S,B)."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[x].sum(axis=1, dtype=np.int32)
+
+
+def label_from_meta_path(path):
+    """'diff_neutral_happy_meta.json' -> 'happy' (último termo antes de _meta)."""
+    stem = os.path.basename(path)
+    if stem.endswith('_meta.json'):
+        stem = stem[:-len('_meta.json')]
+    return stem.split('_')[-1]
+
+
+class SimilarityIndex:
+    """Índice de vetores `difs` (ex.: 468 deslocamentos) persistido em disco e lido via memmap.
+
+    Arquivos em `path`: vectors.npy (float32, capacidade cresce em blocos), norms.npy, codes.npy (assinaturas
+    de projeções aleatórias, n_bits), labels.npy (códigos int32), ids.txt e meta.json. O `count` em meta.json
+    é o ponto de commit: um insert interrompido não corrompe o índice, as linhas extras são sobrescritas.
+
+    - search(): exato, distância L2 com produtos de matriz por blocos e top-k por argpartition
+    - search(approx=True): filtra candidatos pela distância de Hamming das assinaturas (hiperplanos aleatórios
+      sobre os vetores centrados) e reordena os candidatos pela distância exata
+    """
+    GROW = 65536
+
+    def __init__(self, path, dim=None, n_bits=64, seed=0):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            self.meta = load_json(meta_path)
+        else:
+            if dim is None:
+                raise ValueError('índice novo: informe dim')
+            if int(n_bits) <= 0 or int(n_bits) % 8:
+                # as assinaturas são empacotadas em bytes (codes tem n_bits // 8 colunas)
+                raise ValueError(f'n_bits deve ser um múltiplo positivo de 8 (recebido {n_bits})')
+            ensure_dir(path)
+            self.meta = {'dim': int(dim), 'count': 0, 'capacity': 0, 'n_bits': int(n_bits), 'seed': int(seed),
+                         'labels': [], 'center': None}
+        self.dim = self.meta['dim']
+        self.n_bits = self.meta['n_bits']
+        rng = np.random.default_rng(self.meta['seed'])
+        self.planes = rng.standard_normal((self.n_bits, self.dim)).astype(np.float32)
+        self._label_codes = {name: i for i, name in enumerate(self.meta['labels'])}
+        self._ids = None
+        self._ids_stale = False
+        self._open()
+
+    # ------------------- armazenamento -------------------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        cap = self.meta['capacity']
+        if cap == 0:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self.norms = np.zeros(0, dtype=np.float32)
+            self.codes = np.zeros((0, self.n_bits // 8), dtype=np.uint8)
+            self.labels = np.zeros(0, dtype=np.int32)
+            return
+        self.vectors = np.load(self._file('vectors.npy'), mmap_mode='r+')
+        self.norms = np.load(self._file('norms.npy'), mmap_mode='r+')
+        self.codes = np.load(self._file('codes.npy'), mmap_mode='r+')
+        self.labels = np.load(self._file('labels.npy'), mmap_mode='r+')
+
+    def _grow(self, needed):
+        cap = self.meta['capacity']
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2, self.GROW)
+        count = self.meta['count']
+        arrays = {'vectors': ((new_cap, self.dim), np.float32), 'norms': ((new_cap,), np.float32),
+                  'codes': ((new_cap, self.n_bits // 8), np.uint8), 'labels': ((new_cap,), np.int32)}
+        for name, (shape, dtype) in arrays.items():
+            tmp = self._file(name + '.npy.tmp')
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+            out[:count] = getattr(self, name)[:count]
+            out.flush()
+            del out
+        for name in arrays:
+            setattr(self, name, None)
+            os.replace(self._file(name + '.npy.tmp'), self._file(name + '.npy'))
+        self.meta['capacity'] = new_cap
+        self._save_meta()
+        self._open()
+
+    def _save_meta(self):
+        save_json_atomic(self._file('meta.json'), self.meta)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def signatures(self, vectors):
+        """Assinaturas de n_bits (uint8 empacotado) dos vetores: sinal das projeções nos hiperplanos."""
+        center = np.asarray(self.meta['center'], dtype=np.float32)
+        bits = (np.asarray(vectors, dtype=np.float32) - center) @ self.planes.T > 0
+        return np.packbits(bits, axis=1)
+
+    def add(self, vectors, labels=None, ids=None):
+        """Insere vetores (n,dim) com rótulos (strings) e ids opcionais. Retorna os índices atribuídos."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        n = len(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f'dimensão {vectors.shape[1]} != {self.dim}')
+        if self.meta['center'] is None:
+            # centro das projeções: média do primeiro lote (hiperplanos passando pelo meio dos dados)
+            self.meta['center'] = vectors.mean(axis=0).tolist()
+        start = self.meta['count']
+        self._grow(start + n)
+        codes = []
+        for name in (labels if labels is not None else [None] * n):
+            if name is None:
+                codes.append(-1)
+                continue
+            if name not in self._label_codes:
+                self._label_codes[name] = len(self.meta['labels'])
+                self.meta['labels'].append(name)
+            codes.append(self._label_codes[name])
+        end = start + n
+        self.vectors[start:end] = vectors
+        self.norms[start:end] = np.einsum('ij,ij->i', vectors, vectors)
+        self.codes[start:end] = self.signatures(vectors)
+        self.labels[start:end] = codes
+        for arr in (self.vectors, self.norms, self.codes, self.labels):
+            arr.flush()
+        ids = [str(i).replace('\n', ' ') for i in (range(start, end) if ids is None else ids)]
+        existing = self.ids()
+        if self._ids_stale:
+            # ids.txt com linhas extras de um insert interrompido: regrava só as `count` válidas
+            with open(self._file('ids.txt'), 'w', encoding='utf-8') as f:
+                f.write(''.join(i + '\n' for i in existing))
+            self._ids_stale = False
+        with open(self._file('ids.txt'), 'a', encoding='utf-8') as f:
+            f.write(''.join(i + '\n' for i in ids))
+        existing.extend(ids)
+        self.meta['count'] = end
+        self._save_meta()
+        return np.arange(start, end)
+
+    def ids(self):
+        if self._ids is None:
+            path = self._file('ids.txt')
+            lines = []
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines = [line.rstrip('\n') for line in f]
+            self._ids = lines[:len(self)]
+            self._ids_stale = len(lines) != len(self)
+        return self._ids
+
+    # ------------------- busca -------------------
+    @staticmethod
+    def _merge_topk(best_d, best_i, d, offset, k):
+        """Mantém os k menores entre o top atual (M,k) e um bloco novo de distâncias (M,B)."""
+        kk = min(k, d.shape[1])
+        part = np.argpartition(d, kk - 1, axis=1)[:, :kk] if kk < d.shape[1] else np.tile(np.arange(d.shape[1]), (len(d), 1))
+        cand_d = np.concatenate([best_d, np.take_along_axis(d, part, axis=1)], axis=1)
+        cand_i = np.concatenate([best_i, part + offset], axis=1)
+        order = np.argsort(cand_d, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(cand_d, order, axis=1), np.take_along_axis(cand_i, order, axis=1)
+
+    def _exact(self, queries, k, block):
+        n = len(self)
+        m = len(queries)
+        qn = np.einsum('ij,ij->i', queries, queries)[:, None]
+        best_d = np.full((m, 0), np.inf, dtype=np.float32)
+        best_i = np.zeros((m, 0), dtype=np.int64)
+        for start in range(0, n, block):
+            end = min(n, start + block)
+            # ||q - x||² = ||q||² - 2 q·x + ||x||²
+            d = qn - 2.0 * (queries @ self.vectors[start:end].T) + self.norms[start:end][None, :]
+            best_d, best_i = self._merge_topk(best_d, best_i, d, start, k)
+        # a forma expandida perde precisão em float32 para vizinhos muito próximos: recalcula só os k finais
+        diff = self.vectors[best_i.ravel()].reshape(m, -1, self.dim) - queries[:, None, :]
+        best_d = np.einsum('mkd,mkd->mk', diff, diff)
+        order = np.argsort(best_d, axis=1, kind='stable')
+        return np.take_along_axis(best_d, order, axis=1), np.take_along_axis(best_i, order, axis=1)
+
+    def _approx(self, queries, k, candidates, block):
+        n = len(self)
+        q_codes = self.signatures(queries)
+        out_d = np.empty((len(queries), min(k, n)), dtype=np.float32)
+        out_i = np.empty((len(queries), min(k, n)), dtype=np.int64)
+        n_cand = min(n, max(k, candidates))
+        for qi, (q, qc) in enumerate(zip(queries, q_codes)):
+            ham = np.empty(n, dtype=np.int32)
+            for start in range(0, n, block):
+                end = min(n, start + block)
+                ham[start:end] = _popcount_rows(np.bitwise_xor(self.codes[start:end], qc))
+            cand = np.argpartition(ham, n_cand - 1)[:n_cand] if n_cand < n else np.arange(n)
+            cand.sort()  # leitura sequencial no memmap
+            vecs = self.vectors[cand]
+            d = np.einsum('ij,ij->i', vecs - q, vecs - q)
+            order = np.argsort(d, kind='stable')[:out_d.shape[1]]
+            out_d[qi] = d[order]
+            out_i[qi] = cand[order]
+        return out_d, out_i
+
+    def search(self, queries, k=10, approx=False, candidates=2048, block=65536):
+        """Top-k vizinhos (L2) de cada consulta. Retorna (dists (M,k), índices (M,k)) em ordem crescente."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self) == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        k = min(int(k), len(self))
+        if approx:
+            d2, idx = self._approx(queries, k, candidates, block)
+        else:
+            d2, idx = self._exact(queries, k, block)
+        return np.sqrt(np.maximum(d2, 0.0)), idx
+
+    def label_names(self, idx):
+        names = self.meta['labels']
+        return [[names[c] if c >= 0 else None for c in self.labels[row]] for row in np.atleast_2d(idx)]
+
+    def query(self, vector, k=10, approx=False, **kwargs):
+        """Vizinhos de um vetor: lista de {'index', 'id', 'label', 'distance'}."""
+        dists, idx = self.search(vector, k=k, approx=approx, **kwargs)
+        ids = self.ids()
+        labels = self.label_names(idx)[0] if idx.size else []
+        return [{'index': int(i), 'id': ids[i] if i < len(ids) else str(i), 'label': lab, 'distance': float(d)}
+                for i, lab, d in zip(idx[0], labels, dists[0])]
+
+    def knn_label(self, vectors, k=10, approx=False, **kwargs):
+        """Rótulo por votação dos k vizinhos (peso 1/(dist+eps)) para cada vetor. Lista de (rótulo, confiança)."""
+        dists, idx = self.search(vectors, k=k, approx=approx, **kwargs)
+        codes = self.labels[idx] if idx.size else np.zeros_like(idx, dtype=np.int32)
+        out = []
+        for row_d, row_c in zip(dists, codes):
+            votes = {}
+            for d, c in zip(row_d, row_c):
+                if c >= 0:
+                    votes[c] = votes.get(c, 0.0) + 1.0 / (float(d) + 1e-6)
+            if not votes:
+                out.append((None, 0.0))
+                continue
+            best = max(votes, key=votes.get)
+            out.append((self.meta['labels'][best], votes[best] / sum(votes.values())))
+        return out
+
+    def duplicates(self, vector, radius=1e-3, k=10, approx=False):
+        """Entradas a distância <= radius (quase duplicatas) entre os k mais próximos."""
+        return [r for r in self.query(vector, k=k, approx=approx) if r['distance'] <= radius]
+
+
+def add_meta_files(index, paths, batch_size=4096):
+    """Insere os `difs` de arquivos *_meta.json (rótulo a partir do nome do arquivo)."""
+    total = 0
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        vecs = np.stack([np.asarray(load_json(p)['difs'], dtype=np.float32) for p in chunk])
+        index.add(vecs, labels=[label_from_meta_path(p) for p in chunk], ids=chunk)
+        total += len(chunk)
+    return total
+
+
+if __name__ == '__main__':
+    from .run_automaton import expand_inputs
+    parser = argparse.ArgumentParser(description='Índice de similaridade sobre vetores difs (*_meta.json)')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_add = sub.add_parser('add', help='insere *_meta.json no índice (cria se não existir)')
+    p_add.add_argument('--index', required=True)
+    p_add.add_argument('--inputs', nargs='+', default=None, help='arquivos, globs ou diretórios')
+    p_add.add_argument('--manifest', default=None)
+    p_add.add_argument('--bits', type=int, default=64, help='bits das assinaturas aproximadas (múltiplo de 8)')
+    p_q = sub.add_parser('query', help='vizinhos de um *_meta.json')
+    p_q.add_argument('--index', required=True)
+    p_q.add_argument('--meta', required=True)
+    p_q.add_argument('--k', type=int, default=10)
+    p_q.add_argument('--approx', action='store_true')
+    args = parser.parse_args()
+
+    if args.cmd == 'add':
+        paths = expand_inputs(args.inputs, args.manifest)
+        if not paths:
+            parser.error('nenhum arquivo encontrado')
+        if args.bits <= 0 or args.bits % 8:
+            parser.error('--bits deve ser um múltiplo positivo de 8')
+        dim = len(load_json(paths[0])['difs'])
+        index = SimilarityIndex(args.index, dim=dim, n_bits=args.bits)
+        n = add_meta_files(index, paths)
+        print(f'{n} vetores inseridos; índice com {len(index)}')
+    else:
+        index = SimilarityIndex(args.index)
+        vec = np.asarray(load_json(args.meta)['difs'], dtype=np.float32)
+        for r in index.query(vec, k=args.k, approx=args.approx):
+            print(f"{r['distance']:10.6f}  {r['label'] or '-':10s}  {r['id']}")
@@ -0,0 +1,132 @@
+import numpy as np
+import networkx as nx
+from .utils import bbox_from_landmarks, face_scale_from_bbox
+
+
+class StreamingDiffer:
+    """Diff incremental de um neutro fixo contra um stream de landmarks alvo.
+
+    Mesmo resultado de `digraph_from_difference` quadro a quadro (mesmo threshold, normalização e limite de
+    arestas), mas o grafo dos nós alterados é mantido entre quadros e só é remendado em volta dos nós que
+    mudaram: nós que ligaram/desligaram e nós alterados que se moveram mais que `move_eps` desde a última
+    vez que suas arestas foram calculadas. Os vizinhos vêm de uma grade espacial (células do tamanho do
+    limite), então o custo por quadro é proporcional aos nós tocados, não a K².
+
+    move_eps=0 reproduz exatamente o grafo completo; um valor pequeno (ex.: 0.002, na mesma unidade do diff)
+    ignora o tremor dos landmarks e deixa o custo proporcional à mudança real.
+    """
+    def __init__(self, neutral_landmarks, threshold=0.05, normalize=True, move_eps=0.0):
+        self._params = {'threshold': threshold, 'normalize': normalize, 'move_eps': move_eps}
+        self.neutral = np.asarray(neutral_landmarks, dtype=float)[:, :2]
+        if normalize:
+            self.scale = face_scale_from_bbox(bbox_from_landmarks(self.neutral))
+            self.thr = float(threshold) / (self.scale + 1e-9) if threshold > 1.0 else float(threshold)
+            self.limit = 0.15 * self.scale
+            self._div = self.scale + 1e-9
+        else:
+            self.scale = None
+            self.thr = float(threshold)
+            self.limit = 50.0
+            self._div = 1.0
+        self.move_eps = float(move_eps) * self._div
+        n = len(self.neutral)
+        self.changed = np.zeros(n, dtype=bool)
+        self.dif = np.zeros(n)
+        self.pos = np.zeros((n, 2))  # posição usada no último cálculo das arestas de cada nó alterado
+        self.adj = {}                # nó alterado -> {vizinho: peso}
+        self.cells = {}              # célula da grade -> conjunto de nós alterados
+        self._cell_of = {}
+        self.frames = 0
+
+    def _cell(self, p):
+        return (int(np.floor(p[0] / self.limit)), int(np.floor(p[1] / self.limit)))
+
+    def _grid_remove(self, i):
+        cell = self._cell_of.pop(i)
+        members = self.cells[cell]
+        members.discard(i)
+        if not members:
+            del self.cells[cell]
+
+    def _grid_add(self, i):
+        cell = self._cell(self.pos[i])
+        self._cell_of[i] = cell
+        self.cells.setdefault(cell, set()).add(i)
+
+    def _drop_edges(self, i):
+        removed = []
+        for j in self.adj.pop(i, {}):
+            nbrs = self.adj.get(j)
+            if nbrs is not None:
+                nbrs.pop(i, None)
+            removed.append((i, j))
+        return removed
+
+    def update(self, target_landmarks):
+        """Processa um quadro; retorna o delta {'on', 'off', 'touched', 'edges_added', 'edges_removed'}."""
+        target = np.asarray(target_landmarks, dtype=float)[:, :2]
+        dif = np.sqrt(((target - self.neutral) ** 2).sum(axis=1)) / self._div
+        changed = dif >= self.thr
+        on = np.flatnonzero(changed & ~self.changed)
+        off = np.flatnonzero(self.changed & ~changed)
+        stay = np.flatnonzero(changed & self.changed)
+        if len(stay):
+            step = target[stay] - self.pos[stay]
+            moved = stay[(step * step).sum(axis=1) > self.move_eps * self.move_eps]
+        else:
+            moved = stay
+        self.dif = dif
+        self.changed = changed
+        self.frames += 1
+
+        removed = []
+        for i in off.tolist():
+            removed.extend(self._drop_edges(i))
+            self._grid_remove(i)
+        touched = np.concatenate([on, moved]).tolist()
+        for i in touched:
+            removed.extend(self._drop_edges(i))
+            if i in self._cell_of:
+                self._grid_remove(i)
+        self.pos[touched] = target[touched]
+        for i in touched:
+            self._grid_add(i)
+
+        added = []
+        limit2 = self.limit * self.limit
+        for i in touched:
+            cx, cy = self._cell_of[i]
+            cand = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1) for j in self.cells.get((cx + dx, cy + dy), ())
+                    if j != i and j not in self.adj.get(i, ())]
+            if not cand:
+                continue
+            cand = np.asarray(cand)
+            d = self.pos[cand] - self.pos[i]
+            dist2 = (d * d).sum(axis=1)
+            close = dist2 < limit2
+            nbrs_i = self.adj.setdefault(i, {})
+            for j, w in zip(cand[close].tolist(), np.sqrt(dist2[close]).tolist()):
+                nbrs_i[j] = w
+                self.adj.setdefault(j, {})[i] = w
+                added.append((i, j))
+        return {'on': on.tolist(), 'off': off.tolist(), 'touched': len(touched),
+                'edges_added': added, 'edges_removed': removed}
+
+    @property
+    def binary(self):
+        return self.changed.astype(int)
+
+    def edges(self):
+        """Arestas atuais (i<j) com peso."""
+        return {(i, j): w for i, nbrs in self.adj.items() for j, w in nbrs.items() if i < j}
+
+    def graph(self):
+        """DiGraph no mesmo formato de `changed_node_graph` (arestas nos dois sentidos, atributo 'change')."""
+        G = nx.DiGraph()
+        G.add_nodes_from((int(i), {'change': float(self.dif[i])}) for i in np.flatnonzero(self.changed))
+        G.add_edges_from((i, j, {'weight': w}) for i, nbrs in self.adj.items() for j, w in nbrs.items())
+        return G
+
+    def reset(self, neutral_landmarks=None):
+        """Descarta o estado (próximo update recalcula tudo); opcionalmente troca o neutro."""
+        self.__init__(self.neutral if neutral_landmarks is None else neutral_landmarks, **self._params)
@@ -0,0 +1,217 @@
+import os
+import argparse
+import numpy as np
+from .utils import landmarks_from_graph_json, map_landmarks_to_regions, save_json_atomic, load_json, ensure_dir
+
+DEFAULT_BASE = os.path.join('test_images', 'digraphs', 'face_neutral.json')
+LABELS = ('neutral', 'happy', 'sad', 'surprise')
+
+# índices do FaceMesh (468 pontos) por região
+MP_LIPS = [61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 185, 40, 39, 37, 0, 267, 269, 270, 409,
+           78, 95, 88, 178, 87, 14, 317, 402, 318, 324, 308, 191, 80, 81, 82, 13, 312, 311, 310, 415]
+MP_RIGHT_EYE = [33, 7, 163, 144, 145, 153, 154, 155, 133, 246, 161, 160, 159, 158, 157, 173]
+MP_LEFT_EYE = [263, 249, 390, 373, 374, 380, 381, 382, 362, 466, 388, 387, 386, 385, 384, 398]
+MP_RIGHT_BROW = [46, 53, 52, 65, 55, 70, 63, 105, 66, 107]
+MP_LEFT_BROW = [276, 283, 282, 295, 285, 300, 293, 334, 296, 336]
+
+
+def default_regions(base):
+    """Regiões para as deformações: índices do FaceMesh se houver 468 pontos; senão as bandas de utils."""
+    if len(base) == 468:
+        return {'mouth': MP_LIPS, 'eyes': [MP_RIGHT_EYE, MP_LEFT_EYE], 'brows': [MP_RIGHT_BROW, MP_LEFT_BROW]}
+    r = map_landmarks_to_regions(base)
+    return {'mouth': r['mouth'], 'eyes': [r['eyes']], 'brows': [r['brows']]}
+
+
+def load_base(path=DEFAULT_BASE):
+    """Landmarks neutros de referência (topologia salva em face_neutral.json); sem o arquivo, usa uma face sintética."""
+    if path and os.path.exists(path):
+        return landmarks_from_graph_json(path)
+    from .bench import synthetic_landmarks
+    return synthetic_landmarks(468)
+
+
+def expression_basis(base, regions=None):
+    """Campos de deslocamento (N,2) por rótulo para intensidade 1, em pixels da face de referência.
+
+    happy: boca alarga e os cantos sobem; sad: cantos da boca descem e o interior das sobrancelhas sobe;
+    surprise: sobrancelhas sobem, olhos abrem e o lábio inferior desce; neutral: zero.
+    """
+    base = np.asarray(base, dtype=float)
+    regions = regions or default_regions(base)
+    x_min, y_min = base.min(axis=0)
+    x_max, y_max = base.max(axis=0)
+    s = float(np.hypot(x_max - x_min, y_max - y_min))
+    face_cx = (x_min + x_max) / 2.0
+    basis = {label: np.zeros_like(base) for label in LABELS}
+
+    mouth = np.asarray(regions['mouth'], dtype=np.int64)
+    m = base[mouth]
+    mcx, mcy = m.mean(axis=0)
+    halfw = max(np.abs(m[:, 0] - mcx).max(), 1e-9)
+    corner = ((m[:, 0] - mcx) / halfw) ** 2  # 0 no centro, 1 nos cantos
+    basis['happy'][mouth, 0] = 0.20 * (m[:, 0] - mcx)
+    basis['happy'][mouth, 1] = -0.04 * s * corner
+    basis['sad'][mouth, 1] = 0.03 * s * corner
+    basis['surprise'][mouth, 0] = -0.08 * (m[:, 0] - mcx)
+    basis['surprise'][mouth, 1] = 0.08 * s * (m[:, 1] > mcy)
+
+    for brow in regions['brows']:
+        brow = np.asarray(brow, dtype=np.int64)
+        b = base[brow]
+        span = max(np.abs(b[:, 0] - face_cx).max(), 1e-9)
+        inner = 1.0 - np.abs(b[:, 0] - face_cx) / span  # mais perto do centro do rosto => mais deslocamento
+        basis['sad'][brow, 1] = -0.03 * s * inner
+        basis['surprise'][brow, 1] = -0.04 * s
+
+    for eye in regions['eyes']:
+        eye = np.asarray(eye, dtype=np.int64)
+        e = base[eye]
+        basis['surprise'][eye, 1] = 0.35 * (e[:, 1] - e[:, 1].mean())
+    return basis
+
+
+def _similarity(points, scale, angle, shift, center):
+    """Aplica escala/rotação/translação por amostra, no lugar: points (B,N,2), scale/angle (B,), shift (B,2)."""
+    c = (np.cos(angle) * scale).astype(points.dtype)[:, None]
+    s = (np.sin(angle) * scale).astype(points.dtype)[:, None]
+    points -= center
+    x = points[..., 0].copy()
+    y = points[..., 1]
+    points[..., 0] = c * x - s * y
+    points[..., 1] = s * x + c * y
+    points += (center + shift)[:, None, :].astype(points.dtype)
+    return points
+
+
+class ExpressionGenerator:
+    """Gera pares (neutro, alvo) de landmarks com rótulo verdadeiro, vetorizado por lote.
+
+    - labels: rótulos sorteados (uniforme) entre LABELS; intensity: faixa da intensidade da expressão
+    - jitter: ruído gaussiano por ponto (fração da diagonal da face), independente no neutro e no alvo
+    - scale / rotation_deg / shift: pose do par (mesma transformação no neutro e no alvo)
+    - pose_jitter_deg / pose_jitter_scale: diferença extra de pose do alvo em relação ao neutro
+    Os arrays são float32; o mesmo seed gera a mesma sequência.
+    """
+    def __init__(self, base=None, regions=None, labels=LABELS, intensity=(0.5, 1.0), jitter=0.002,
+                 scale=(0.8, 1.25), rotation_deg=8.0, shift=0.05, pose_jitter_deg=0.0, pose_jitter_scale=0.0, seed=0):
+        self.base = np.asarray(load_base() if base is None else base, dtype=float)
+        self.labels = tuple(labels)
+        basis = expression_basis(self.base, regions)
+        self.basis = np.stack([basis[l] for l in self.labels]).astype(np.float32)
+        self.intensity = intensity
+        self.face_scale = float(np.hypot(*np.ptp(self.base, axis=0)))
+        self.jitter = jitter
+        self.scale = scale
+        self.rotation = np.deg2rad(rotation_deg)
+        self.shift = shift
+        self.pose_jitter = np.deg2rad(pose_jitter_deg)
+        self.pose_jitter_scale = pose_jitter_scale
+        self.center = self.base.mean(axis=0)
+        self._base32 = self.base.astype(np.float32)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, n):
+        """Retorna (neutral (n,N,2), target (n,N,2), labels (n,) int8 com índices em self.labels)."""
+        rng = self.rng
+        n_pts = len(self.base)
+        labels = rng.integers(0, len(self.labels), size=n).astype(np.int8)
+        amount = rng.uniform(self.intensity[0], self.intensity[1], size=n).astype(np.float32)
+        sigma = np.float32(self.jitter * self.face_scale)
+        base = self._base32
+        neutral = rng.standard_normal(size=(n, n_pts, 2), dtype=np.float32)
+        neutral *= sigma
+        neutral += base
+        target = rng.standard_normal(size=(n, n_pts, 2), dtype=np.float32)
+        target *= sigma
+        target += base
+        target += self.basis[labels] * amount[:, None, None]
+
+        scale = rng.uniform(self.scale[0], self.scale[1], size=n)
+        angle = rng.uniform(-self.rotation, self.rotation, size=n)
+        shift = rng.uniform(-self.shift, self.shift, size=(n, 2)) * self.face_scale
+        _similarity(neutral, scale, angle, shift, self.center)
+        if self.pose_jitter or self.pose_jitter_scale:
+            angle = angle + rng.uniform(-self.pose_jitter, self.pose_jitter, size=n)
+            scale = scale * (1.0 + rng.uniform(-self.pose_jitter_scale, self.pose_jitter_scale, size=n))
+        _similarity(target, scale, angle, shift, self.center)
+        return neutral, target, labels
+
+    def iter_batches(self, total=None, batch_size=4096):
+        """Gera lotes (neutral, target, labels) até `total` pares (infinito se None), sem materializar tudo."""
+        done = 0
+        while total is None or done < total:
+            n = batch_size if total is None else min(batch_size, total - done)
+            yield self.sample(n)
+            done += n
+
+    def iter_pairs(self, total=None, batch_size=4096):
+        """Gera (neutral (N,2), target (N,2), rótulo) um a um (internamente amostra em lotes)."""
+        for neutral, target, labels in self.iter_batches(total, batch_size):
+            for i in range(len(labels)):
+                yield neutral[i], target[i], self.labels[labels[i]]
+
+    def write_shards(self, out_dir, total, shard_size=100000, batch_size=4096):
+        """Grava `total` pares em shards .npy (<prefix>_neutral/_target/_labels) e um manifest.json."""
+        ensure_dir(out_dir)
+        shards = []
+        for k, start in enumerate(range(0, total, shard_size)):
+            n = min(shard_size, total - start)
+            prefix = os.path.join(out_dir, f'shard_{k:05d}')
+            # memmap: o shard é escrito lote a lote, sem alocar o shard inteiro em memória
+            arrays = {
+                'neutral': np.lib.format.open_memmap(prefix + '_neutral.npy', mode='w+', dtype=np.float32,
+                                                     shape=(n, len(self.base), 2)),
+                'target': np.lib.format.open_memmap(prefix + '_target.npy', mode='w+', dtype=np.float32,
+                                                    shape=(n, len(self.base), 2)),
+                'labels': np.lib.format.open_memmap(prefix + '_labels.npy', mode='w+', dtype=np.int8, shape=(n,)),
+            }
+            pos = 0
+            for neutral, target, labels in self.iter_batches(n, batch_size):
+                b = len(labels)
+                arrays['neutral'][pos:pos + b] = neutral
+                arrays['target'][pos:pos + b] = target
+                arrays['labels'][pos:pos + b] = labels
+                pos += b
+            for a in arrays.values():
+                a.flush()
+            del arrays
+            shards.append({'prefix': os.path.basename(prefix), 'count': n})
+        save_json_atomic(os.path.join(out_dir, 'manifest.json'), {
+            'labels': list(self.labels), 'landmarks': len(self.base), 'total': total, 'shards': shards})
+        return [os.path.join(out_dir, s['prefix']) for s in shards]
+
+
+def load_shard(prefix, mmap=True):
+    """Carrega um shard gravado por write_shards: (neutral, target, labels) — por padrão em memmap."""
+    mode = 'r' if mmap else None
+    return (np.load(prefix + '_neutral.npy', mmap_mode=mode), np.load(prefix + '_target.npy', mmap_mode=mode),
+            np.load(prefix + '_labels.npy', mmap_mode=mode))
+
+
+def iter_shards(out_dir, mmap=True):
+    """Gera (neutral, target, labels, nomes_dos_rótulos) para cada shard listado no manifest.json."""
+    manifest = load_json(os.path.join(out_dir, 'manifest.json'))
+    for s in manifest['shards']:
+        yield load_shard(os.path.join(out_dir, s['prefix']), mmap=mmap) + (manifest['labels'],)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera pares sintéticos (neutro, alvo) de landmarks com rótulos')
+    parser.add_argument('--out', required=True, help='diretório dos shards .npy')
+    parser.add_argument('--total', type=int, default=100000)
+    parser.add_argument('--shard-size', type=int, default=100000)
+    parser.add_argument('--base', default=DEFAULT_BASE, help='face_neutral.json usado como topologia de referência')
+    parser.add_argument('--intensity', type=float, nargs=2, default=(0.5, 1.0))
+    parser.add_argument('--jitter', type=float, default=0.002, help='ruído por ponto (fração da diagonal da face)')
+    parser.add_argument('--scale', type=float, nargs=2, default=(0.8, 1.25))
+    parser.add_argument('--rotation', type=float, default=8.0, help='rotação máxima do par (graus)')
+    parser.add_argument('--pose-jitter', type=float, default=0.0, help='rotação extra máxima do alvo (graus)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    gen = ExpressionGenerator(base=load_base(args.base), intensity=args.intensity, jitter=args.jitter,
+                              scale=args.scale, rotation_deg=args.rotation, pose_jitter_deg=args.pose_jitter,
+                              seed=args.seed)
+    paths = gen.write_shards(args.out, args.total, shard_size=args.shard_size)
+    print(f'{args.total} pares em {len(paths)} shard(s) em {args.out}')
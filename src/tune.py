@@ -0,0 +1,234 @@
+import json
+import argparse
+import itertools
+import numpy as np
+from .dfa import SimpleEmotionDFA
+
+PARAM_KEYS = ('mouth_thresh', 'eyes_thresh', 'brows_thresh', 'threshold')
+PRED_LABELS = ('happy', 'sad', 'neutral', 'reject')
+HAPPY, SAD, NEUTRAL, REJECT = range(4)
+
+
+class TuningSet:
+    """Amostras rotuladas com os deslocamentos já calculados, prontas para avaliação vetorizada.
+
+    difs: (S,N) float32 normalizados pela diagonal da face; scale: (S,) diagonal em pixels
+    masks: (S,3,N) uint8 (mouth, eyes, brows); labels: (S,) índices em `classes`.
+    O top-10 dos deslocamentos não depende dos parâmetros, então a fração na boca é pré-calculada.
+    """
+    def __init__(self, difs, scale, masks, labels, classes):
+        self.difs = np.asarray(difs, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.masks = np.asarray(masks, dtype=np.uint8)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.classes = list(classes)
+        self.sizes = self.masks.sum(axis=2).astype(np.float64)  # (S,3)
+        k = min(10, self.difs.shape[1])
+        # mesma ordem do DFA: decrescente, empates pelo menor índice
+        topk = np.argsort(-self.difs, axis=1, kind='stable')[:, :k]
+        mouth_top = np.take_along_axis(self.masks[:, 0, :], topk, axis=1).sum(axis=1)
+        self.mouth_topk_frac = mouth_top / float(k) if k else np.zeros(len(self.difs))
+        # a predição comparada com o rótulo real: classes que o DFA não emite nunca acertam
+        self.target = np.array([PRED_LABELS.index(c) if c in PRED_LABELS else -1 for c in self.classes])[self.labels]
+
+    def __len__(self):
+        return len(self.difs)
+
+    def subset(self, idx):
+        out = TuningSet.__new__(TuningSet)
+        for name in ('difs', 'scale', 'masks', 'labels', 'sizes', 'mouth_topk_frac', 'target'):
+            setattr(out, name, getattr(self, name)[idx])
+        out.classes = self.classes
+        return out
+
+    @classmethod
+    def from_results(cls, path):
+        """Carrega as linhas 'ok' de um checkpoint de src.evaluate (results.jsonl)."""
+        from .evaluate import read_checkpoint, decode_difs
+        rows = [r for r in read_checkpoint(path).values() if r.get('status') == 'ok' and 'difs_b64' in r]
+        if not rows:
+            raise ValueError(f'nenhuma amostra válida em {path}')
+        n = len(decode_difs(rows[0]))
+        rows = [r for r in rows if len(r['regions']) == n]
+        difs = np.stack([decode_difs(r) for r in rows])
+        codes = np.frombuffer(''.join(r['regions'] for r in rows).encode('ascii'), dtype=np.uint8).reshape(len(rows), n)
+        masks = np.stack([codes == ord(str(c)) for c in (1, 2, 3)], axis=1)
+        classes = sorted({r['label'] for r in rows})
+        labels = [classes.index(r['label']) for r in rows]
+        return cls(difs, [r['scale'] for r in rows], masks, labels, classes)
+
+    @classmethod
+    def from_landmarks(cls, neutral, target, labels, classes):
+        """A partir de landmarks (S,N,2) — ex.: src.synthetic — com as mesmas regiões de utils.map_landmarks_to_regions."""
+        neutral = np.asarray(neutral, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        lo, hi = neutral.min(axis=1), neutral.max(axis=1)
+        scale = np.hypot(hi[:, 0] - lo[:, 0], hi[:, 1] - lo[:, 1])
+        difs = np.linalg.norm(target - neutral, axis=2) / (scale[:, None] + 1e-9)
+        y = neutral[:, :, 1]
+        h = (hi[:, 1] - lo[:, 1])[:, None]
+        mouth = y >= lo[:, 1:2] + 0.60 * h
+        eyes = ~mouth & (y >= lo[:, 1:2] + 0.33 * h)
+        brows = ~mouth & ~eyes
+        return cls(difs, scale, np.stack([mouth, eyes, brows], axis=1), labels, classes)
+
+
+def predict_grid(data, params, chunk=256):
+    """Predições do SimpleEmotionDFA (mesmas regras de dfa.predict com a entrada do pipeline) para cada
+    linha de `params` (P,4: mouth, eyes, brows, threshold) e cada amostra. Retorna (P,S) int8 em PRED_LABELS.
+
+    As contagens por região dependem só do threshold do diff: são calculadas uma vez por threshold distinto
+    (matmul das máscaras pelo vetor binário); os thresholds do DFA viram comparações broadcasted (P,S).
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 4)
+    n_pts = data.difs.shape[1]
+    out = np.empty((len(params), len(data)), dtype=np.int8)
+    masks_f = data.masks.astype(np.float32)
+    reject_limit = max(50, 0.5 * n_pts)
+    happy_topk = data.mouth_topk_frac >= 0.6
+    for thr in np.unique(params[:, 3]):
+        thr_norm = thr / (data.scale + 1e-9) if thr > 1.0 else np.full(len(data), thr)
+        binary = (data.difs >= thr_norm[:, None].astype(np.float32)).astype(np.float32)  # (S,N)
+        counts = np.matmul(masks_f, binary[:, :, None])[:, :, 0]                           # (S,3)
+        props = counts / np.maximum(data.sizes, 1.0)
+        pm, pe, pb = props[:, 0], props[:, 1], props[:, 2]
+        total_ones = binary.sum(axis=1)
+        base = np.where(counts.sum(axis=1) == 0, NEUTRAL, np.where(total_ones > reject_limit, REJECT, NEUTRAL))
+        happy2 = happy_topk & (pm >= 0.08)
+        sel = np.flatnonzero(params[:, 3] == thr)
+        for start in range(0, len(sel), chunk):
+            rows = sel[start:start + chunk]
+            m, e, b = (params[rows, i][:, None] for i in range(3))
+            happy = ((pm >= m) & (pe <= e)) | happy2
+            sad = (pb >= b) & (pm <= 0.1)
+            out[rows] = np.where(happy, HAPPY, np.where(sad, SAD, base))
+    return out
+
+
+def score(data, preds, metric='accuracy'):
+    """(P,) — 'accuracy' ou 'balanced' (média do recall por classe real)."""
+    correct = preds == data.target[None, :]
+    if metric == 'accuracy':
+        return correct.mean(axis=1)
+    onehot = np.eye(len(data.classes), dtype=np.float64)[data.labels]            # (S,C)
+    per_class = (correct.astype(np.float64) @ onehot) / np.maximum(onehot.sum(axis=0), 1.0)
+    return per_class.mean(axis=1)
+
+
+def grid(mouth, eyes, brows, thresholds):
+    """Produto cartesiano dos valores, (P,4)."""
+    return np.array(list(itertools.product(mouth, eyes, brows, thresholds)), dtype=np.float64)
+
+
+def random_params(n, ranges, rng):
+    """n pontos uniformes em ranges {chave: (min, max)}; thresholds podem ser lista discreta."""
+    cols = []
+    for key in PARAM_KEYS:
+        r = ranges[key]
+        if isinstance(r, (list, tuple)) and len(r) == 2 and key != 'threshold':
+            cols.append(rng.uniform(r[0], r[1], size=n))
+        else:
+            cols.append(rng.choice(np.asarray(r, dtype=np.float64), size=n))
+    return np.stack(cols, axis=1)
+
+
+def evaluate_params(data, params, metric='accuracy', block=4096):
+    """Score de cada linha de params, em blocos de parâmetros para limitar a memória (P,S)."""
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 4)
+    scores = np.empty(len(params))
+    for start in range(0, len(params), block):
+        scores[start:start + block] = score(data, predict_grid(data, params[start:start + block]), metric)
+    return scores
+
+
+def successive_halving(data, params, metric='accuracy', eta=3, min_samples=256, seed=0):
+    """Avalia todos os candidatos numa fração das amostras, mantém o melhor 1/eta e aumenta as amostras
+    por eta a cada rodada, até usar o conjunto inteiro. Retorna (params sobreviventes, scores finais)."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(data))
+    params = np.asarray(params, dtype=np.float64)
+    rounds = max(0, int(np.ceil(np.log(max(len(params), 1)) / np.log(eta))))
+    n_samples = max(min_samples, int(len(data) / eta ** rounds))
+    while True:
+        n_samples = min(n_samples, len(data))
+        scores = evaluate_params(data.subset(order[:n_samples]), params, metric)
+        if len(params) <= 1 or n_samples >= len(data):
+            return params, scores
+        keep = max(1, len(params) // eta)
+        best = np.argsort(-scores, kind='stable')[:keep]
+        params = params[best]
+        n_samples *= eta
+
+
+def tune(data, method='grid', metric='accuracy', space=None, n_random=2000, eta=3, seed=0):
+    """Busca os melhores parâmetros. Retorna dict com a configuração vencedora, score e o top 10."""
+    space = space or default_space()
+    if method == 'grid':
+        params = grid(space['mouth_thresh'], space['eyes_thresh'], space['brows_thresh'], space['threshold'])
+        n_candidates = len(params)
+        scores = evaluate_params(data, params, metric)
+    else:
+        rng = np.random.default_rng(seed)
+        ranges = {k: (min(v), max(v)) if k != 'threshold' else v for k, v in space.items()}
+        params = random_params(n_random, ranges, rng)
+        n_candidates = len(params)
+        if method == 'random':
+            scores = evaluate_params(data, params, metric)
+        elif method == 'halving':
+            params, scores = successive_halving(data, params, metric, eta=eta, seed=seed)
+        else:
+            raise ValueError(f'método desconhecido: {method}')
+    order = np.argsort(-scores, kind='stable')
+    top = [dict(zip(PARAM_KEYS, map(float, params[i])), score=float(scores[i])) for i in order[:10]]
+    best = top[0]
+    return {'best': best, 'metric': metric, 'method': method, 'evaluated': int(n_candidates),
+            'samples': len(data), 'top': top}
+
+
+def default_space():
+    return {
+        'mouth_thresh': np.round(np.arange(0.02, 0.42, 0.02), 4).tolist(),
+        'eyes_thresh': np.round(np.arange(0.05, 0.55, 0.05), 4).tolist(),
+        'brows_thresh': np.round(np.arange(0.02, 0.42, 0.02), 4).tolist(),
+        'threshold': [0.005, 0.01, 0.015, 0.02, 0.03, 0.05, 0.08, 0.10],
+    }
+
+
+def write_config(path, result):
+    """Grava dfa_config.json (thresholds do DFA + 'threshold' do diff) lido por FacialStatePipeline.from_config."""
+    best = result['best']
+    dfa = SimpleEmotionDFA(mouth_thresh=best['mouth_thresh'], eyes_thresh=best['eyes_thresh'],
+                           brows_thresh=best['brows_thresh'])
+    dfa.save_config(path, threshold=best['threshold'], score=best['score'], metric=result['metric'],
+                    samples=result['samples'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ajusta os thresholds do SimpleEmotionDFA sobre deslocamentos em cache')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--results', help='results.jsonl gerado por src.evaluate')
+    src.add_argument('--synthetic', type=int, help='usa N pares de src.synthetic (sem dataset)')
+    parser.add_argument('--method', choices=['grid', 'random', 'halving'], default='grid')
+    parser.add_argument('--metric', choices=['accuracy', 'balanced'], default='balanced')
+    parser.add_argument('--n-random', type=int, default=5000, help='candidatos para random/halving')
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=None, help='valores do threshold do diff')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='dfa_config.json')
+    args = parser.parse_args()
+
+    if args.results:
+        data = TuningSet.from_results(args.results)
+    else:
+        from .synthetic import ExpressionGenerator
+        gen = ExpressionGenerator(seed=args.seed)
+        neutral, target, labels = gen.sample(args.synthetic)
+        data = TuningSet.from_landmarks(neutral, target, labels, gen.labels)
+    space = default_space()
+    if args.thresholds:
+        space['threshold'] = args.thresholds
+    result = tune(data, method=args.method, metric=args.metric, space=space, n_random=args.n_random,
+                  eta=args.eta, seed=args.seed)
+    write_config(args.out, result)
+    print(json.dumps({k: result[k] for k in ('best', 'method', 'metric', 'evaluated', 'samples')}, indent=2))
+    print('Configuração salva em', args.out)
@@ -1,6 +1,9 @@
 import os
 import json
+import tempfile
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
@@ -10,10 +13,103 @@ def save_json(path, obj):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(obj, f, indent=2, ensure_ascii=False)
 
+def save_json_atomic(path, obj):
+    """Como save_json, mas grava num arquivo temporário e faz os.replace (leitores nunca veem arquivo parcial)."""
+    d = os.path.dirname(path) or '.'
+    ensure_dir(d)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=d)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
 def load_json(path):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+class BoundedExecutor:
+    """Pool de threads com limite de tarefas pendentes: submit() bloqueia quando há max_pending em voo.
+
+    Usado para mandar gravações/renderizações para segundo plano sem acumular memória sem limite.
+    join() espera todas as tarefas submetidas e retorna os futures (na ordem de submissão).
+    """
+    def __init__(self, max_workers=2, max_pending=8):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max(max_pending, max_workers))
+        self._futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        self._slots.acquire()
+        try:
+            fut = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _f: self._slots.release())
+        self._futures.append(fut)
+        return fut
+
+    def join(self):
+        futures, self._futures = self._futures, []
+        wait(futures)
+        return futures
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+        return False
+
+
+def landmarks_from_graph_json(path):
+    """Lê um grafo de face salvo (face_*.json) e retorna os landmarks (N,2) a partir do atributo 'xy' dos nós."""
+    nodes = load_json(path)['nodes']
+    lm = np.empty((len(nodes), 2), dtype=float)
+    for node in nodes:
+        lm[int(node['id'])] = node['xy'][:2]
+    return lm
+
+
+def load_summary(digraphs_dir):
+    """summary.json de um diretório de digraphs ({} se não existir)."""
+    summary_path = os.path.join(digraphs_dir, 'summary.json')
+    return load_json(summary_path) if os.path.exists(summary_path) else {}
+
+
+def summary_reference(digraphs_dir):
+    """Expressão de referência dos diffs (summary.json['reference']; 'neutral' em summaries antigos)."""
+    return load_summary(digraphs_dir).get('reference', 'neutral')
+
+
+def diff_meta_entries(digraphs_dir):
+    """Lista [(rótulo, caminho_meta)] dos diffs que partem da referência (neutral) num diretório de digraphs.
+
+    Origem/destino vêm de summary.json['pairs'] (o rótulo é o 'to' do par, mesmo que contenha '_');
+    summaries antigos só com a lista 'meta' têm o prefixo diff_<referência>_ removido do nome. Sem
+    summary, cai nos nomes padrão de sad/happy.
+    """
+    summary = load_summary(digraphs_dir)
+    reference = summary.get('reference', 'neutral')
+    if summary.get('pairs'):
+        return [(p['to'], os.path.join(digraphs_dir, p['meta'])) for p in summary['pairs'] if p['from'] == reference]
+    names = summary.get('meta') or ['diff_neutral_sad_meta.json', 'diff_neutral_happy_meta.json']
+    prefix = f'diff_{reference}_'
+    entries = []
+    for name in names:
+        stem = name[:-len('_meta.json')] if name.endswith('_meta.json') else os.path.splitext(name)[0]
+        label = stem[len(prefix):] if stem.startswith(prefix) else stem.rsplit('_', 1)[-1]
+        entries.append((label, os.path.join(digraphs_dir, name)))
+    return entries
+
+
 def landmarks_to_np(landmarks):
     """Converte lista de (x,y) ou (x,y,z) para numpy array shape (N,2) ou (N,3)"""
     return np.array(landmarks, dtype=float)
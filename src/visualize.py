@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import networkx as nx
 import numpy as np
 
@@ -70,8 +71,18 @@ def plot_landmarks(image, landmarks, ax=None, show=True, out_path=None, title=No
         plt.show()
 
 
-def plot_diff_graph(image, landmarks, diff_graph, out_path=None):
-    fig, ax = plt.subplots(figsize=(8,8))
+def plot_diff_graph(image, landmarks, diff_graph, out_path=None, backend='matplotlib', max_side=None):
+    """Desenha os landmarks e destaca os nós das arestas de maior peso do grafo de diferença.
+
+    backend='cv2' usa o renderizador rápido de `render_cv` (sem matplotlib); max_side reduz o canvas.
+    """
+    if backend == 'cv2':
+        from .render_cv import CvRenderer
+        CvRenderer(max_side=max_side).render_diff_graph(image, landmarks, diff_graph, out_path=out_path)
+        return
+    # Figure sem pyplot: independe do backend interativo e pode ser usada fora da thread principal
+    fig = Figure(figsize=(8,8))
+    ax = fig.subplots()
     ax.imshow(image[...,::-1])
     lm = np.array(landmarks)
     # draw cube in background
@@ -111,8 +122,7 @@ def plot_diff_graph(image, landmarks, diff_graph, out_path=None):
         # nothing to draw
         ax.axis('off')
         if out_path:
-            plt.savefig(out_path, bbox_inches='tight')
-        plt.close()
+            fig.savefig(out_path, bbox_inches='tight')
         return
 
     edges_with_w = []
@@ -157,5 +167,4 @@ def plot_diff_graph(image, landmarks, diff_graph, out_path=None):
 
     ax.axis('off')
     if out_path:
-        plt.savefig(out_path, bbox_inches='tight')
-    plt.close()
+        fig.savefig(out_path, bbox_inches='tight')
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+import pytest
+from src import generate_digraphs as g
+from src.digraph import build_face_digraph
+from src.synthetic import ExpressionGenerator
+
+
+@pytest.fixture
+def synthetic_landmarks():
+    """labels -> {rótulo: landmarks (N, 2)} sintéticos e determinísticos, um alvo do ExpressionGenerator por rótulo."""
+    def make(labels):
+        _, targets, _ = ExpressionGenerator(seed=1, jitter=0).sample(len(labels))
+        return {label: targets[i].astype(float) for i, label in enumerate(labels)}
+    return make
+
+
+@pytest.fixture
+def fake_extraction(monkeypatch, synthetic_landmarks):
+    """Troca a extração do generate_digraphs (sem MediaPipe) por landmarks sintéticos.
+
+    labels -> landmarks por rótulo; o caminho de cada imagem é o rótulo ou `<dir>/<rótulo>.<ext>`.
+    """
+    def install(labels):
+        lms = synthetic_landmarks(labels)
+        img = np.zeros((64, 64, 3), dtype=np.uint8)
+
+        def load(path, timer=None):
+            lm = lms[os.path.splitext(os.path.basename(path))[0]]
+            return img, lm, build_face_digraph(lm)
+
+        monkeypatch.setattr(g, '_load_and_extract', load)
+        return lms
+    return install
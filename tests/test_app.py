@@ -0,0 +1,24 @@
+import os
+import pytest
+
+pytest.importorskip('streamlit')
+# em modo bare (sem `streamlit run`) os botões ficam desligados: importar só define as funções e os caches
+from src import app  # noqa: E402
+from src.utils import save_json  # noqa: E402
+
+
+def test_json_cache_is_invalidated_when_file_is_rewritten(tmp_path):
+    path = str(tmp_path / 'summary.json')
+    save_json(path, {'version': 1})
+    assert app.try_load_json(path) == {'version': 1}
+    save_json(path, {'version': 2})
+    mtime = os.path.getmtime(path) + 5  # garante mtime diferente mesmo em sistemas de arquivo com resolução grossa
+    os.utime(path, (mtime, mtime))
+    assert app.try_load_json(path) == {'version': 2}
+    assert app.try_load_json(str(tmp_path / 'missing.json')) is None
+
+
+def test_extractor_and_pipelines_are_cached():
+    assert app.get_extractor() is app.get_extractor()
+    assert app.get_pipeline(2.0) is app.get_pipeline(2.0)
+    assert app.get_pipeline(3.0).extractor is app.get_pipeline(2.0).extractor is app.get_extractor()
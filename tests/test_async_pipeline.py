@@ -0,0 +1,94 @@
+import time
+import asyncio
+import numpy as np
+from src.async_pipeline import AsyncPipelineRunner, collect
+from src.pipeline import FacialStatePipeline
+
+NEUTRAL = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+
+
+class FakeExtractor:
+    """Landmarks pelo valor do pixel (0 = neutro, k = boca deslocada k px), com atraso opcional."""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def from_bgr(self, img):
+        time.sleep(self.delay)
+        lm = NEUTRAL.copy()
+        lm[15:, 1] += float(img[0, 0, 0])
+        return lm
+
+
+def _item(i):
+    return {'id': i, 'neutral': np.zeros((4, 4, 3), np.uint8), 'target': np.full((4, 4, 3), i % 40, np.uint8)}
+
+
+def test_results_match_inputs_and_analysis_uses_shared_analyzer():
+    created = []
+
+    def factory():
+        created.append(FacialStatePipeline(extractor=FakeExtractor(), threshold=2.0))
+        return created[-1]
+
+    runner = AsyncPipelineRunner(factory, decode_workers=1, extract_workers=1, analyze_workers=3, queue_size=2)
+    try:
+        rows = asyncio.run(collect(runner, (_item(i) for i in range(12))))
+    finally:
+        runner.close()
+    assert sorted(r['id'] for r in rows) == list(range(12))
+    for r in rows:
+        ones = sum(r['result']['binary'])
+        assert ones == (5 if r['id'] % 40 >= 2 else 0)
+    assert len(created) == 1  # só a thread de extração cria pipeline; a análise não
+    assert runner._analyzer.threshold == 2.0 and runner._analyzer is not created[0]
+
+    ordered = AsyncPipelineRunner(factory, decode_workers=1, extract_workers=1, analyze_workers=1, queue_size=2)
+    try:
+        rows = asyncio.run(collect(ordered, (_item(i) for i in range(12))))
+    finally:
+        ordered.close()
+    assert [r['id'] for r in rows] == list(range(12))  # um worker por estágio: ordem de entrada
+
+
+def test_backpressure_bounds_items_in_flight():
+    pulled = []
+
+    def source():
+        for i in range(200):
+            pulled.append(i)
+            yield _item(i)
+
+    runner = AsyncPipelineRunner(lambda: FacialStatePipeline(extractor=FakeExtractor(delay=0.01)),
+                                 decode_workers=1, extract_workers=1, analyze_workers=1, queue_size=2)
+
+    async def main():
+        gen = runner.run(source())
+        first = await gen.__anext__()
+        await asyncio.sleep(0.5)  # consumidor parado: os estágios enchem as filas e param
+        in_flight = len(pulled)
+        await gen.aclose()
+        return first, in_flight
+
+    try:
+        first, in_flight = asyncio.run(main())
+    finally:
+        runner.close()
+    assert first['id'] == 0
+    # entregue ao consumidor + 5 filas de 2 + 1 item por estágio + 1 retido pelo alimentador
+    assert in_flight <= 1 + 5 * 2 + 4 + 1
+
+
+def test_failing_source_becomes_error_row_and_run_finishes():
+    def broken():
+        yield _item(1)
+        raise IOError('manifesto ilegível')
+
+    runner = AsyncPipelineRunner(lambda: FacialStatePipeline(extractor=FakeExtractor()), decode_workers=2,
+                                 extract_workers=1, queue_size=2)
+    try:
+        rows = asyncio.run(asyncio.wait_for(collect(runner, broken(), (_item(i) for i in range(2, 5))), 10))
+    finally:
+        runner.close()
+    errors = [r for r in rows if 'error' in r]
+    assert errors == [{'id': 'source[0]', 'error': 'OSError: manifesto ilegível'}]
+    assert sorted(r['id'] for r in rows if 'result' in r) == [1, 2, 3, 4]
@@ -0,0 +1,56 @@
+import numpy as np
+from src.automaton_runtime import AutomatonRuntime, compile_automaton, NO_INPUT
+
+AUTOMATON = {'neutral->sad': 0, 'neutral->happy': 1, '_metadata': {'threshold': 0.05}}
+
+
+def test_compile_automaton_table():
+    states, symbols, table, start = compile_automaton(AUTOMATON)
+    assert states == ['neutral', 'sad', 'happy'] and start == 'neutral' and symbols[-1] == '<outro>'
+    n, s, h, other = 0, 1, 2, 3
+    assert table[n, h] == h and table[n, s] == s and table[n, other] == n
+    assert table[h, s] == h and table[h, n] == n  # happy->sad não existe; neutral volta ao início
+
+
+def test_runtime_debounce_events_and_latency():
+    rt = AutomatonRuntime(AUTOMATON, capacity=2, min_frames=2)
+    for t, frames in enumerate([{'a': 'happy', 'b': 'sad'}, {'a': 'happy', 'b': 'happy'},
+                                {'a': 'reject', 'b': 'happy', 'c': 'sad'}, {'c': 'sad'}]):
+        events = rt.push(frames, now=float(t))
+        if t == 0:
+            assert events == []
+        if t == 1:
+            assert [(e['stream'], e['event'], e['latency_s'], e['frames']) for e in events] == \
+                [('a', 'entered happy', 1.0, 2)]
+        if t == 2:
+            assert [(e['stream'], e['to']) for e in events] == [('b', 'happy')]
+    assert events[0]['stream'] == 'c' and events[0]['dwell_s'] == 1.0
+    assert rt.size == 4 and rt.stats()['by_state'] == {'neutral': 0, 'sad': 1, 'happy': 2}
+    rt.close('a')
+    assert rt.stats()['streams'] == 2 and rt.open('d', now=5.0) == 0  # slot de 'a' reaproveitado
+
+
+def test_tick_matches_per_stream_loop():
+    rng = np.random.default_rng(0)
+    rt = AutomatonRuntime(AUTOMATON, capacity=500, min_frames=3)
+    for s in range(500):
+        rt.open(s, now=0.0)
+    ref = {s: ('neutral', None, 0) for s in range(500)}
+    for t in range(1, 60):
+        codes = rng.choice([NO_INPUT, 0, 1, 2, 3], size=500, p=[0.1, 0.3, 0.2, 0.3, 0.1]).astype(np.int32)
+        fired = {e['stream'] for e in rt.tick(codes, now=float(t))}
+        for s in range(500):
+            state, cand, run = ref[s]
+            c = int(codes[s])
+            if c == NO_INPUT:
+                assert s not in fired
+                continue
+            run, cand = (run + 1, cand) if c == cand else (1, c)
+            nxt = int(rt.table[rt.states.index(state), c])
+            if rt.states[nxt] != state and run >= 3:
+                assert s in fired
+                state = rt.states[nxt]
+            else:
+                assert s not in fired
+            ref[s] = (state, cand, run)
+    assert [rt.state_of(s) for s in range(500)] == [ref[s][0] for s in range(500)]
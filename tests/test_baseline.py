@@ -0,0 +1,36 @@
+import numpy as np
+from src.baseline import MultiBaseline
+from src.digraph import digraph_from_difference
+from src.pipeline import FacialStatePipeline
+from src.synthetic import ExpressionGenerator
+
+
+def test_multi_reference_baseline(tmp_path):
+    gen = ExpressionGenerator(seed=2, rotation_deg=0, shift=0, scale=(1, 1), jitter=0)
+    base = gen.base
+    rng = np.random.default_rng(0)
+    noise = np.full(len(base), 0.5)
+    noise[:40] = 6.0  # landmarks instáveis entre as capturas neutras
+    refs = base[None] + rng.normal(size=(7, len(base), 2)) * noise[None, :, None]
+    target = base + rng.normal(size=base.shape) * noise[:, None]
+    target[300:310] += 25.0
+
+    single = MultiBaseline(refs[:1])
+    G1, b1, d1 = single.diff(target, threshold=0.01)
+    G2, b2, d2 = digraph_from_difference(refs[0], target, threshold=0.01)
+    assert np.array_equal(b1, b2) and np.allclose(d1, d2) and set(G1.edges) == set(G2.edges)
+
+    multi = MultiBaseline(refs)
+    _, b_plain, _ = multi.diff(target, threshold=0.01, build_graph=False)
+    _, b_noise, _ = multi.diff(target, threshold=0.01, noise_k=3.0, build_graph=False)
+    assert b_noise[300:310].all() and b_noise[:40].sum() < b_plain[:40].sum()
+    _, b_min, _ = multi.diff(target, threshold=0.01, mode='min', build_graph=False)
+    assert b_min.sum() <= b_plain.sum()
+
+    multi.save(str(tmp_path / 'subject.npz'))
+    loaded = MultiBaseline.load(str(tmp_path / 'subject.npz'))
+    assert np.allclose(loaded.median, multi.median) and np.allclose(loaded.spread, multi.spread)
+
+    pipeline = FacialStatePipeline(extractor=object(), threshold=0.01, noise_k=3.0)
+    res = pipeline.analyze_landmarks(loaded, target, with_graph=False)
+    assert res['binary'] == b_noise.tolist()
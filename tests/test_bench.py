@@ -0,0 +1,15 @@
+from src.bench import compare, measure, synthetic_landmarks
+
+
+def test_compare_flags_regressions():
+    base = {'results': {'a': {'median_s': 1.0, 'peak_kb': 100.0}, 'b': {'median_s': 1.0}, 'gone': {'median_s': 1.0}}}
+    cur = {'results': {'a': {'median_s': 1.1, 'peak_kb': 300.0}, 'b': {'median_s': 2.0}, 'c': {'median_s': 1.0}}}
+    status = {r['case']: r['status'] for r in compare(cur, base, tolerance=0.25, mem_tolerance=0.5)}
+    assert status == {'a': 'more_memory', 'b': 'slower', 'c': 'new', 'gone': 'missing'}
+
+
+def test_measure_and_synthetic_landmarks():
+    lm = synthetic_landmarks(468)
+    assert lm.shape == (468, 2)
+    res = measure(lambda: lm.sum(), repeat=2, min_time=0.001)
+    assert res['median_s'] > 0 and res['peak_kb'] >= 0
@@ -0,0 +1,23 @@
+import numpy as np
+from src.digraph import changed_node_graph
+
+
+def test_changed_node_graph_matches_pairwise_loop():
+    rng = np.random.default_rng(3)
+    target = rng.random((200, 2)) * 100
+    dif = rng.random(200)
+    changed = (dif > 0.6).astype(int)
+    G = changed_node_graph(target, dif, changed, 12.0)
+
+    nodes = [i for i in range(200) if changed[i]]
+    expected = []
+    for i in range(len(nodes)):
+        for j in range(i + 1, len(nodes)):
+            a, b = nodes[i], nodes[j]
+            dist = float(np.linalg.norm(target[a] - target[b]))
+            if dist < 12.0:
+                expected += [(a, b, dist), (b, a, dist)]
+    assert list(G.nodes()) == nodes and all(G.nodes[i]['change'] == dif[i] for i in nodes)
+    got = [(a, b, w['weight']) for a, b, w in G.edges(data=True)]
+    assert sorted((a, b) for a, b, _ in got) == sorted((a, b) for a, b, _ in expected)
+    assert np.allclose(sorted(got), sorted(expected)) and len(got) > 0
@@ -0,0 +1,47 @@
+import numpy as np
+from src.evaluate import discover, evaluate_landmarks, decode_difs, build_report, read_checkpoint
+from src.pipeline import FacialStatePipeline
+
+
+def test_discover_and_report(tmp_path):
+    for subject, files in (('s1', ['neutral.jpg', 'happy.jpg', 'sad_2.jpg']), ('s2', ['happy.jpg'])):
+        (tmp_path / 'ds' / subject).mkdir(parents=True)
+        for f in files:
+            (tmp_path / 'ds' / subject / f).write_bytes(b'')
+    items = discover(str(tmp_path / 'ds'))
+    assert [(it['id'], it['label']) for it in items] == [('s1/happy.jpg', 'happy'), ('s1/sad_2.jpg', 'sad')]
+
+    neutral = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+    target = neutral.copy()
+    target[15:] += np.array([0.0, 30.0])
+    row = evaluate_landmarks(FacialStatePipeline(extractor=object()), neutral, target, 0.05)
+    assert row['status'] == 'ok' and len(row['regions']) == 20
+    assert np.allclose(decode_difs(row)[15:], 30.0 / row['scale'], rtol=1e-5)
+
+    rows = [dict(row, id='a', label='happy', extract_ms=10.0, analyze_ms=1.0),
+            {'id': 'b', 'label': 'sad', 'status': 'error', 'pred_dfa': 'reject', 'pred_majority': 'reject'}]
+    ckpt = tmp_path / 'results.jsonl'
+    ckpt.write_text(''.join(__import__('json').dumps(r) + '\n' for r in rows) + '{"id": "trunc')
+    report = build_report(list(read_checkpoint(str(ckpt)).values()))
+    assert report['status'] == {'ok': 1, 'error': 1}
+    assert report['dfa']['confusion'] == {'happy': {row['pred_dfa']: 1}}
+
+
+def test_resume_after_truncated_checkpoint(tmp_path):
+    import json
+    from src.evaluate import run
+    for f in ('neutral.jpg', 'happy.jpg', 'sad.jpg', 'surprise.jpg'):
+        (tmp_path / 'ds' / 's1').mkdir(parents=True, exist_ok=True)
+        (tmp_path / 'ds' / 's1' / f).write_bytes(b'')
+    out = tmp_path / 'eval'
+    first = {'id': 's1/happy.jpg', 'label': 'happy', 'status': 'no_face', 'pred_dfa': 'reject',
+             'pred_majority': 'reject'}
+    run(str(tmp_path / 'ds'), str(out), workers=1, verbose=False)  # grava config.json
+    ckpt = out / 'results.jsonl'
+    ckpt.write_text(json.dumps(first) + '\n' + '{"id": "s1/sad.jpg", "lab')  # queda no meio da escrita
+
+    run(str(tmp_path / 'ds'), str(out), workers=1, verbose=False)
+    lines = ckpt.read_text().splitlines()
+    assert [json.loads(line)['id'] for line in lines][0] == 's1/happy.jpg'
+    assert sorted(read_checkpoint(str(ckpt))) == ['s1/happy.jpg', 's1/sad.jpg', 's1/surprise.jpg']
+    assert len(lines) == 3
@@ -0,0 +1,64 @@
+import numpy as np
+from src.face_tracker import FaceTracker
+from src.pipeline import FacialStatePipeline
+from src.synthetic import ExpressionGenerator
+
+
+class _FrameExtractor:
+    """Extractor falso: cada 'quadro' já é o array (F,N,2) das faces."""
+    def from_bgr_multi(self, frame):
+        return frame
+
+
+def test_tracker_keeps_ids_and_pipeline_uses_per_face_baselines():
+    gen = ExpressionGenerator(seed=1, rotation_deg=0, shift=0, scale=(1, 1), jitter=0)
+    base = gen.base
+    d = np.hypot(*np.ptp(base, axis=0))
+    faces = np.stack([base, base + [2 * d, 0.0], base + [0.0, 2 * d]])
+
+    tracker = FaceTracker()
+    first = tracker.update(faces)
+    moved = faces[::-1] + 3.0  # ordem trocada e pequeno deslocamento
+    assert tracker.update(moved) == first[::-1]
+    assert tracker.update(faces[:1]) == first[:1]
+    for _ in range(6):
+        tracker.update(faces[:1])
+    assert tracker.active() == first[:1]
+    assert tracker.update(faces[1:2])[0] not in first
+
+    happy = gen.basis[gen.labels.index('happy')]
+    pipeline = FacialStatePipeline(extractor=_FrameExtractor())
+    enrolled = pipeline.analyze_frame(faces)
+    assert [r['reason'] for r in enrolled] == ['baseline_enrolled'] * 3
+    frame = faces.copy()
+    frame[1] += happy
+    results = pipeline.analyze_frame(frame[::-1])
+    by_id = {r['face_id']: r for r in results}
+    ids = [r['face_id'] for r in enrolled]
+    assert by_id[ids[0]]['label'] == 'neutral' and by_id[ids[2]]['label'] == 'neutral'
+    expected = pipeline.analyze_landmarks(faces[1], frame[1], with_graph=False)['label']
+    assert by_id[ids[1]]['label'] == expected
+    assert sum(by_id[ids[1]]['counts'].values()) > 0
+
+
+def test_analyze_frame_needs_multi_face_extractor(monkeypatch):
+    import pytest
+    from src import pipeline as pipeline_mod
+    from src.landmark_extractor import LandmarkExtractor
+    with pytest.raises(ValueError):
+        FacialStatePipeline(extractor=LandmarkExtractor(max_num_faces=1)).analyze_frame(np.zeros((8, 8, 3), np.uint8))
+
+    created = []
+
+    class _CountingExtractor(_FrameExtractor):
+        def __init__(self, max_num_faces=1):
+            self.max_num_faces = max_num_faces
+            created.append(max_num_faces)
+
+    monkeypatch.setattr(pipeline_mod, 'LandmarkExtractor', _CountingExtractor)
+    pipeline = FacialStatePipeline(max_faces=3)
+    faces = ExpressionGenerator(seed=1, jitter=0).sample(2)[0]
+    for _ in range(2):
+        assert len(pipeline.analyze_frame(faces)) == 2
+    # o extractor padrão (uma face) fica para from_bgr; analyze_frame cria um multi-face uma única vez
+    assert created == [1, 3] and pipeline.extractor.max_num_faces == 1
@@ -0,0 +1,21 @@
+import numpy as np
+from src.frame_gate import FrameGate
+
+
+def test_gate_skips_static_frames_and_reprocesses_changes():
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:240, 0:320]
+    # cenas suaves (como vídeo real); ruído de sensor de ±2 níveis
+    scene = np.dstack([(xx * 0.7 + 30 * np.sin(yy / 17.0) + 40)] * 3).astype(np.uint8)
+    other = np.dstack([(yy * 0.9 + 40 * np.cos(xx / 23.0) + 50)] * 3).astype(np.uint8)
+    frames = [np.clip(scene.astype(int) + rng.integers(-2, 3, scene.shape), 0, 255).astype(np.uint8)
+              for _ in range(10)] + [other] * 3
+
+    for method in ('absdiff', 'dhash'):
+        gate = FrameGate(threshold=0.05, method=method, max_skip=5)
+        calls = []
+        out = [gate.run(f, lambda img: calls.append(1) or len(calls)) for f in frames]
+        # 1º quadro, reprocesso forçado após 5 pulos, e a troca de cena
+        assert [skipped for _, skipped in out].count(False) == 3
+        assert out[-1] == (3, True)
+        assert gate.stats()['skipped'] == 10 and gate.stats()['processed'] == 3
@@ -0,0 +1,45 @@
+import numpy as np
+from src.frame_ring import RingExtractorPool
+
+
+class PixelExtractor:
+    """Extractor falso: 'landmarks' = valor do pixel (0,0) repetido; sem face se o quadro for todo zero."""
+    def from_bgr(self, img):
+        if not img.any():
+            return None
+        return np.full((4, 2), float(img[0, 0, 0]))
+
+
+def test_pool_returns_results_in_frame_order():
+    frames = [np.full((24, 32, 3), i % 256, dtype=np.uint8) for i in range(40)]
+    with RingExtractorPool((24, 32, 3), workers=2, slots=4, n_landmarks=4, extractor_factory=PixelExtractor) as pool:
+        results = list(pool.process(frames))
+    assert [seq for seq, _ in results] == list(range(40))
+    assert results[0][1] is None
+    assert all(lm[0, 0] == i for i, (_, lm) in enumerate(results) if i)
+
+
+class FreshArrayCapture:
+    """VideoCapture falso que ignora o destino de read() e devolve um array novo (como alguns backends)."""
+    def __init__(self, frames):
+        self.frames = iter(frames)
+
+    def read(self, dst=None):
+        frame = next(self.frames, None)
+        return (False, None) if frame is None else (True, frame.copy())
+
+    def release(self):
+        pass
+
+
+def test_process_video_copies_frames_not_decoded_in_place(monkeypatch):
+    import cv2
+    import pytest
+    frames = [np.full((24, 32, 3), i + 1, dtype=np.uint8) for i in range(10)]
+    monkeypatch.setattr(cv2, 'VideoCapture', lambda path: FreshArrayCapture(frames))
+    with RingExtractorPool((24, 32, 3), workers=2, slots=3, n_landmarks=4, extractor_factory=PixelExtractor) as pool:
+        results = list(pool.process_video('video.avi'))
+        assert [lm[0, 0] for _, lm in results] == [i + 1 for i in range(10)]
+        monkeypatch.setattr(cv2, 'VideoCapture', lambda path: FreshArrayCapture([np.ones((8, 8, 3), np.uint8)]))
+        with pytest.raises(ValueError):
+            list(pool.process_video('video.avi'))
@@ -0,0 +1,133 @@
+import numpy as np
+from src import generate_digraphs as g
+from src.digraph import digraph_from_difference
+from src.utils import load_json
+
+
+def test_pairwise_differences_matches_single_pairs(synthetic_landmarks):
+    lms = synthetic_landmarks(['neutral', 'happy', 'sad', 'surprise'])
+    stack = np.stack(list(lms.values()))
+    for threshold in (0.05, 8.0):
+        difs, binary, _ = g.pairwise_differences(stack, threshold)
+        for i in range(len(stack)):
+            for j in range(len(stack)):
+                _, b, d = digraph_from_difference(stack[i], stack[j], threshold=threshold, normalize=True)
+                assert np.allclose(difs[i, j], d) and np.array_equal(binary[i, j], b)
+
+
+def test_main_multi_writes_all_pairs(tmp_path, fake_extraction):
+    labels = ['neutral', 'happy', 'sad', 'surprise']
+    lms = fake_extraction(labels)
+    out = tmp_path / 'out'
+    summary = g.main_multi({label: label for label in labels}, str(out), renderer='cv2')
+
+    assert len(summary['pairs']) == 12
+    assert load_json(str(out / 'summary.json'))['pairs'] == summary['pairs']
+    for p in summary['pairs']:
+        for key in ('graph', 'meta', 'image'):
+            assert (out / p[key]).exists()
+    meta = load_json(str(out / 'diff_sad_surprise_meta.json'))
+    _, binary, _ = digraph_from_difference(lms['sad'], lms['surprise'], threshold=0.05, normalize=True)
+    assert meta['binary'] == binary.tolist()
+
+    automaton = load_json(str(out / 'automaton.json'))
+    assert automaton['_metadata']['states'] == labels and automaton['_metadata']['start'] == 'neutral'
+    assert {k for k in automaton if k != '_metadata'} == {'neutral->happy', 'neutral->sad', 'neutral->surprise'}
+    # decide() nunca responde "surprise": sem regra, o alvo fica só no grafo
+    assert automaton['neutral->surprise'] is None and automaton['_metadata']['graph_only'] == ['surprise']
+    tm = load_json(str(out / 'turing_machine.json'))
+    assert tm['Sigma'] == ['0', '1'] and 'q_check_surprise' not in tm['Q']
+    assert tm['Q'] == ['q_start', 'q_check_happy', 'q_check_sad', 'q_accept', 'q_reject']
+
+
+def test_main_multi_expected_gives_extra_targets_an_acceptance_rule(tmp_path, fake_extraction):
+    import pytest
+    labels = ['neutral', 'happy', 'surprise']
+    lms = fake_extraction(labels)
+    out = tmp_path / 'out'
+    with pytest.raises(ValueError):
+        g.main_multi({label: label for label in labels}, str(out), expected={'surprise': 'surprise'})
+    _, binary, _ = digraph_from_difference(lms['neutral'], lms['surprise'], threshold=0.05, normalize=True)
+    dec = g.decide(binary)
+    wrong = next(d for d in g.DECISIONS if d != dec)
+    for exp, verdict in ((dec, 'q_accept'), (wrong, 'q_reject')):
+        g.main_multi({label: label for label in labels}, str(out), pairs='reference', renderer='cv2',
+                     expected={'surprise': exp})
+        automaton = load_json(str(out / 'automaton.json'))
+        assert automaton['neutral->surprise'] == {'happy': 1, 'sad': 0, 'neutral': 0.5}[dec]
+        assert automaton['_metadata']['neutral->surprise_expected'] == exp
+        assert automaton['_metadata']['graph_only'] == []
+        tm = load_json(str(out / 'turing_machine.json'))
+        assert tm['Sigma'] == ['0', '1'] and tm['delta']['q_start,1']['next'] == 'q_check_surprise'
+        assert tm['delta']['q_check_surprise,_']['next'] == verdict
+
+
+def test_main_multi_rejects_unsafe_labels(tmp_path):
+    import pytest
+    for images in ({'neutral': 'n', '../x': 'y'}, {'neutral': 'n', 'mouth_open': 'y'}, {'neutral': 'n', 'a/b': 'y'}):
+        with pytest.raises(ValueError):
+            g.main_multi(images, str(tmp_path / 'out'))
+    assert not (tmp_path / 'out').exists()
+
+
+def test_thread_extractor_is_per_thread(monkeypatch):
+    import threading
+    created = []
+
+    class _Extractor:
+        def __init__(self):
+            created.append(threading.get_ident())
+
+    monkeypatch.setattr(g, 'LandmarkExtractor', _Extractor)
+    monkeypatch.setattr(g, '_thread_local', threading.local())
+    seen = []
+    worker = lambda: seen.append((g._thread_extractor(), g._thread_extractor()))
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(a is b for a, b in seen) and seen[0][0] is not seen[1][0]
+    assert len(created) == 2
+
+
+def test_regenerations_reuse_the_extraction_threads(tmp_path, monkeypatch, synthetic_landmarks):
+    import threading
+    labels = ['neutral', 'happy', 'sad', 'surprise', 'angry']
+    lms = synthetic_landmarks(labels)
+    created = []
+
+    class _Extractor:
+        def __init__(self):
+            created.append(self)
+
+        def from_bgr(self, img):
+            return lms[labels[int(img[0, 0, 0])]]
+
+    monkeypatch.setattr(g, 'LandmarkExtractor', _Extractor)
+    monkeypatch.setattr(g, '_thread_local', threading.local())
+    monkeypatch.setattr(g, '_extract_pool', None)
+    monkeypatch.setattr(g, 'imread', lambda path: np.full((64, 64, 3), labels.index(path), dtype=np.uint8))
+    try:
+        for k in range(3):
+            g.main_multi({label: label for label in labels}, str(tmp_path / f'out{k}'), pairs='reference',
+                         renderer='cv2', max_side=64)
+        # um FaceMesh por thread do pool, criado uma vez e reaproveitado nas regenerações seguintes
+        assert 1 <= len(created) <= g.EXTRACT_WORKERS
+        assert load_json(str(tmp_path / 'out2' / 'summary.json'))['reference'] == 'neutral'
+    finally:
+        g._extract_pool.shutdown()
+
+
+def test_main_multi_propagates_write_errors(tmp_path, monkeypatch, fake_extraction):
+    import pytest
+    labels = ['neutral', 'happy']
+    lms = fake_extraction(labels)
+
+    def failing_save(path, G):
+        raise OSError('disco cheio')
+
+    monkeypatch.setattr(g, 'save_graph', failing_save)
+    with pytest.raises(OSError, match='disco cheio'):
+        g.main_multi({label: label for label in labels}, str(tmp_path / 'out'), renderer='cv2')
+    assert not (tmp_path / 'out' / 'summary.json').exists()
@@ -0,0 +1,26 @@
+import numpy as np
+from src.identify import Gallery, embed
+from src.synthetic import ExpressionGenerator
+
+
+def test_embedding_is_pose_invariant_and_gallery_identifies(tmp_path):
+    rng = np.random.default_rng(0)
+    base = ExpressionGenerator().base
+    faces = base[None] + rng.normal(0, 4, (200, len(base), 2))
+
+    th = np.deg2rad(12)
+    rot = np.array([[np.cos(th), -np.sin(th)], [np.sin(th), np.cos(th)]])
+    moved = (faces[:10] @ rot.T) * 1.7 + np.array([40.0, -25.0])
+    assert np.allclose(embed(moved), embed(faces[:10]), atol=1e-4)
+
+    gallery = Gallery(str(tmp_path / 'gallery'), n_landmarks=len(base))
+    gallery.enroll([f'p{i}' for i in range(100)], faces[:100])
+    gallery.enroll([f'p{i}' for i in range(100, 200)], faces[100:])
+    gallery.enroll(['p3'], faces[3] + rng.normal(0, 0.5, (len(base), 2)))  # segunda amostra da mesma pessoa
+
+    reopened = Gallery(str(tmp_path / 'gallery'))
+    queries = moved + rng.normal(0, 0.2, moved.shape)
+    results = reopened.identify(queries, k=3)
+    assert [r[0]['identity'] for r in results] == [f'p{i}' for i in range(10)]
+    assert len({m['identity'] for m in results[3]}) == 3
+    assert reopened.identify(queries[:1], k=3, max_distance=1e-6) == [[]]
@@ -0,0 +1,32 @@
+import numpy as np
+import cv2
+from src.image_loader import image_size, imread, imread_reduced, load_images
+
+
+def test_imread_matches_cv2_and_reduced_scale(tmp_path):
+    img = cv2.GaussianBlur((np.random.default_rng(0).random((240, 320, 3)) * 255).astype(np.uint8), (9, 9), 0)
+    path = str(tmp_path / 'a.jpg')
+    cv2.imwrite(path, img)
+    assert image_size(open(path, 'rb').read()) == (320, 240)
+    assert np.array_equal(imread(path), cv2.imread(path))
+    small, scale = imread_reduced(path, 4)
+    assert small.shape[:2] == (60, 80)
+    assert np.allclose(scale, [4.0, 4.0])
+    assert load_images([path, str(tmp_path / 'missing.jpg')])[1] is None
+
+
+def test_imread_reduced_scale_with_exif_rotation(tmp_path):
+    import struct
+    from src.image_loader import exif_orientation
+    img = cv2.GaussianBlur((np.random.default_rng(0).random((240, 320, 3)) * 255).astype(np.uint8), (9, 9), 0)
+    jpg = cv2.imencode('.jpg', img)[1].tobytes()
+    tiff = b'MM\x00\x2a\x00\x00\x00\x08' + struct.pack('>HHHIHH', 1, 0x0112, 3, 1, 6, 0) + struct.pack('>I', 0)
+    app1 = b'Exif\x00\x00' + tiff
+    path = str(tmp_path / 'rotated.jpg')
+    with open(path, 'wb') as f:
+        f.write(jpg[:2] + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1 + jpg[2:])
+    data = open(path, 'rb').read()
+    assert exif_orientation(data) == 6 and exif_orientation(jpg) == 1
+    small, scale = imread_reduced(path, 4)
+    assert small.shape[:2] == (80, 60) and cv2.imread(path).shape[:2] == (320, 240)
+    assert np.allclose(scale, [4.0, 4.0])
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from src import generate_digraphs as g
+from src.annotate_diffs import annotate_topk
+from src.inspect_diffs import inspect_dir
+from src.utils import diff_meta_entries, load_json, save_json
+
+
+def test_inspect_and_annotate_use_summary_pairs(tmp_path, fake_extraction):
+    labels = ['neutral', 'happy', 'sad']
+    fake_extraction(labels)
+    out = tmp_path / 'out'
+    g.main_multi({label: label for label in labels}, str(out), renderer='cv2')
+
+    # pairs='all' grava também sad->happy, que não pode virar um segundo "happy"
+    assert diff_meta_entries(str(out)) == [('happy', str(out / 'diff_neutral_happy_meta.json')),
+                                           ('sad', str(out / 'diff_neutral_sad_meta.json'))]
+    summaries = inspect_dir(str(out), top_k=3)
+    assert list(summaries) == ['happy', 'sad']
+    meta = load_json(str(out / 'diff_neutral_sad_meta.json'))
+    assert summaries['sad']['total_changed'] == sum(meta['binary'])
+    assert [i for i, _ in summaries['sad']['top_changes']] == list(np.argsort(meta['difs'])[::-1][:3])
+
+    paths = annotate_topk(str(out), k=3, renderer='cv2')
+    assert [os.path.basename(p) for p in paths] == ['annotated_neutral_happy.png', 'annotated_neutral_sad.png']
+    assert all(os.path.exists(p) for p in paths)
+
+
+def test_diff_meta_entries_legacy_summary_keeps_underscored_labels(tmp_path):
+    save_json(str(tmp_path / 'summary.json'), {'meta': ['diff_neutral_mouth_open_meta.json']})
+    assert diff_meta_entries(str(tmp_path)) == [('mouth_open', str(tmp_path / 'diff_neutral_mouth_open_meta.json'))]
+
+
+def test_inspect_and_annotate_follow_non_neutral_reference(tmp_path, monkeypatch, fake_extraction):
+    import cv2
+    labels = ['neutral', 'happy', 'sad']
+    lms = fake_extraction(labels)
+    sad_png = tmp_path / 'sad.png'
+    cv2.imwrite(str(sad_png), np.full((64, 64, 3), 7, np.uint8))
+    out = tmp_path / 'out'
+    g.main_multi({label: str(tmp_path / f'{label}.png') for label in labels}, str(out), reference='sad',
+                 renderer='cv2')
+
+    summaries = inspect_dir(str(out), top_k=3)
+    assert list(summaries) == ['neutral', 'happy']
+    meta = load_json(str(out / 'diff_sad_happy_meta.json'))
+    # regiões calculadas sobre os landmarks da referência (sad), não os do neutro
+    from src.inspect_diffs import load_neutral_landmarks, summarize_diff
+    assert np.allclose(load_neutral_landmarks(str(out)), lms['sad'])
+    assert summaries['happy'] == summarize_diff(str(out / 'diff_sad_happy_meta.json'), lms['sad'], top_k=3)
+    assert summaries['happy']['total_changed'] == sum(meta['binary'])
+
+    calls = []
+    from src import annotate_diffs
+    monkeypatch.setattr(annotate_diffs.CvRenderer, 'render_highlights',
+                        lambda self, image, landmarks, idx, **kw: calls.append((image[0, 0, 0], landmarks)))
+    paths = annotate_topk(str(out), k=3, renderer='cv2')
+    assert [os.path.basename(p) for p in paths] == ['annotated_sad_neutral.png', 'annotated_sad_happy.png']
+    assert all(bg == 7 and np.allclose(lm, lms['sad']) for bg, lm in calls)
@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import cv2
+from src import jobs
+from src.jobs import JobRunner
+from src.utils import load_json, save_json
+
+
+def _wait(runner, job_id, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = runner.status(job_id)
+        if status['state'] != 'running':
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} não terminou')
+
+
+def test_job_runner_submit_status_and_persistence(tmp_path):
+    jobs_dir = str(tmp_path / 'jobs')
+    runner = JobRunner(jobs_dir=jobs_dir, max_workers=1)
+    try:
+        # tarefas inline: builtins são picklable e rodam no processo do pool sem importar o projeto
+        ok = runner.submit('calc', [(pow, (2, 10)), (pow, (3, 2), {})], params={'n': 2})
+        bad = runner.submit('calc', [(pow, (2, 3)), (pow, (0, -1))])
+        status = _wait(runner, ok)
+        assert status['state'] == 'done' and status['results'] == [1024, 9] and status['progress'] == 1.0
+        failed = _wait(runner, bad)
+        assert failed['state'] == 'failed' and [e['task'] for e in failed['errors']] == [1]
+        assert failed['results'][0] == 8
+        # _finish é idempotente: chamar de novo não muda o estado nem o horário de término
+        runner._finish(bad)
+        assert runner.status(bad)['finished'] == failed['finished']
+        assert runner.active_job('calc', n=2) is None
+    finally:
+        runner.shutdown(wait=True)
+
+    save_json(str(tmp_path / 'jobs' / 'interrupted.json'),
+              dict(load_json(str(tmp_path / 'jobs' / f'{ok}.json')), id='interrupted', state='running'))
+    reloaded = JobRunner(jobs_dir=jobs_dir, max_workers=1)
+    try:
+        assert reloaded.status(ok)['results'] == [1024, 9] and reloaded.status(bad)['state'] == 'failed'
+        assert reloaded.status('interrupted')['state'] == 'lost'
+        assert {j['id'] for j in reloaded.list_jobs(kind='calc')} == {ok, bad, 'interrupted'}
+    finally:
+        reloaded.shutdown(wait=True)
+
+
+def test_worker_landmark_cache_is_bounded(tmp_path, monkeypatch):
+    class CountingExtractor:
+        calls = 0
+
+        def from_bgr(self, img):
+            CountingExtractor.calls += 1
+            return np.zeros((4, 2)) + img[0, 0, 0]
+
+    monkeypatch.setattr(jobs, '_worker_extractor', CountingExtractor())
+    monkeypatch.setattr(jobs, '_worker_landmarks', jobs.OrderedDict())
+    monkeypatch.setattr(jobs, 'WORKER_CACHE_SIZE', 2)
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f'{i}.png'))
+        cv2.imwrite(paths[-1], np.full((8, 8, 3), i * 10, np.uint8))
+    for p in paths[:2] + paths[:1] + paths[2:]:
+        jobs._landmarks(p)
+    # o acesso a 0.png o tornou recente: 1.png é o descartado
+    assert CountingExtractor.calls == 3
+    assert [key[0] for key in jobs._worker_landmarks] == [paths[0], paths[2]]
+    assert jobs._landmarks(paths[0])[0, 0] == 0 and CountingExtractor.calls == 3
+
+
+def test_running_job_is_not_cancellable_and_finished_jobs_are_pruned(tmp_path):
+    import os
+    jobs_dir = str(tmp_path / 'jobs')
+    runner = JobRunner(jobs_dir=jobs_dir, max_workers=1, keep_finished=2)
+    try:
+        busy = runner.submit('sleep', [(time.sleep, (1.0,))])
+        deadline = time.time() + 30
+        while runner.status(busy)['cancellable'] and time.time() < deadline:
+            time.sleep(0.02)
+        # a única tarefa já está no processo: cancelar mentiria, o job segue rodando
+        assert runner.cancel(busy) is False and runner.status(busy)['state'] == 'running'
+        queued = runner.submit('sleep', [(time.sleep, (0.2,)) for _ in range(5)])
+        assert runner.status(queued)['cancellable'] and runner.cancel(queued)
+        assert runner.status(queued)['state'] == 'cancelled' and not runner.status(queued)['cancellable']
+        assert _wait(runner, busy)['state'] == 'done'
+
+        done = []
+        for i in range(3):
+            done.append(runner.submit('calc', [(pow, (2, i))]))
+            _wait(runner, done[-1])
+        # só os 2 terminados mais recentes ficam (em memória e em jobs_dir)
+        kept = {j['id'] for j in runner.list_jobs()}
+        assert len(kept) == 2 and done[-1] in kept and runner.status(busy) is None
+        assert sorted(os.listdir(jobs_dir)) == sorted(f'{i}.json' for i in kept)
+    finally:
+        runner.shutdown(wait=True)
+
+    reloaded = JobRunner(jobs_dir=jobs_dir, max_workers=1, keep_finished=1)
+    try:
+        assert [j['id'] for j in reloaded.list_jobs()] == [done[-1]] and os.listdir(jobs_dir) == [done[-1] + '.json']
+    finally:
+        reloaded.shutdown(wait=True)
@@ -0,0 +1,22 @@
+import numpy as np
+from src import metrics
+from src.pipeline import FacialStatePipeline
+
+
+def test_stage_timings_and_prometheus_export():
+    neutral = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+    target = neutral.copy()
+    target[15:] += np.array([0.0, 30.0])
+    pipeline = FacialStatePipeline(extractor=object(), threshold=0.05)
+    assert 'timings' not in pipeline.analyze_landmarks(neutral, target)
+
+    registry = metrics.Registry()
+    metrics.enable()
+    try:
+        res = pipeline.analyze_landmarks(neutral, target, timer=metrics.StageTimer(registry))
+    finally:
+        metrics.enable(False)
+    assert {'graph_build', 'region_mapping', 'diff', 'dfa'} <= set(res['timings'])
+    text = registry.to_prometheus()
+    assert 'facial_stage_wall_seconds_bucket{stage="diff",le="+Inf"} 1' in text
+    assert 'facial_stage_cpu_seconds_count{stage="dfa"} 1' in text
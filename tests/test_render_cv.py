@@ -0,0 +1,54 @@
+import numpy as np
+import networkx as nx
+from src.render_cv import topk_indices, graph_edge_arrays, select_top_edges, CvRenderer
+from src.digraph import changed_edge_arrays, changed_node_graph
+
+NEUTRAL = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+
+
+def _reference_top_nodes(G, k=8, pct=98):
+    """Seleção original de plot_diff_graph: percentil sobre os pesos do grafo e sort completo."""
+    edges = [(a, b, d['weight']) for a, b, d in G.edges(data=True)]
+    weights = np.array([w for _, _, w in edges])
+    thr = np.percentile(weights, pct)
+    top = [e for e in edges if e[2] >= thr]
+    top = sorted(top, key=lambda e: e[2], reverse=True)[:k]
+    return sorted({n for a, b, _ in top for n in (a, b)})
+
+
+def test_topk_indices_matches_argsort():
+    values = np.random.default_rng(0).random(200)
+    for k in (0, 1, 8, 199, 200, 500):
+        assert np.array_equal(topk_indices(values, k), np.argsort(-values, kind='stable')[:k])
+
+
+def test_select_top_edges_matches_graph_selection():
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        G = nx.DiGraph()
+        for a, b in rng.integers(0, 60, size=(300, 2)):
+            if a != b:
+                G.add_edge(int(a), int(b), weight=float(rng.random()))
+        edges, weights = graph_edge_arrays(G)
+        assert select_top_edges(edges, weights).tolist() == _reference_top_nodes(G)
+    assert select_top_edges(np.zeros((0, 2)), np.zeros(0)).size == 0
+
+
+def test_cv_renderer_bgra_max_side_and_edge_api():
+    img = (np.random.default_rng(2).random((120, 240, 3)) * 255).astype(np.uint8)
+    target = NEUTRAL.copy()
+    target[10:] += np.array([0.0, 30.0])
+    changed = np.zeros(20, dtype=np.int8)
+    changed[10:] = 1
+    edge_arrays = changed_edge_arrays(target, changed, 40.0)
+    G = changed_node_graph(target, np.ones(20), changed, 40.0)
+
+    r = CvRenderer()
+    from_graph = r.render_diff_graph(img, NEUTRAL, G).copy()
+    from_arrays = r.render_diff_edges(img, NEUTRAL, *edge_arrays).copy()
+    assert from_graph.shape == (120, 240, 3) and np.array_equal(from_graph, from_arrays)
+
+    bgra = np.dstack([img, np.full(img.shape[:2], 255, np.uint8)])
+    assert np.array_equal(r.render_diff_edges(bgra, NEUTRAL, *edge_arrays), from_arrays)
+    assert r.render_topk_nodes(img[:, :, 0], NEUTRAL, np.arange(20.0)).shape == (120, 240, 3)
+    assert CvRenderer(max_side=60).render_diff_edges(bgra, NEUTRAL, *edge_arrays).shape == (30, 60, 3)
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+from src.bench import result_memory, synthetic_landmarks, synthetic_target
+from src.pipeline import FacialStatePipeline
+from src.results import AnalysisResult, ResultBatch
+
+
+def _pair(seed):
+    neutral = synthetic_landmarks(468)
+    return neutral, synthetic_target(neutral, seed=seed, amount=0.1)
+
+
+def test_compact_result_round_trips_pipeline_dict():
+    pipeline = FacialStatePipeline(extractor=object(), threshold=0.02)
+    neutral, target = _pair(1)
+    ref = pipeline.analyze_landmarks(neutral, target, with_graph=False)
+    res = pipeline.analyze_landmarks(neutral, target, compact=True)
+    assert isinstance(res, AnalysisResult) and res.bits.nbytes == 59 and res.difs.dtype == np.float32
+    d = res.to_dict()
+    assert set(d) == set(ref)
+    for key in ('label', 'binary', 'diff_nodes', 'counts', 'sizes'):
+        assert d[key] == ref[key]
+    assert np.allclose(d['difs'], ref['difs'], atol=1e-6)
+    assert json.loads(res.to_json())['binary'] == ref['binary']
+    assert pipeline.analyze_landmarks(None, target, compact=True).to_dict() == {'label': 'reject', 'reason': 'no_face'}
+
+
+def test_result_batch_columns_and_save_load(tmp_path):
+    pipeline = FacialStatePipeline(extractor=object(), threshold=0.02)
+    batch = ResultBatch(capacity=2)
+    refs = []
+    for seed in range(5):
+        neutral, target = _pair(seed)
+        refs.append(pipeline.analyze_landmarks(neutral, target, with_graph=False))
+        batch.append(refs[-1] if seed % 2 else AnalysisResult.from_dict(refs[-1]))
+    batch.append({'label': 'reject', 'reason': 'no_face'})
+    assert len(batch) == 6 and batch.bits.shape[1] == 59
+    assert batch.binary_matrix()[:5].tolist() == [r['binary'] for r in refs]
+    assert list(batch.label_array()) == [r['label'] for r in refs] + ['reject']
+    path = str(tmp_path / 'batch.npz')
+    batch.save(path)
+    loaded = ResultBatch.load(path)
+    assert loaded[-1].to_dict() == {'label': 'reject', 'reason': 'no_face'}
+    assert loaded[2].to_dict()['counts'] == refs[2]['counts']
+    assert loaded.nbytes == batch.nbytes
+
+
+def test_result_memory_compact_formats_are_smaller():
+    mem = result_memory(count=200)
+    assert mem['AnalysisResult']['bytes_per_result'] * 4 < mem['dict']['bytes_per_result']
+    assert mem['ResultBatch']['bytes_per_result'] < mem['AnalysisResult']['bytes_per_result']
@@ -0,0 +1,57 @@
+import time
+import numpy as np
+from src.pipeline import FacialStatePipeline
+from src.results_store import ResultsStore
+
+
+def test_store_round_trip_and_indexed_queries(tmp_path):
+    db = str(tmp_path / 'results.db')
+    rng = np.random.default_rng(0)
+    now = time.time()
+    with ResultsStore(db, batch_size=4) as store:
+        for i in range(10):
+            binary = rng.integers(0, 2, 468)
+            store.add({'label': 'reject' if i % 3 == 0 else 'happy', 'binary': binary, 'difs': rng.random(468),
+                       'counts': {'mouth': 3}}, source='pipeline', subject=f's{i % 2}', expected='happy',
+                      created_at=now - i * 86400)
+        last = binary
+    with ResultsStore(db) as store:
+        assert store.count() == 10
+        week = store.query(label='reject', expected='happy', since=now - 7 * 86400)
+        assert [round((now - r['created_at']) / 86400) for r in week] == [0, 3, 6]
+        rows = store.query(subject='s1', with_vectors=True, limit=1)
+        assert rows[0]['counts'] == {'mouth': 3} and rows[0]['difs'].dtype == np.float32
+        oldest = store.query(with_vectors=True)[-1]
+        assert np.array_equal(oldest['binary'], last) and oldest['n_changed'] == int(last.sum())
+        assert store.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_pipeline_write_through(tmp_path):
+    from src.synthetic import ExpressionGenerator
+
+    class Extractor:
+        def from_image(self, path, reduce=1):
+            gen = ExpressionGenerator(seed=0, jitter=0)
+            n, t, _ = gen.sample(1)
+            return (n if 'neutral' in path else t)[0].astype(float)
+
+    db = str(tmp_path / 'results.db')
+    with FacialStatePipeline(extractor=Extractor(), store=db, subject='ana') as p:
+        res = p.analyze_images('neutral.jpg', 'happy.jpg', reduce=2, expected='happy')
+    assert p.store is None
+    with ResultsStore(db) as store:
+        row = store.query(subject='ana')[0]
+    assert row['label'] == res['label'] and row['target_path'] == 'happy.jpg' and row['params']['reduce'] == 2
+
+
+def test_pipeline_close_keeps_shared_store_open(tmp_path):
+    neutral = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+
+    class Extractor:
+        def from_image(self, path, reduce=1):
+            return neutral if 'neutral' in path else neutral + 3.0
+
+    with ResultsStore(str(tmp_path / 'results.db')) as store:
+        with FacialStatePipeline(extractor=Extractor(), store=store) as p:
+            p.analyze_images('neutral.jpg', 'happy.jpg', reduce=2)
+        assert p.store is store and store.count() == 1
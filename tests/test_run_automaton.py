@@ -0,0 +1,49 @@
+import numpy as np
+from src.run_automaton import decide_from_vector, decide_batch, stack_vectors, iter_batch_decisions
+from src.utils import save_json
+
+
+def _reference_decision(vec):
+    """Lógica original de decide_from_vector (por vetor, antes da versão vetorizada)."""
+    arr = np.array(vec)
+    if any(v not in (0, 1) for v in np.unique(arr)):
+        return {'decision': 'reject', 'reason': 'invalid_symbols', 'by_first': None, 'by_majority': None}
+    first = int(arr[0]) if arr.size > 0 else None
+    by_first = 'happy' if first == 1 else ('sad' if first == 0 else 'reject')
+    ones, zeros = int((arr == 1).sum()), int((arr == 0).sum())
+    by_majority = 'happy' if ones > zeros else ('sad' if zeros > ones else 'reject')
+    return {'decision': by_majority, 'by_first': by_first, 'by_majority': by_majority}
+
+
+def test_decide_batch_matches_original_logic():
+    rng = np.random.default_rng(0)
+    vecs = [[1, 1, 0], [0, 0, 1], [1, 0], [0, 1, 2], [], [-1], [0.5, 1]]
+    vecs += [rng.integers(0, 2, size=rng.integers(1, 40)).tolist() for _ in range(200)]
+    mat, lengths = stack_vectors(vecs)
+    batch = decide_batch(mat, lengths)
+    for v, res in zip(vecs, batch):
+        expected = _reference_decision(v)
+        assert res == expected
+        assert decide_from_vector(v, {}) == expected  # mesmo formato de dict da versão original
+    assert batch[3]['reason'] == 'invalid_symbols'
+    counted = decide_batch(mat, lengths, counts=True)
+    assert counted[0] == dict(batch[0], ones=2, zeros=1) and 'ones' not in counted[3]
+
+
+def test_iter_batch_decisions_reads_json_and_npy(tmp_path):
+    save_json(str(tmp_path / 'diff_neutral_happy_meta.json'), {'binary': [1, 1, 0], 'difs': [0.1, 0.2, 0.0]})
+    np.save(str(tmp_path / 'many.npy'), np.array([[0, 0, 1], [1, 1, 1]], dtype=np.int8))
+    paths = [str(tmp_path / 'diff_neutral_happy_meta.json'), str(tmp_path / 'many.npy')]
+    rows = list(iter_batch_decisions(paths, workers=2, chunk_size=1))
+    assert [r['decision'] for r in rows] == ['happy', 'sad', 'happy']
+    assert [(r['ones'], r['zeros']) for r in rows] == [(2, 1), (1, 2), (3, 0)]
+    assert rows[1]['id'].endswith('many.npy#0')
+
+
+def test_iter_batch_decisions_keeps_error_rows_in_path_order(tmp_path):
+    save_json(str(tmp_path / 'a_meta.json'), {'binary': [1, 1, 0]})
+    save_json(str(tmp_path / 'c_meta.json'), {'binary': [0, 0, 1]})
+    paths = [str(tmp_path / 'a_meta.json'), str(tmp_path / 'missing_meta.json'), str(tmp_path / 'c_meta.json')]
+    rows = list(iter_batch_decisions(paths, workers=2))
+    assert [r['id'] for r in rows] == paths
+    assert [r['decision'] for r in rows] == ['happy', 'reject', 'sad'] and rows[1]['reason'] == 'load_error'
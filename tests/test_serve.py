@@ -0,0 +1,202 @@
+import json
+import base64
+import threading
+import urllib.request
+import urllib.error
+import numpy as np
+import cv2
+from src.pipeline import FacialStatePipeline
+from src.serve import MicroBatcher, make_server
+
+NEUTRAL = np.array([[i * 10.0, 50.0 + (i % 5) * 20.0] for i in range(20)])
+
+
+class ColorExtractor:
+    """Landmarks pelo brilho da imagem: 0 -> neutro, > 0 -> boca deslocada em tantos px; conta as chamadas."""
+    def __init__(self):
+        self.calls = 0
+
+    def from_bgr(self, img):
+        self.calls += 1
+        lm = NEUTRAL.copy()
+        lm[15:, 1] += float(img[0, 0, 0])
+        return lm
+
+
+def png(value):
+    return cv2.imencode('.png', np.full((8, 8, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+class GateExtractor(ColorExtractor):
+    """Bloqueia as extrações até `gate` ser liberado (para manter os workers ocupados)."""
+    def __init__(self, gate):
+        super().__init__()
+        self.gate = gate
+
+    def from_bgr(self, img):
+        self.gate.wait(10)
+        return super().from_bgr(img)
+
+
+def _server(tmp_path, extractor=ColorExtractor, **kwargs):
+    batcher = MicroBatcher(lambda: FacialStatePipeline(extractor=extractor(), threshold=2.0), workers=1)
+    server = make_server(port=0, batcher=batcher, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_path_fields_disabled_by_default_and_confined_to_root(tmp_path):
+    (tmp_path / 'root').mkdir()
+    (tmp_path / 'root' / 'n.png').write_bytes(png(0))
+    (tmp_path / 'root' / 't.png').write_bytes(png(30))
+    (tmp_path / 'secret.png').write_bytes(png(30))
+    server, url = _server(tmp_path)
+    try:
+        status, body = _post(url + '/analyze', {'neutral_path': str(tmp_path / 'root' / 'n.png'),
+                                                'target_path': str(tmp_path / 'root' / 't.png')})
+        assert status == 400 and 'image-root' in body['error']
+    finally:
+        server.shutdown()
+        server.batcher.close()
+
+    server, url = _server(tmp_path, image_root=str(tmp_path / 'root'))
+    try:
+        status, body = _post(url + '/analyze', {'neutral_path': 'n.png', 'target_path': 't.png'})
+        assert status == 200 and body['label'] and len(body['binary']) == 20
+        for bad in ('../secret.png', str(tmp_path / 'secret.png')):
+            status, body = _post(url + '/analyze', {'neutral_path': 'n.png', 'target_path': bad})
+            assert status == 400 and 'fora' in body['error']
+    finally:
+        server.shutdown()
+        server.batcher.close()
+
+
+def test_close_fails_queued_requests_and_joins_threads():
+    import time
+    import pytest
+
+    class SlowExtractor(ColorExtractor):
+        def from_bgr(self, img):
+            time.sleep(0.05)
+            return super().from_bgr(img)
+
+    batcher = MicroBatcher(lambda: FacialStatePipeline(extractor=SlowExtractor()), workers=1, max_batch=2,
+                           max_latency_ms=1.0)
+    futs = [batcher.submit({'op': 'analyze', 'neutral': png(0), 'target': png(i + 1)}) for i in range(20)]
+    time.sleep(0.1)
+    t0 = time.perf_counter()
+    batcher.close()
+    assert time.perf_counter() - t0 < 2.0
+    assert not any(t.is_alive() for t in batcher._threads)
+    outcomes = [f.exception(timeout=0) for f in futs]
+    assert outcomes[0] is None and isinstance(outcomes[-1], RuntimeError)
+    with pytest.raises(RuntimeError):
+        batcher.submit({'op': 'analyze', 'neutral': png(0), 'target': png(1)})
+
+
+def test_batcher_groups_while_busy_dedupes_and_enrolls():
+    import time
+    gate = threading.Event()
+    extractors = []
+
+    def factory():
+        extractors.append(GateExtractor(gate))
+        return FacialStatePipeline(extractor=extractors[-1], threshold=2.0)
+
+    batcher = MicroBatcher(factory, workers=1, max_batch=8, max_latency_ms=300.0)
+    try:
+        # worker livre: a primeira requisição sai sozinha, sem esperar max_latency
+        busy = batcher.submit({'op': 'analyze', 'neutral': png(0), 'target': png(99)})
+        time.sleep(0.1)
+        # worker ocupado: as próximas esperam juntas num lote
+        futs = [batcher.submit({'op': 'analyze', 'neutral': png(0), 'target': png(30)}) for _ in range(4)]
+        futs.append(batcher.submit({'op': 'enroll', 'subject': 'bob', 'neutral': png(0)}))
+        futs.append(batcher.submit({'op': 'analyze', 'subject': 'bob', 'target': png(30)}))
+        time.sleep(0.1)
+        gate.set()
+        assert busy.result(timeout=10)[1]['batch_size'] == 1
+        results = [f.result(timeout=10) for f in futs]
+        assert [t['batch_size'] for _, t in results] == [6] * 6
+        assert extractors[0].calls == 3  # 0, 99 e 30: a neutra repetida é extraída uma vez, mesmo entre lotes
+        assert results[0][0]['binary'] == [0] * 15 + [1] * 5 and 'diff_graph' not in results[0][0]
+        # a análise por sujeito esperou o cadastro que veio antes dela no mesmo lote
+        assert results[5][0]['binary'] == [0] * 15 + [1] * 5
+
+        res, _ = batcher.submit({'op': 'enroll', 'subject': 'ana', 'neutral': png(0)}).result(timeout=10)
+        assert res == {'subject': 'ana', 'landmarks': 20, 'references': 1}
+        res, _ = batcher.submit({'op': 'enroll', 'subject': 'ana', 'neutral': png(1),
+                                 'append': True}).result(timeout=10)
+        assert res['references'] == 2 and batcher.subjects() == ['ana', 'bob']
+        res, _ = batcher.submit({'op': 'analyze', 'subject': 'ana', 'target': png(30),
+                                 'include_graph': True}).result(timeout=10)
+        assert sorted(res['diff_graph'].nodes()) == [15, 16, 17, 18, 19]
+        missing = batcher.submit({'op': 'analyze', 'subject': 'nobody', 'target': png(30)})
+        assert isinstance(missing.exception(timeout=10), KeyError)
+    finally:
+        gate.set()
+        batcher.close()
+
+
+def test_batch_images_are_extracted_by_all_workers_in_parallel():
+    import pytest
+    both = threading.Barrier(2, timeout=5)
+
+    class PairedExtractor(ColorExtractor):
+        def from_bgr(self, img):
+            both.wait()  # só passa se as duas imagens forem extraídas ao mesmo tempo, por workers diferentes
+            return super().from_bgr(img)
+
+    batcher = MicroBatcher(lambda: FacialStatePipeline(extractor=PairedExtractor()), workers=2, max_batch=8)
+    try:
+        res, timings = batcher.submit({'op': 'analyze', 'neutral': png(0), 'target': png(30)}).result(timeout=10)
+        assert res['binary'] == [0] * 15 + [1] * 5 and timings['batch_size'] == 1
+    finally:
+        batcher.close()
+    with pytest.raises(ValueError):
+        MicroBatcher(lambda: FacialStatePipeline(extractor=ColorExtractor()), workers=0)
+
+
+def test_http_routes(tmp_path):
+    server, url = _server(tmp_path)
+    try:
+        with urllib.request.urlopen(url + '/health', timeout=10) as resp:
+            assert json.loads(resp.read()) == {'status': 'ok', 'workers': 1, 'subjects': 0}
+        b64 = lambda v: base64.b64encode(png(v)).decode()
+        assert _post(url + '/nope', {})[0] == 404
+        assert _post(url + '/analyze', {'target': b64(30)})[0] == 400
+        # imagem corrompida só é detectada no worker (decode): continua sendo erro do cliente
+        status, body = _post(url + '/analyze', {'neutral': b64(0), 'target': base64.b64encode(b'xx').decode()})
+        assert status == 400 and 'imagem' in body['error']
+        assert _post(url + '/enroll', {'subject': 'ana', 'neutral': b64(0)}) == \
+            (200, {'subject': 'ana', 'landmarks': 20, 'references': 1})
+        status, body = _post(url + '/analyze', {'subject': 'ana', 'target': b64(30)})
+        assert status == 200 and body['binary'] == [0] * 15 + [1] * 5
+        assert _post(url + '/analyze', {'subject': 'bob', 'target': b64(30)})[0] == 404
+        req = urllib.request.Request(url + '/analyze', data=json.dumps({'neutral': b64(0), 'target': b64(30)}).encode())
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            assert resp.headers['X-Batch-Size'] == '1' and float(resp.headers['X-Total-Time-Ms']) > 0
+    finally:
+        server.shutdown()
+        server.batcher.close()
+
+
+def test_http_timeout_returns_504(tmp_path):
+    gate = threading.Event()
+    server, url = _server(tmp_path, extractor=lambda: GateExtractor(gate), timeout=0.2)
+    try:
+        b64 = lambda v: base64.b64encode(png(v)).decode()
+        status, body = _post(url + '/analyze', {'neutral': b64(0), 'target': b64(30)})
+        assert status == 504
+    finally:
+        gate.set()
+        server.shutdown()
+        server.batcher.close()
@@ -0,0 +1,44 @@
+import numpy as np
+from src.similarity_index import SimilarityIndex
+
+
+def test_exact_search_persistence_and_approx_recall(tmp_path):
+    rng = np.random.default_rng(0)
+    # difs reais têm baixa dimensão intrínseca: poucos fatores latentes mais ruído
+    latent = rng.standard_normal((3000, 8)).astype(np.float32)
+    data = latent @ rng.standard_normal((8, 468)).astype(np.float32)
+    data += 0.05 * rng.standard_normal((3000, 468)).astype(np.float32)
+    labels = (latent[:, 0] > 0) * 2 + (latent[:, 1] > 0)
+    names = ['neutral', 'happy', 'sad', 'surprise']
+
+    index = SimilarityIndex(str(tmp_path / 'idx'), dim=468)
+    index.add(data[:1000], labels=[names[c] for c in labels[:1000]])
+    index.add(data[1000:], labels=[names[c] for c in labels[1000:]])  # insert incremental
+
+    queries = data[:20] + 0.01
+    dists, idx = index.search(queries, k=5, block=700)
+    brute = ((queries[:, None, :] - data[None, :, :]) ** 2).sum(axis=2)
+    assert np.array_equal(idx, np.argsort(brute, axis=1)[:, :5])
+    assert np.allclose(dists, np.sqrt(np.sort(brute, axis=1)[:, :5]), rtol=1e-4)
+
+    reopened = SimilarityIndex(str(tmp_path / 'idx'))
+    assert len(reopened) == 3000
+    assert reopened.query(queries[0], k=1)[0]['label'] == names[labels[0]]
+    predicted = [lab for lab, _ in reopened.knn_label(queries, k=7)]
+    assert np.mean([p == names[c] for p, c in zip(predicted, labels[:20])]) >= 0.8
+    assert reopened.duplicates(data[5], radius=1e-3)[0]['index'] == 5
+
+    _, approx_idx = reopened.search(queries, k=5, approx=True, candidates=300)
+    recall = np.mean([len(set(a) & set(e)) / 5 for a, e in zip(approx_idx, idx)])
+    assert recall >= 0.9
+
+
+def test_n_bits_must_be_a_multiple_of_8(tmp_path):
+    import pytest
+    for n_bits in (0, 12, 65):
+        with pytest.raises(ValueError):
+            SimilarityIndex(str(tmp_path / f'idx{n_bits}'), dim=4, n_bits=n_bits)
+        assert not (tmp_path / f'idx{n_bits}').exists()
+    index = SimilarityIndex(str(tmp_path / 'idx'), dim=4, n_bits=16)
+    index.add(np.eye(4, dtype=np.float32), ids=list('abcd'))
+    assert index.codes.shape[1] == 2 and len(index) == 4
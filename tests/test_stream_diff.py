@@ -0,0 +1,36 @@
+import numpy as np
+from src.digraph import digraph_from_difference
+from src.stream_diff import StreamingDiffer
+from src.synthetic import ExpressionGenerator
+
+
+def _edges(G):
+    return {(a, b): round(d['weight'], 9) for a, b, d in G.edges(data=True)}
+
+
+def test_streaming_differ_matches_full_recompute():
+    gen = ExpressionGenerator(seed=3, rotation_deg=0, shift=0, scale=(1, 1), jitter=0)
+    neutral = gen.base
+    happy = gen.basis[gen.labels.index('happy')]
+    surprise = gen.basis[gen.labels.index('surprise')]
+    rng = np.random.default_rng(0)
+    differ = StreamingDiffer(neutral, threshold=0.01)
+    for t in np.linspace(0, 1, 12).tolist() + np.linspace(1, 0, 6).tolist():
+        target = neutral + t * happy + (1 - t) * 0.6 * surprise + rng.normal(0, 0.3, neutral.shape)
+        delta = differ.update(target)
+        G, binary, difs = digraph_from_difference(neutral, target, threshold=0.01)
+        assert np.array_equal(differ.binary, binary)
+        assert set(differ.graph().nodes) == set(G.nodes)
+        assert _edges(differ.graph()) == _edges(G)
+        assert set(delta['on']).isdisjoint(delta['off'])
+
+
+def test_move_eps_limits_work_to_changed_nodes():
+    gen = ExpressionGenerator(seed=3, rotation_deg=0, shift=0, scale=(1, 1), jitter=0)
+    neutral = gen.base
+    target = neutral + gen.basis[gen.labels.index('happy')]
+    differ = StreamingDiffer(neutral, threshold=0.01, move_eps=0.002)
+    first = differ.update(target)
+    assert first['touched'] == int(differ.binary.sum()) > 0
+    again = differ.update(target + 0.1)  # tremor abaixo de move_eps
+    assert again['touched'] == 0 and again['on'] == [] and again['off'] == []
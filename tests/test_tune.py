@@ -0,0 +1,25 @@
+import numpy as np
+from src.dfa import SimpleEmotionDFA
+from src.pipeline import FacialStatePipeline
+from src.synthetic import ExpressionGenerator
+from src.tune import TuningSet, predict_grid, tune, write_config, PRED_LABELS
+
+
+def test_vectorized_predictions_match_pipeline(tmp_path):
+    gen = ExpressionGenerator(seed=0, jitter=0.003)
+    neutral, target, labels = gen.sample(60)
+    data = TuningSet.from_landmarks(neutral, target, labels, gen.labels)
+    params = np.array([[0.18, 0.20, 0.12, 2.0], [0.10, 0.30, 0.05, 0.01]])
+    preds = predict_grid(data, params)
+    for row, p in zip(preds, params):
+        dfa = SimpleEmotionDFA(mouth_thresh=p[0], eyes_thresh=p[1], brows_thresh=p[2])
+        pipeline = FacialStatePipeline(extractor=object(), dfa=dfa, threshold=p[3])
+        expected = [pipeline.analyze_landmarks(n.astype(float), t.astype(float), with_graph=False)['label']
+                    for n, t in zip(neutral, target)]
+        assert [PRED_LABELS[i] for i in row] == expected
+
+    result = tune(data, method='halving', n_random=50)
+    write_config(str(tmp_path / 'dfa_config.json'), result)
+    loaded = FacialStatePipeline.from_config(str(tmp_path / 'dfa_config.json'), extractor=object())
+    assert loaded.threshold == result['best']['threshold']
+    assert loaded.dfa.mouth_thresh == result['best']['mouth_thresh']
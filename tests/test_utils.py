@@ -0,0 +1,35 @@
+import threading
+import time
+import pytest
+from src.utils import BoundedExecutor
+
+
+def test_bounded_executor_blocks_at_max_pending_and_propagates_errors():
+    release = threading.Event()
+    submitted = []
+
+    def blocked(i):
+        release.wait(5)
+        return i
+
+    def fail():
+        raise OSError('disco cheio')
+
+    with BoundedExecutor(max_workers=1, max_pending=2) as ex:
+        ex.submit(blocked, 0)
+        ex.submit(blocked, 1)
+        producer = threading.Thread(target=lambda: submitted.append(ex.submit(blocked, 2)))
+        producer.start()
+        time.sleep(0.2)
+        # dois pendentes: o terceiro submit fica bloqueado até uma tarefa terminar
+        assert not submitted and producer.is_alive()
+        release.set()
+        producer.join(5)
+        assert len(submitted) == 1
+        assert [f.result() for f in ex.join()] == [0, 1, 2]
+
+        futures = [ex.submit(fail) for _ in range(3)] + [ex.submit(blocked, 3)]
+        done = ex.join()
+        assert done == futures and done[-1].result() == 3
+        with pytest.raises(OSError, match='disco cheio'):
+            done[0].result()